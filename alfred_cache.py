@@ -0,0 +1,104 @@
+"""
+Alfredスクリプトフィルタの出力に付けるキャッシュ指定（"cache" オブジェクト）。
+
+Alfredはキャッシュが有効な間、スクリプトを実行せずに前回の結果を表示します。
+ただしキャッシュは入力（{query}）ごとではなくスクリプトフィルタ単位のため、
+選択のたびに次のノードIDで同じスクリプトフィルタを呼び出すこのワークフローでは、
+loosereload を有効にして「前回の結果をすぐ表示し、裏でスクリプトを再実行して更新する」形で使ってください。
+既定ではキャッシュ指定を出力しません。
+
+設定（info.plist のワークフロー変数または環境変数）:
+    ANEMIA_CACHE_SECONDS: キャッシュの有効期間（秒, 5〜86400。0または未設定で無効）
+    ANEMIA_CACHE_LOOSERELOAD: 1 / true ならキャッシュ表示中にスクリプトを再実行して更新
+
+`anemia_flow` をimportしない `run_diagnosis.py` の高速経路でも使えるよう、標準ライブラリの os だけに依存します。
+"""
+import os
+
+ENV_SECONDS = "ANEMIA_CACHE_SECONDS"
+ENV_LOOSERELOAD = "ANEMIA_CACHE_LOOSERELOAD"
+
+# Limits Alfred accepts for "seconds"
+MIN_SECONDS = 5
+MAX_SECONDS = 86400
+
+_TRUE_WORDS = ("1", "true", "yes", "on")
+
+
+def cache_from_env(environ=None):
+    """
+    環境変数からキャッシュ指定を読み込みます。
+
+    Args:
+        environ (Mapping, optional): 環境変数（省略時は os.environ）
+
+    Returns:
+        dict or None: {"seconds": int, "loosereload": bool}。無効な場合はNone。
+    """
+    environ = os.environ if environ is None else environ
+    try:
+        seconds = int(environ.get(ENV_SECONDS, "0") or 0)
+    except ValueError:
+        return None
+    if seconds <= 0:
+        return None
+    return {
+        "seconds": min(max(seconds, MIN_SECONDS), MAX_SECONDS),
+        "loosereload": environ.get(ENV_LOOSERELOAD, "").strip().lower() in _TRUE_WORDS,
+    }
+
+
+def cache_fragment(cache):
+    """
+    最上位オブジェクトの末尾に追加する "cache" フィールドを、json.dumps(indent=2) と同じ形式で返します。
+
+    Args:
+        cache (dict or None): キャッシュ指定
+
+    Returns:
+        str: ',\\n  "cache": {...}' 形式の文字列（指定が無ければ空文字）
+    """
+    if not cache:
+        return ""
+    loosereload = "true" if cache["loosereload"] else "false"
+    return (f',\n  "cache": {{\n    "seconds": {int(cache["seconds"])},\n'
+            f'    "loosereload": {loosereload}\n  }}')
+
+
+def add_cache(data, cache):
+    """
+    キャッシュ指定なしでレンダリングされた出力（事前レンダリング済みストアの内容など）に
+    キャッシュ指定を追加します。
+
+    Args:
+        data (bytes): 最上位オブジェクトが "\\n}" （末尾改行は任意）で終わるJSON出力
+        cache (dict or None): キャッシュ指定
+
+    Returns:
+        bytes: キャッシュ指定を追加した出力
+    """
+    fragment = cache_fragment(cache)
+    if not fragment:
+        return data
+    body = data.rstrip(b"\n")
+    if not body.endswith(b"\n}"):
+        return data
+    return body[:-2] + fragment.encode("ascii") + data[len(body) - 2:]
+
+
+def strip_cache(data):
+    """
+    出力から add_cache で追加したキャッシュ指定を取り除きます（監査ログの照合用）。
+
+    Args:
+        data (bytes): JSON出力
+
+    Returns:
+        bytes: キャッシュ指定を除いた出力（指定が無ければそのまま）
+    """
+    body = data.rstrip(b"\n")
+    start = body.rfind(b',\n  "cache": {')
+    # Only when the directive is the last top-level field; raw newlines never occur inside JSON strings
+    if start < 0 or not body.endswith(b"\n  }\n}") or body.find(b'\n  "', start + 2) >= 0:
+        return data
+    return body[:start] + data[len(body) - 2:]
@@ -1,6 +1,21 @@
-import json
+import operator
+from collections.abc import Mapping
+from time import perf_counter
+from types import MappingProxyType
+
+from alfred_cache import cache_fragment, cache_from_env
+from metrics import METRICS
 
 # Define the flowchart data structure
+#
+# Question options may carry a "when" predicate so that the tree can be walked
+# automatically from lab values (see AnemiaWorkflow.route_labs). A predicate maps
+# a lab key to either a plain value (equality) or a dict of comparisons
+# ("lt", "le", "gt", "ge", "eq", "in"); all keys must match.
+#   - mcv: number (fL)
+#   - fe / tibc / ferritin: "low" | "normal" | "high" (relative to the lab's reference range)
+#   - deficiency: "vitb12" | "folate"
+#   - other keys: bool findings
 FLOWCHART = {
     # start
     "root": "A",
@@ -10,8 +25,8 @@ FLOWCHART = {
         "text": "貧血の鑑別診断を開始します。\nまずは白血球・血小板の減少はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり（白血球/血小板減少）", "next": "C"},
-            {"label": "なし", "next": "D"}
+            {"label": "あり（白血球/血小板減少）", "next": "C", "when": {"cytopenia": True}},
+            {"label": "なし", "next": "D", "when": {"cytopenia": False}}
         ]
     },
     
@@ -34,8 +49,8 @@ FLOWCHART = {
         "text": "網赤血球絶対数の増加はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり（増加）", "next": "E"},
-            {"label": "なし", "next": "H"}
+            {"label": "あり（増加）", "next": "E", "when": {"reticulocytosis": True}},
+            {"label": "なし", "next": "H", "when": {"reticulocytosis": False}}
         ]
     },
     
@@ -44,8 +59,8 @@ FLOWCHART = {
         "text": "溶血所見（間接ビリルビン↑, LDH↑, ハプトグロビン↓, ヘモジデリン尿）はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり", "next": "F"},
-            {"label": "なし", "next": "G"}
+            {"label": "あり", "next": "F", "when": {"hemolysis": True}},
+            {"label": "なし", "next": "G", "when": {"hemolysis": False}}
         ]
     },
     "F": {
@@ -64,9 +79,9 @@ FLOWCHART = {
         "text": "MCV（平均赤血球容積）の値は？",
         "type": "question",
         "options": [
-            {"label": "MCV ≧ 101 (大球性)", "next": "I"},
-            {"label": "MCV 81-100 (正球性)", "next": "J"},
-            {"label": "MCV ≦ 80 (小球性)", "next": "K"}
+            {"label": "MCV ≧ 101 (大球性)", "next": "I", "when": {"mcv": {"ge": 101}}},
+            {"label": "MCV 81-100 (正球性)", "next": "J", "when": {"mcv": {"gt": 80, "lt": 101}}},
+            {"label": "MCV ≦ 80 (小球性)", "next": "K", "when": {"mcv": {"le": 80}}}
         ]
     },
 
@@ -75,8 +90,8 @@ FLOWCHART = {
         "text": "大球性貧血 (MCV ≧ 101) です。\n網赤血球の増加はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり", "next": "L2"},
-            {"label": "なし", "next": "L4"}
+            {"label": "あり", "next": "L2", "when": {"reticulocytosis": True}},
+            {"label": "なし", "next": "L4", "when": {"reticulocytosis": False}}
         ]
     },
     "L2": {
@@ -88,16 +103,16 @@ FLOWCHART = {
         "text": "VitB12 あるいは葉酸の低下はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり", "next": "L5"},
-            {"label": "なし", "next": "L11"}
+            {"label": "あり", "next": "L5", "when": {"vitb12_or_folate_low": True}},
+            {"label": "なし", "next": "L11", "when": {"vitb12_or_folate_low": False}}
         ]
     },
     "L5": {
         "text": "巨赤芽球性貧血が疑われます。\n可能であれば骨髄における巨赤芽球増加を確認してください。\n欠乏しているのはどちらですか？",
         "type": "question",
         "options": [
-            {"label": "VitB12欠乏", "next": "L8"},
-            {"label": "葉酸欠乏", "next": "L10"}
+            {"label": "VitB12欠乏", "next": "L8", "when": {"deficiency": "vitb12"}},
+            {"label": "葉酸欠乏", "next": "L10", "when": {"deficiency": "folate"}}
         ]
     },
     "L8": {
@@ -141,8 +156,8 @@ FLOWCHART = {
         "text": "正球性貧血 (MCV 81-100) です。\n網赤血球数は？",
         "type": "question",
         "options": [
-            {"label": "増加", "next": "N2"},
-            {"label": "低下〜正常", "next": "N9"}
+            {"label": "増加", "next": "N2", "when": {"reticulocytosis": True}},
+            {"label": "低下〜正常", "next": "N9", "when": {"reticulocytosis": False}}
         ]
     },
     "N2": {
@@ -157,8 +172,8 @@ FLOWCHART = {
         "text": "Coombs試験の結果は？",
         "type": "question",
         "options": [
-            {"label": "陽性", "next": "N4"},
-            {"label": "陰性", "next": "N5"}
+            {"label": "陽性", "next": "N4", "when": {"coombs_positive": True}},
+            {"label": "陰性", "next": "N5", "when": {"coombs_positive": False}}
         ]
     },
     "N4": {
@@ -170,8 +185,8 @@ FLOWCHART = {
         "text": "CD55, CD59陰性赤血球、Ham試験陽性、NAP低下などの所見はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり", "next": "N6"},
-            {"label": "なし", "next": "N7"}
+            {"label": "あり", "next": "N6", "when": {"pnh_findings": True}},
+            {"label": "なし", "next": "N7", "when": {"pnh_findings": False}}
         ]
     },
     "N6": {
@@ -193,8 +208,8 @@ FLOWCHART = {
         "text": "汎血球減少はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり", "next": "N18"},
-            {"label": "なし", "next": "N10"}
+            {"label": "あり", "next": "N18", "when": {"pancytopenia": True}},
+            {"label": "なし", "next": "N10", "when": {"pancytopenia": False}}
         ]
     },
     "N10": {
@@ -245,16 +260,16 @@ FLOWCHART = {
         "text": "小球性貧血 (MCV ≦ 80) です。\n網赤血球数は？",
         "type": "question",
         "options": [
-            {"label": "増加", "next": "S2"},
-            {"label": "低下〜正常", "next": "S5"}
+            {"label": "増加", "next": "S2", "when": {"reticulocytosis": True}},
+            {"label": "低下〜正常", "next": "S5", "when": {"reticulocytosis": False}}
         ]
     },
     "S2": {
         "text": "赤血球形態異常, 間接ビリルビン↑, LDH↑, ハプトグロビン↓ などの所見はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり", "next": "S3"},
-            {"label": "なし", "next": "S5"}
+            {"label": "あり", "next": "S3", "when": {"hemolysis": True}},
+            {"label": "なし", "next": "S5", "when": {"hemolysis": False}}
         ]
     },
     "S3": {
@@ -266,9 +281,13 @@ FLOWCHART = {
         "text": "血清鉄・TIBC・フェリチンの値を確認してください。",
         "type": "question",
         "options": [
-            {"label": "Fe↓, TIBC↑, Ferritin↓", "next": "S6"},
-            {"label": "Fe↓, TIBC正常-↓, Ferritin正常-↑", "next": "S7"},
-            {"label": "Fe正常-↑, TIBC正常-↓, Ferritin正常-↑", "next": "S9"}
+            {"label": "Fe↓, TIBC↑, Ferritin↓", "next": "S6",
+             "when": {"fe": "low", "tibc": "high", "ferritin": "low"}},
+            {"label": "Fe↓, TIBC正常-↓, Ferritin正常-↑", "next": "S7",
+             "when": {"fe": "low", "tibc": {"in": ["normal", "low"]}, "ferritin": {"in": ["normal", "high"]}}},
+            {"label": "Fe正常-↑, TIBC正常-↓, Ferritin正常-↑", "next": "S9",
+             "when": {"fe": {"in": ["normal", "high"]}, "tibc": {"in": ["normal", "low"]},
+                      "ferritin": {"in": ["normal", "high"]}}}
         ]
     },
     "S6": {
@@ -280,8 +299,8 @@ FLOWCHART = {
         "text": "CRP増加など、炎症性疾患を疑わせる所見はありますか？",
         "type": "question",
         "options": [
-            {"label": "あり", "next": "S8"},
-            {"label": "なし", "next": "S7_OTHER"}
+            {"label": "あり", "next": "S8", "when": {"inflammation": True}},
+            {"label": "なし", "next": "S7_OTHER", "when": {"inflammation": False}}
         ]
     },
     "S8": {
@@ -298,8 +317,8 @@ FLOWCHART = {
         "text": "TIBCの著明低下はありますか？",
         "type": "question",
         "options": [
-            {"label": "TIBC著明低下あり", "next": "S10"},
-            {"label": "なし (骨髄鉄染色へ)", "next": "S11"}
+            {"label": "TIBC著明低下あり", "next": "S10", "when": {"tibc_markedly_low": True}},
+            {"label": "なし (骨髄鉄染色へ)", "next": "S11", "when": {"tibc_markedly_low": False}}
         ]
     },
     "S10": {
@@ -327,6 +346,277 @@ FLOWCHART = {
     }
 }
 
+# Maximum number of alias hops resolved (e.g., "root" -> "A")
+MAX_ALIAS_DEPTH = 10
+
+# Comparison operators usable in "when" predicates
+CONDITION_OPERATORS = {
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "eq": operator.eq,
+    "in": lambda value, choices: value in choices,
+}
+
+
+def match_condition(condition, value):
+    """
+    1つの検査値が条件を満たすかを判定します。
+
+    Args:
+        condition: 値そのもの（等価比較）または {"ge": 101} のような比較の辞書
+        value: 検査値。未測定の場合はNone。
+
+    Returns:
+        bool or None: 判定結果。値が無く判定できない場合はNone。
+    """
+    if value is None:
+        return None
+    if isinstance(condition, Mapping):
+        return all(CONDITION_OPERATORS[op](value, operand) for op, operand in condition.items())
+    return value == condition
+
+
+def match_option(option, labs):
+    """
+    選択肢の "when" 述語を検査値の辞書で評価します。
+
+    Args:
+        option (dict): questionノードの選択肢
+        labs (dict): 検査値の辞書 (例: {"mcv": 72, "fe": "low"})
+
+    Returns:
+        bool or None: 全条件を満たせばTrue、いずれかに反すればFalse、
+        述語が無いか必要な値が欠けている場合はNone。
+    """
+    when = option.get("when")
+    if not when:
+        return None
+    result = True
+    for key, condition in when.items():
+        matched = match_condition(condition, labs.get(key))
+        if matched is False:
+            return False
+        if matched is None:
+            result = None
+    return result
+
+
+class _FrozenRecord(Mapping):
+    """
+    __slots__ ベースの不変オブジェクトに、元のdict形式と同じ読み取りビューを与える基底クラス。
+    値がNoneの属性はキーとして存在しないものとして扱います。
+    """
+    __slots__ = ()
+    _KEYS = ()
+
+    def _init_slots(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __getitem__(self, key):
+        if key in self._KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key in self._KEYS if getattr(self, key) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class Option(_FrozenRecord):
+    """
+    questionノードの選択肢（遷移エッジ）。
+
+    Attributes:
+        label (str): 選択肢の表示名
+        next (str): 遷移先ノードID（元の定義のまま）
+        target (int): 遷移先ノードの整数ID（解決できない場合は -1）
+        when (Mapping or None): 自動ルーティング用の述語
+    """
+    __slots__ = ("label", "next", "target", "when")
+    _KEYS = ("label", "next", "when")
+
+    def __init__(self, label, next_id, target, when=None):
+        self._init_slots(label=label, next=next_id, target=target, when=when)
+
+
+class Node(_FrozenRecord):
+    """
+    コンパイル済みのノード。
+
+    Attributes:
+        id (str): ノードID
+        index (int): 整数ID（CompiledFlowchart.nodes の添字）
+        type (str): "question" または "result"
+        text (str): 表示テキスト
+        options (tuple or None): Option のタプル（questionノード）
+        diagnosis (tuple or None): 鑑別診断のタプル（resultノード）
+        note (str or None): 備考
+    """
+    __slots__ = ("id", "index", "type", "text", "options", "diagnosis", "note")
+    _KEYS = ("text", "type", "options", "diagnosis", "note")
+
+    def __init__(self, node_id, index, node_type, text, options=None, diagnosis=None, note=None):
+        self._init_slots(id=node_id, index=index, type=node_type, text=text,
+                         options=options, diagnosis=diagnosis, note=note)
+
+
+def _freeze(value):
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class CompiledFlowchart(Mapping):
+    """
+    整数IDで引けるように事前解決された、不変のフローチャート。
+
+    エイリアスはコンパイル時に一度だけ解決されるため、検索はdict参照1回で済みます。
+    不変なので1つのインスタンスを複数スレッドで共有できます。
+    Mappingとしては元のFLOWCHARTと同じビュー（エイリアスは文字列、ノードはdict風）を提供します。
+    """
+    __slots__ = ("nodes", "root", "_index", "_aliases", "_keys", "_derived")
+
+    def __init__(self, nodes, index, aliases, keys):
+        object.__setattr__(self, "nodes", nodes)
+        object.__setattr__(self, "_derived", {})
+        object.__setattr__(self, "_index", MappingProxyType(index))
+        object.__setattr__(self, "_aliases", MappingProxyType(aliases))
+        object.__setattr__(self, "_keys", keys)
+        object.__setattr__(self, "root", index.get("root"))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledFlowchart is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledFlowchart is immutable")
+
+    def __getitem__(self, key):
+        alias = self._aliases.get(key)
+        if alias is not None:
+            return alias
+        if key in self._aliases:
+            raise KeyError(key)
+        return self.nodes[self._index[key]]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._aliases or key in self._index
+
+    def resolve(self, node_id):
+        """
+        ノードIDまたはエイリアスを整数IDに解決します。
+
+        Returns:
+            int or None: 整数ID。存在しない場合や解決できないエイリアスの場合はNone。
+        """
+        return self._index.get(node_id)
+
+    def node(self, node_id):
+        """
+        ノードIDまたはエイリアスに対応するノードを返します。
+
+        Returns:
+            Node or None: ノード。存在しない場合はNone。
+        """
+        index = self._index.get(node_id)
+        return None if index is None else self.nodes[index]
+
+    def derived(self, key, factory):
+        """
+        フローチャートから導出される索引を、初回アクセス時に一度だけ構築して返します。
+
+        Args:
+            key (str): 索引の名前
+            factory (callable): CompiledFlowchart を受け取り索引を返す関数
+
+        Returns:
+            object: 構築済みの索引
+        """
+        value = self._derived.get(key)
+        if value is None:
+            # Concurrent first calls may both build; setdefault keeps a single winner
+            value = self._derived.setdefault(key, factory(self))
+        return value
+
+
+def compile_flowchart(source, validate=False):
+    """
+    FLOWCHART形式のdictを不変の CompiledFlowchart にコンパイルします。
+
+    エイリアスは get_node と同じく最大 MAX_ALIAS_DEPTH 段まで解決し、
+    循環または長すぎるエイリアスは解決不能（検索結果None）として扱います。
+
+    Args:
+        source (dict): FLOWCHARTと同じ形式のフローチャート
+        validate (bool): コンパイル前に validation.check_flowchart で検証するか
+
+    Returns:
+        CompiledFlowchart: コンパイル済みフローチャート
+
+    Raises:
+        validation.FlowchartValidationError: validate=True で定義に問題がある場合
+    """
+    if validate:
+        from validation import check_flowchart
+        check_flowchart(source)
+    aliases = {key: value for key, value in source.items() if isinstance(value, str)}
+    node_ids = [key for key, value in source.items() if not isinstance(value, str)]
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    # Resolve aliases once (e.g., "root" -> "A")
+    for alias in aliases:
+        target = alias
+        value = source.get(alias)
+        max_depth = MAX_ALIAS_DEPTH
+        while isinstance(value, str) and max_depth > 0:
+            target = value
+            value = source.get(value)
+            max_depth -= 1
+        if value is not None and not isinstance(value, str):
+            index[alias] = index[target]
+
+    nodes = []
+    for i, node_id in enumerate(node_ids):
+        data = source[node_id]
+        options = None
+        if "options" in data:
+            options = tuple(
+                Option(opt["label"], opt["next"], index.get(opt["next"], -1), _freeze(opt.get("when")))
+                for opt in data["options"]
+            )
+        diagnosis = tuple(data["diagnosis"]) if "diagnosis" in data else None
+        nodes.append(Node(node_id, i, data.get("type"), data.get("text"),
+                          options, diagnosis, data.get("note")))
+    return CompiledFlowchart(tuple(nodes), index, aliases, tuple(source))
+
+
+# Alfred cache directive from ANEMIA_CACHE_SECONDS / ANEMIA_CACHE_LOOSERELOAD (None: disabled)
+ALFRED_CACHE = cache_from_env()
+
+
 class AnemiaWorkflow:
     """
     貧血鑑別診断のロジックを管理するクラス。
@@ -335,12 +625,40 @@ class AnemiaWorkflow:
     成田美和子「貧血の分類と診断の進め方」日内会誌 104:1375-1382, 2015
     に基づき、次の質問や診断結果を提示します。
     """
-    def __init__(self):
+    def __init__(self, flowchart=None, cache=ALFRED_CACHE):
         """
         ワークフロー初期化。
-        FLOWCHART定数を読み込みます。
+        コンパイル済みのFLOWCHARTを読み込みます。
+
+        Args:
+            flowchart (dict or CompiledFlowchart, optional): FLOWCHARTと同じ形式のフローチャート。
+                省略時はFLOWCHART。dictの場合はここでコンパイルされます。
+            cache (dict, optional): ノードの出力に付けるAlfredのキャッシュ指定
+                {"seconds": int, "loosereload": bool}。省略時は環境変数の設定（alfred_cache 参照）、
+                Noneならキャッシュ指定を出力しません。
+        """
+        if flowchart is None:
+            flowchart = COMPILED_FLOWCHART
+        elif not isinstance(flowchart, CompiledFlowchart):
+            flowchart = compile_flowchart(flowchart)
+        self.flowchart = flowchart
+        self.cache = cache
+        self._tail = _SKIPKNOWLEDGE + cache_fragment(cache)
+
+    @classmethod
+    def from_file(cls, path, use_cache=True):
+        """
+        外部定義ファイル（JSONまたはMermaid）からワークフローを作成します。
+
+        Args:
+            path (str): 定義ファイルのパス
+            use_cache (bool): 解析結果のキャッシュを使うか
+
+        Returns:
+            AnemiaWorkflow: 読み込んだフローチャートを持つワークフロー
         """
-        self.flowchart = FLOWCHART
+        from flowchart_loader import load_flowchart
+        return cls(load_flowchart(path, use_cache))
 
     def get_node(self, node_id):
         """
@@ -351,71 +669,451 @@ class AnemiaWorkflow:
             node_id (str): ノードID (例: "root", "A", "C")
             
         Returns:
-            dict or None: ノード情報の辞書。存在しない場合はNone。
+            Node or None: ノード情報（dictと同様に参照可能）。存在しない場合はNone。
         """
-        node = self.flowchart.get(node_id)
-        # Handle alias/redirection (e.g., "root" -> "A")
-        max_depth = 10
-        while isinstance(node, str) and max_depth > 0:
-            node = self.flowchart.get(node)
-            max_depth -= 1
-        if isinstance(node, str):
-            return None
+        if METRICS.enabled:
+            start = perf_counter()
+            node = self.flowchart.node(node_id)
+            METRICS.observe("get_node", perf_counter() - start)
+            return node
+        return self.flowchart.node(node_id)
+
+    def resolve_id(self, node_id):
+        """
+        エイリアスを解決し、実体ノードのIDを返します。
+
+        Args:
+            node_id (str): ノードIDまたはエイリアス (例: "root")
+
+        Returns:
+            str or None: 実体ノードのID。存在しない場合や循環エイリアスの場合はNone。
+        """
+        node = self.flowchart.node(node_id)
+        return None if node is None else node.id
+
+    def walk_path(self, choices, start="root"):
+        """
+        選択肢のインデックス列に従ってフローチャートを辿ります。
+
+        Args:
+            choices (iterable): 各questionノードで選ぶ選択肢のインデックス
+            start (str): 開始ノードID
+
+        Returns:
+            Node: 到達したノード
+
+        Raises:
+            ValueError: 開始ノードが存在しない、resultノードで選択が続く、
+                インデックスが範囲外、または遷移先が存在しない場合
+        """
+        nodes = self.flowchart.nodes
+        node = self.flowchart.node(start)
+        if node is None:
+            raise ValueError(f"Unknown start node: {start}")
+        for step, choice in enumerate(choices):
+            if node.type != "question":
+                raise ValueError(f"Step {step}: node '{node.id}' is not a question")
+            if not 0 <= choice < len(node.options):
+                raise ValueError(f"Step {step}: option {choice} out of range at node '{node.id}'")
+            option = node.options[choice]
+            if option.target < 0:
+                raise ValueError(f"Step {step}: node '{node.id}' points to missing node '{option.next}'")
+            node = nodes[option.target]
         return node
 
-    def generate_json_output(self, node_id):
+    def route_labs(self, labs, start="root"):
         """
-        Alfred Script Filter用のJSON出力を生成します。
-        
+        検査値の辞書に従い、データが許す限りフローチャートを自動で辿ります。
+
+        各questionノードで "when" 述語を満たす最初の選択肢へ進み、
+        どの選択肢も判定できない（値が無い・述語が無い）ノードで停止します。
+
         Args:
-            node_id (str): 現在のステップを示すノードID
-            
+            labs (dict): 検査値の辞書 (例: {"cytopenia": False, "mcv": 72, "fe": "low"})
+            start (str): 開始ノードID
+
         Returns:
-            str: Alfredが解釈可能なJSON文字列
+            tuple: (停止したノードID, 辿ったノードIDのリスト)。
+            開始ノードが存在しない場合は (None, [])。
         """
-        node = self.get_node(node_id)
-        if not node:
-            return json.dumps({"items": [{"title": "Error", "subtitle": "Node not found"}]})
+        nodes = self.flowchart.nodes
+        node = self.flowchart.node(start)
+        path = []
+        while node is not None and len(path) <= len(nodes):
+            path.append(node.id)
+            if node.type != "question":
+                break
+            target = next(
+                (opt.target for opt in node.options if match_option(opt, labs)),
+                -1,
+            )
+            node = nodes[target] if target >= 0 else None
+        return (path[-1] if path else None), path
+
+    @property
+    def path_index(self):
+        """フローチャートの経路索引（path_index.PathIndex、初回アクセス時に構築）。"""
+        from path_index import get_index
+        return get_index(self.flowchart)
+
+    def paths(self, node_id=None):
+        """
+        rootから末端ノードまでの経路を返します。
+
+        Args:
+            node_id (str, optional): 指定した場合、このノードを通る経路のみ
+
+        Returns:
+            tuple: IndexedPath(nodes, choices) のタプル。choices は walk_path にそのまま渡せます。
+            ノードが存在しない場合は空のタプル。
+        """
+        index = self.path_index
+        if node_id is None:
+            return index.paths
+        resolved = self.flowchart.resolve(node_id)
+        return () if resolved is None else index.paths_through(resolved)
+
+    def depth(self, node_id):
+        """
+        rootからノードまでの最短ステップ数を返します。
+
+        Returns:
+            int or None: 深さ。存在しない、またはrootから到達できない場合はNone。
+        """
+        resolved = self.flowchart.resolve(node_id)
+        return None if resolved is None else self.path_index.depth[resolved]
+
+    def ancestors(self, node_id):
+        """
+        ノードに至るいずれかの経路上にある祖先ノードIDを返します。
+
+        Returns:
+            tuple: 祖先ノードID（浅い順）。存在しない場合は空のタプル。
+        """
+        resolved = self.flowchart.resolve(node_id)
+        return () if resolved is None else self.path_index.ancestors(resolved)
+
+    def paths_for_diagnosis(self, diagnosis):
+        """
+        診断名に至る経路を返します（末尾の括弧書きは無視して照合）。
+
+        Args:
+            diagnosis (str): 診断名 (例: "骨髄異形成症候群")
+
+        Returns:
+            tuple: IndexedPath のタプル
+        """
+        return self.path_index.paths_for_diagnosis(diagnosis)
+
+    def nodes_for_diagnosis(self, diagnosis):
+        """
+        診断名を出すresultノードのIDを返します（末尾の括弧書きは無視して照合）。
+
+        Args:
+            diagnosis (str): 診断名 (例: "骨髄異形成症候群")
+
+        Returns:
+            tuple: ノードIDのタプル (例: ("C", "L14", "N18"))
+        """
+        return self.path_index.terminals_for_diagnosis(diagnosis)
+
+    def search(self, query, limit=9):
+        """
+        ノードのテキスト・選択肢・診断名・備考を文字n-gramで検索します。
+
+        Args:
+            query (str): 検索文字列 (例: "鉄欠乏", "PNH")
+            limit (int): 返す最大件数
+
+        Returns:
+            list: (ノードID, スコア) のリスト（関連度順）
+        """
+        from search_index import get_index
+        return get_index(self.flowchart).search(query, limit)
+
+    def generate_search_output(self, query, limit=9):
+        """
+        検索結果をAlfred Script Filter用のJSONとして出力します。
+        各項目を選択すると該当ノードへ移動します。
 
+        Args:
+            query (str): 検索文字列
+            limit (int): 表示する最大件数
+
+        Returns:
+            str: Alfredが解釈可能なJSON文字列
+        """
         items = []
-        
-        # Display the question/text as the first item (unselectable/info)
-        items.append({
-            "title": node["text"].split("\n")[0],
-            "subtitle": "\n".join(node["text"].split("\n")[1:]) if "\n" in node["text"] else "",
-            "valid": False,
-            "icon": {"path": "icon.png"}
-        })
-
-        if node["type"] == "question":
-            for option in node["options"]:
-                items.append({
-                    "title": option["label"],
-                    "subtitle": "選択して次へ",
-                    "arg": option["next"],
-                    "valid": True
-                })
-        elif node["type"] == "result":
-            diagnosis_list = ", ".join(node.get("diagnosis", []))
+        for node_id, _ in self.search(query, limit):
+            node = self.flowchart.node(node_id)
+            if node.type == "result":
+                subtitle = "鑑別診断: " + ", ".join(node.diagnosis or ())
+            else:
+                subtitle = "質問へ移動"
             items.append({
-                "title": "鑑別診断結果:",
-                "subtitle": diagnosis_list,
-                "valid": False
+                "uid": UID_PREFIX + node_id,
+                "title": node.text.split("\n")[0],
+                "subtitle": subtitle,
+                "arg": node_id,
+                "valid": True
             })
-            if "note" in node:
-                items.append({
-                    "title": "備考",
-                    "subtitle": node["note"],
-                    "valid": False
-                })
-            # Option to restart
+        if not items:
             items.append({
-                "title": "最初に戻る",
+                "uid": UID_PREFIX + "restart",
+                "title": f"「{query}」に一致する項目がありません",
+                "subtitle": "選択すると最初から始めます",
                 "arg": "root",
                 "valid": True
             })
+        import json
+        # Search results are never cached: Alfred would replay them for the next query
+        return json.dumps({"items": items, "skipknowledge": True}, ensure_ascii=False, indent=2)
+
+    def generate_json_output(self, node_id):
+        """
+        Alfred Script Filter用のJSON出力を生成します。
+
+        各項目にはノードと選択肢ごとに固定の uid が付き、"skipknowledge" で
+        Alfredの学習による並べ替えを止めます。キャッシュ指定があれば "cache" も出力します。
+
+        node_id に経路トークン（"~" で始まる文字列、encode_path 参照）を渡した場合は、
+        選択肢の arg が次の経路トークンになり、1つ前に戻る項目（サブタイトルにパンくず）が追加されます。
+
+        Args:
+            node_id (str): 現在のステップを示すノードIDまたは経路トークン
+
+        Returns:
+            str: Alfredが解釈可能なJSON文字列
+        """
+        if METRICS.enabled:
+            start = perf_counter()
+            output = self._render_json(node_id)
+            METRICS.observe("generate_json_output", perf_counter() - start)
+            METRICS.hit(self._hit_key(node_id))
+            return output
+        return self._render_json(node_id)
+
+    def _hit_key(self, node_id):
+        if node_id.startswith(PATH_TOKEN_PREFIX):
+            try:
+                return self.walk_path(decode_path(node_id)).id
+            except ValueError:
+                return node_id
+        return self.resolve_id(node_id) or node_id
+
+    def _render_json(self, node_id):
+        if node_id.startswith(PATH_TOKEN_PREFIX):
+            return self._render_token(node_id)
+
+        node = self.get_node(node_id)
+        if not node:
+            return NOT_FOUND_JSON
+        fragments = self.flowchart.derived(FRAGMENTS_KEY, _render_fragments)
+        head, options = fragments[node.index]
+        items = [head]
+        if node.type == "question":
+            for option, (prefix, suffix) in zip(node.options, options):
+                items.append(prefix + fragments.dump_arg(option.next) + suffix)
+        elif node.type == "result":
+            items.append(fragments.restart)
+        return _join_items(items, self._tail)
+
+    def _render_token(self, token):
+        # Walk the encoded choices once, collecting the labels for the breadcrumb
+        nodes = self.flowchart.nodes
+        node = self.flowchart.node("root")
+        labels = []
+        try:
+            choices = decode_path(token)
+        except ValueError:
+            return NOT_FOUND_JSON
+        for choice in choices:
+            if node is None or node.type != "question" or choice >= len(node.options) \
+                    or node.options[choice].target < 0:
+                return NOT_FOUND_JSON
+            option = node.options[choice]
+            labels.append(option.label)
+            node = nodes[option.target]
+        if node is None:
+            return NOT_FOUND_JSON
+
+        fragments = self.flowchart.derived(FRAGMENTS_KEY, _render_fragments)
+        head, options = fragments[node.index]
+        items = [head]
+        if node.type == "question":
+            dump_arg = fragments.dump_arg
+            for i, (prefix, suffix) in enumerate(options):
+                items.append(prefix + dump_arg(token + _PATH_DIGITS[i]) + suffix)
+        elif node.type == "result":
+            items.append(fragments.restart_token)
+        if choices:
+            items.append(_item_json({
+                "uid": UID_PREFIX + "back",
+                "title": "1つ前に戻る",
+                "subtitle": BREADCRUMB_SEPARATOR.join(labels),
+                "arg": token[:-1],
+                "valid": True
+            }))
+        return _join_items(items, self._tail)
+
+
+# Arg tokens that carry the session history: "~" followed by one base-36 digit per choice
+PATH_TOKEN_PREFIX = "~"
+_PATH_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+_PATH_VALUES = {digit: value for value, digit in enumerate(_PATH_DIGITS)}
+
+BREADCRUMB_SEPARATOR = " › "
+
+FRAGMENTS_KEY = "json_fragments"
+
+# Item uids are stable per node and option ("anemia:<node>:<option index>")
+UID_PREFIX = "anemia:"
+_SKIPKNOWLEDGE = ',\n  "skipknowledge": true'
+
+# json.dumps({"items": [{"title": "Error", "subtitle": "Node not found"}]}), spelled out so that
+# importing this module does not import json (it is imported on first render)
+NOT_FOUND_JSON = '{"items": [{"title": "Error", "subtitle": "Node not found"}]}'
+
+# Serialized in place of the option arg, then split on, to build per-option templates
+_ARG_PLACEHOLDER = "\0arg\0"
+
+
+def encode_path(choices):
+    """
+    選択肢インデックス列を経路トークンに変換します。
+
+    Args:
+        choices (iterable): rootから各questionノードで選んだ選択肢のインデックス
+
+    Returns:
+        str: 経路トークン (例: [1, 1, 2] -> "~112")
+
+    Raises:
+        ValueError: インデックスが 0〜35 の範囲外の場合
+    """
+    digits = []
+    for choice in choices:
+        if not 0 <= choice < len(_PATH_DIGITS):
+            raise ValueError(f"Option index {choice} cannot be encoded in a path token")
+        digits.append(_PATH_DIGITS[choice])
+    return PATH_TOKEN_PREFIX + "".join(digits)
+
+
+def decode_path(token):
+    """
+    経路トークンを選択肢インデックスのタプルに戻します。
+
+    Args:
+        token (str): 経路トークン (例: "~112")
+
+    Returns:
+        tuple: 選択肢インデックスのタプル
+
+    Raises:
+        ValueError: トークンの形式が不正な場合
+    """
+    if not token.startswith(PATH_TOKEN_PREFIX):
+        raise ValueError(f"Not a path token: {token}")
+    try:
+        return tuple(_PATH_VALUES[digit] for digit in token[len(PATH_TOKEN_PREFIX):])
+    except KeyError:
+        raise ValueError(f"Invalid path token: {token}") from None
+
+
+def _item_json(item):
+    import json
+    # Same layout as json.dumps({"items": [...]}, indent=2) produces for a list element
+    return json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+
+
+def _join_items(items, tail=""):
+    # tail: further top-level fields, each starting with ",\n  "
+    return '{\n  "items": [\n    ' + ",\n    ".join(items) + "\n  ]" + tail + "\n}"
+
+
+# json.dumps(_ARG_PLACEHOLDER, ensure_ascii=False), spelled out for the same reason as NOT_FOUND_JSON
+_PLACEHOLDER_JSON = '"\\u0000arg\\u0000"'
+
+
+class _Fragments(dict):
+    """
+    ノード整数ID → 出力の不変部分。初めて参照されたノードだけをシリアライズします
+    （大きなフローチャートや差分ビルドで、表示しないノードの分まで構築しないため）。
+    最初に戻る項目（ノードID用 restart・経路トークン用 restart_token）と、
+    選択肢の arg をシリアライズする dump_arg も保持します。
+    """
+    __slots__ = ("nodes", "dump_arg", "restart", "restart_token")
+
+    def __init__(self, flowchart):
+        import json
+
+        super().__init__()
+        self.nodes = flowchart.nodes
+        # Same output as json.dumps(arg, ensure_ascii=False) for a string, without the per-call setup
+        self.dump_arg = json.JSONEncoder(ensure_ascii=False).encode
+        self.restart = _item_json({"uid": UID_PREFIX + "restart", "title": "最初に戻る", "arg": "root", "valid": True})
+        self.restart_token = _item_json({"uid": UID_PREFIX + "restart", "title": "最初に戻る",
+                                         "arg": PATH_TOKEN_PREFIX, "valid": True})
+
+    def __missing__(self, index):
+        # Concurrent first lookups may both serialize; the results are identical
+        value = self[index] = _node_fragments(self.nodes[index])
+        return value
+
+
+def _render_fragments(flowchart):
+    """
+    ノードごとの出力の不変部分を、参照されたときに一度だけシリアライズする対応表を作ります。
+
+    Returns:
+        _Fragments: ノード整数IDごとの (先頭項目, 選択肢ごとの (argの前, argの後) のタプル)。
+        resultノードの先頭項目には診断結果・備考の項目も含まれます。
+    """
+    return _Fragments(flowchart)
+
+
+def _node_fragments(node):
+    text = node.text or ""
+    # Display the question/text as the first item (unselectable/info)
+    uid = UID_PREFIX + node.id
+    items = [_item_json({
+        "uid": uid,
+        "title": text.split("\n")[0],
+        "subtitle": "\n".join(text.split("\n")[1:]) if "\n" in text else "",
+        "valid": False,
+        "icon": {"path": "icon.png"}
+    })]
+    options = ()
+    if node.type == "question":
+        options = tuple(
+            tuple(_item_json({
+                "uid": f"{uid}:{i}",
+                "title": option.label,
+                "subtitle": "選択して次へ",
+                "arg": _ARG_PLACEHOLDER,
+                "valid": True
+            }).split(_PLACEHOLDER_JSON))
+            for i, option in enumerate(node.options)
+        )
+    elif node.type == "result":
+        items.append(_item_json({
+            "uid": uid + ":diagnosis",
+            "title": "鑑別診断結果:",
+            "subtitle": ", ".join(node.diagnosis or ()),
+            "valid": False
+        }))
+        if node.note is not None:
+            items.append(_item_json({
+                "uid": uid + ":note",
+                "title": "備考",
+                "subtitle": node.note,
+                "valid": False
+            }))
+    return ",\n    ".join(items), options
+
 
-        return json.dumps({"items": items}, ensure_ascii=False, indent=2)
+# Shared, immutable compiled form of FLOWCHART
+COMPILED_FLOWCHART = compile_flowchart(FLOWCHART)
 
 if __name__ == "__main__":
     # Simple test execution
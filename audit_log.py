@@ -0,0 +1,403 @@
+"""
+診療監査用のセッション監査ログ（追記専用のバイナリログ）とリプレイ。
+
+ユーザーが辿った各ステップ（表示した引数・選んだ選択肢・時刻）を1レコードずつ追記します。
+引数が経路トークンの場合は回答履歴全体を含むため、リプレイ時に `AnemiaWorkflow` で
+到達ノードを復元できます。各レコードには実際に出力したバイト列のCRC32も記録するので、
+リプレイで同じ出力が再現されたか（フローチャートが変わっていないか）を検証できます。
+CRC32はAlfredのキャッシュ指定（alfred_cache）を除いたバイト列から求めるため、
+ANEMIA_CACHE_SECONDS の設定が記録時とリプレイ時で異なっても照合できます。
+
+レコード形式（リトルエンディアン）:
+    MAGIC (2 bytes) | 出力元 (uint8) | 選択肢 (int8, 不明は -1) | 引数の長さ (uint16)
+    | 時刻 (int64, UNIXエポックからのナノ秒) | 出力のCRC32 (uint32) | 引数 (UTF-8)
+
+書き込み:
+    - CLI（run_diagnosis.py）: 応答を出力した後、O_APPENDで開いたファイルへ1回のwriteで追記
+    - デーモン（diagnosis_daemon.py）: メモリ上のバッファに積み、バックグラウンドスレッドがまとめて書き出し
+    どちらもファイルが max_bytes を超えると `<パス>.1`, `<パス>.2`, ... へローテーションします。
+
+有効化:
+    環境変数 ANEMIA_AUDIT_LOG にログファイルのパスを指定（デーモンは --audit-log でも可）
+
+リプレイ:
+    python3 audit_log.py replay [ログファイル] [--mismatches-only] > replayed.jsonl
+    python3 audit_log.py dump [ログファイル]
+"""
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple
+
+from alfred_cache import strip_cache
+
+ENV_PATH = "ANEMIA_AUDIT_LOG"
+
+MAGIC = b"\xa7L"
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_BACKUPS = 10
+
+SOURCE_CLI = 0
+SOURCE_DAEMON = 1
+SOURCE_NAMES = {SOURCE_CLI: "cli", SOURCE_DAEMON: "daemon"}
+
+# Upper bound on a logged argument; longer free-text queries are truncated
+MAX_ARG_BYTES = 1024
+
+_RECORD = struct.Struct("<2sBbHqI")
+_PATH_PREFIX = "~"
+
+AuditRecord = namedtuple("AuditRecord", ["timestamp_ns", "source", "choice", "checksum", "arg"])
+
+
+def path_choice(arg):
+    """
+    経路トークンの最後の選択肢のインデックスを返します（anemia_flowをimportせずに計算）。
+
+    Args:
+        arg (str): ノードIDまたは経路トークン
+
+    Returns:
+        int: 選択肢のインデックス。経路トークンでない・回答が無い場合は -1。
+    """
+    if len(arg) < 2 or not arg.startswith(_PATH_PREFIX):
+        return -1
+    try:
+        return int(arg[-1], 36)
+    except ValueError:
+        return -1
+
+
+def pack_record(arg, output, source=SOURCE_CLI, timestamp_ns=None):
+    """
+    1ステップ分のレコードをバイト列にします。
+
+    Args:
+        arg (str): 表示した引数（ノードID・経路トークン・検索語）
+        output (bytes): 出力したバイト列（キャッシュ指定を除いたCRC32のみ記録）
+        source (int): 出力元（SOURCE_CLI / SOURCE_DAEMON）
+        timestamp_ns (int, optional): 時刻（省略時は現在時刻）
+
+    Returns:
+        bytes: レコードのバイト列
+    """
+    encoded = arg.encode("utf-8", "replace")[:MAX_ARG_BYTES]
+    if timestamp_ns is None:
+        timestamp_ns = time.time_ns()
+    return _RECORD.pack(MAGIC, source, path_choice(arg), len(encoded), timestamp_ns,
+                        zlib.crc32(strip_cache(output))) + encoded
+
+
+def rotate(path, backups=DEFAULT_BACKUPS, max_bytes=0):
+    """
+    ログファイルをローテーションします（`<パス>.1` が最新のバックアップ）。
+
+    複数のプロセスが同時にローテーションしないよう `<パス>.lock` をロックし、
+    ロック取得後もファイルが max_bytes 以上の場合だけローテーションします。
+
+    Args:
+        path (str): ログファイルのパス
+        backups (int): 残すバックアップの数
+        max_bytes (int): ローテーションする大きさの下限
+    """
+    import fcntl
+
+    lock_fd = os.open(path + ".lock", os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            if os.stat(path).st_size < max_bytes:
+                return  # another process rotated it first
+        except FileNotFoundError:
+            return
+        if backups < 1:
+            os.unlink(path)
+            return
+        for i in range(backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+    finally:
+        os.close(lock_fd)
+
+
+class AuditLog:
+    """
+    1レコードごとにO_APPENDで1回のwriteを行う監査ログ（CLI用）。
+    """
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, source=SOURCE_CLI):
+        """
+        Args:
+            path (str): ログファイルのパス
+            max_bytes (int): ローテーションするファイルの大きさ
+            backups (int): 残すバックアップの数
+            source (int): レコードに記録する出力元
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.source = source
+
+    def append(self, arg, output, timestamp_ns=None):
+        """
+        1ステップを記録します。
+
+        Args:
+            arg (str): 表示した引数
+            output (bytes): 出力したバイト列
+            timestamp_ns (int, optional): 時刻
+        """
+        self._write(pack_record(arg, output, self.source, timestamp_ns))
+
+    def _write(self, data):
+        # A single write() on an O_APPEND descriptor keeps concurrent processes' records whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size >= self.max_bytes:
+            rotate(self.path, self.backups, self.max_bytes)
+
+    def close(self):
+        """書き出し待ちのレコードを書き出します（このクラスでは何もしません）。"""
+
+
+class BufferedAuditLog(AuditLog):
+    """
+    レコードをメモリ上に溜め、バックグラウンドスレッドがまとめて書き出す監査ログ（デーモン用）。
+
+    `append` はレコードの組み立てとリストへの追加だけを行うため、応答の処理を待たせません。
+    """
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, source=SOURCE_DAEMON,
+                 flush_interval=1.0, max_buffer=256 * 1024):
+        """
+        Args:
+            path (str): ログファイルのパス
+            max_bytes (int): ローテーションするファイルの大きさ
+            backups (int): 残すバックアップの数
+            source (int): レコードに記録する出力元
+            flush_interval (float): 書き出し間隔（秒）
+            max_buffer (int): この大きさを超えたら間隔を待たずに書き出す
+        """
+        import threading
+
+        super().__init__(path, max_bytes, backups, source)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self._thread.start()
+
+    def append(self, arg, output, timestamp_ns=None):
+        data = pack_record(arg, output, self.source, timestamp_ns)
+        with self._lock:
+            self._buffer.append(data)
+            self._buffered += len(data)
+            full = self._buffered >= self.max_buffer
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """溜まっているレコードを書き出します。"""
+        with self._lock:
+            records, self._buffer, self._buffered = self._buffer, [], 0
+        if records:
+            self._write(b"".join(records))
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"audit log write failed: {e}", file=sys.stderr)
+
+    def close(self):
+        """バックグラウンドスレッドを止め、残りのレコードを書き出します。"""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+
+def open_log(path=None, buffered=False, **kwargs):
+    """
+    監査ログを開きます。
+
+    Args:
+        path (str, optional): ログファイルのパス（省略時は環境変数 ANEMIA_AUDIT_LOG）
+        buffered (bool): バックグラウンドで書き出すか（デーモン用）
+        **kwargs: AuditLog / BufferedAuditLog への追加の引数
+
+    Returns:
+        AuditLog or None: 監査ログ。パスが指定されていない場合はNone。
+    """
+    path = path or os.environ.get(ENV_PATH)
+    if not path:
+        return None
+    return (BufferedAuditLog if buffered else AuditLog)(path, **kwargs)
+
+
+def log_files(path):
+    """
+    ローテーションされたファイルを含め、ログファイルを古い順に返します。
+
+    Args:
+        path (str): ログファイルのパス
+
+    Returns:
+        list: 存在するファイルのパス
+    """
+    backups = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        backups.append(f"{path}.{i}")
+        i += 1
+    files = backups[::-1]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def parse_records(data):
+    """
+    バイト列からレコードを読み出します。
+
+    書き込み途中で途切れた末尾は無視し、壊れた箇所は次のMAGICまで読み飛ばします。
+
+    Args:
+        data (bytes): ログファイルの内容
+
+    Yields:
+        AuditRecord: レコード
+    """
+    pos = 0
+    end = len(data)
+    while pos + _RECORD.size <= end:
+        magic, source, choice, length, timestamp_ns, checksum = _RECORD.unpack_from(data, pos)
+        start = pos + _RECORD.size
+        if magic != MAGIC or source not in SOURCE_NAMES or start + length > end:
+            # Resynchronize on the next record boundary (none if the final record was cut short)
+            pos = data.find(MAGIC, pos + 1)
+            if pos < 0:
+                return
+            continue
+        arg = data[start:start + length].decode("utf-8", "replace")
+        yield AuditRecord(timestamp_ns, source, choice, checksum, arg)
+        pos = start + length
+
+
+def read_records(path):
+    """
+    ローテーションされたファイルを含め、ログのレコードを古い順に読み出します。
+
+    Args:
+        path (str): ログファイルのパス
+
+    Yields:
+        AuditRecord: レコード
+    """
+    for file_path in log_files(path):
+        with open(file_path, "rb") as f:
+            yield from parse_records(f.read())
+
+
+def _renderer(source):
+    # The same rendering the logging process used, so that the checksums are comparable
+    if source == SOURCE_DAEMON:
+        from diagnosis_daemon import render
+        return render
+    from run_diagnosis import render_output
+    return lambda wf, arg: (render_output(wf, arg) + "\n").encode("utf-8")
+
+
+def replay(records, wf=None):
+    """
+    レコードを `AnemiaWorkflow` で再生し、到達ノードと出力の再現性を返します。
+
+    Args:
+        records (iterable): AuditRecord のイテラブル
+        wf (AnemiaWorkflow, optional): 再生に使うワークフロー
+
+    Yields:
+        dict: {"timestamp_ns", "source", "arg", "choice", "option", "node_id", "type", ["diagnosis"], "reproduced"}。
+        option は選んだ選択肢のラベル（経路トークンの場合）。ノードに解決できない引数（検索語など）の node_id はNone。
+    """
+    from anemia_flow import PATH_TOKEN_PREFIX, AnemiaWorkflow, decode_path
+
+    if wf is None:
+        wf = AnemiaWorkflow()
+    renderers = {}
+    for record in records:
+        render = renderers.get(record.source)
+        if render is None:
+            render = renderers[record.source] = _renderer(record.source)
+        node = option = None
+        if record.arg.startswith(PATH_TOKEN_PREFIX):
+            try:
+                choices = decode_path(record.arg)
+                node = wf.walk_path(choices)
+                if choices:
+                    option = wf.walk_path(choices[:-1]).options[choices[-1]].label
+            except ValueError:
+                pass
+        else:
+            node = wf.get_node(record.arg)
+        result = {
+            "timestamp_ns": record.timestamp_ns,
+            "source": SOURCE_NAMES[record.source],
+            "arg": record.arg,
+            "choice": record.choice,
+            "option": option,
+            "node_id": None if node is None else node.id,
+            "type": None if node is None else node.type,
+        }
+        if node is not None and node.diagnosis is not None:
+            result["diagnosis"] = list(node.diagnosis)
+        result["reproduced"] = zlib.crc32(strip_cache(render(wf, record.arg))) == record.checksum
+        yield result
+
+
+def main(argv=None, stdout=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="監査ログの表示・リプレイ")
+    parser.add_argument("command", choices=["replay", "dump"], help="replay: 再生して検証 / dump: 記録の表示")
+    parser.add_argument("log", nargs="?", default=os.environ.get(ENV_PATH), help="ログファイル（既定: $ANEMIA_AUDIT_LOG）")
+    parser.add_argument("--mismatches-only", action="store_true", help="出力が再現されなかったレコードだけを表示")
+    args = parser.parse_args(argv)
+    stdout = sys.stdout if stdout is None else stdout
+    if not args.log:
+        parser.error("log file is required (or set ANEMIA_AUDIT_LOG)")
+
+    records = read_records(args.log)
+    if args.command == "dump":
+        for record in records:
+            stdout.write(json.dumps(dict(record._asdict(), source=SOURCE_NAMES[record.source]),
+                                    ensure_ascii=False) + "\n")
+        return 0
+
+    total = mismatched = 0
+    for result in replay(records):
+        total += 1
+        if not result["reproduced"]:
+            mismatched += 1
+        elif args.mismatches_only:
+            continue
+        stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print(f"{total} records replayed, {mismatched} not reproduced", file=sys.stderr)
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
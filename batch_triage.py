@@ -0,0 +1,357 @@
+"""
+コホート検査データの一括トリアージ。
+
+FLOWCHARTの "when" 述語を決定表にコンパイルし、列指向の検査データ
+（NumPy配列の辞書、またはCSVから読み込んだ配列）をNumPyのマスク演算で
+まとめて評価します。各行について停止したノードIDと、resultノードであれば
+診断リストのインデックス（`BatchTriage.diagnoses` の添字、それ以外は -1）を返します。
+
+欠損値（数値列のNaN、文字列列の空文字、None）がある行は、
+データが尽きたquestionノードで停止します。
+
+実行:
+    python3 batch_triage.py labs.csv > triage.csv
+"""
+import csv
+import sys
+from collections.abc import Mapping
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional for the Alfred workflow itself
+    np = None
+
+from anemia_flow import AnemiaWorkflow
+
+# Vectorized counterparts of anemia_flow.CONDITION_OPERATORS ("in" is handled by np.isin)
+_VECTOR_OPERATORS = {} if np is None else {
+    "lt": np.less,
+    "le": np.less_equal,
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "eq": np.equal,
+}
+
+_TRUE_WORDS = ("true", "yes", "1")
+_FALSE_WORDS = ("false", "no", "0")
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("batch_triage の利用には NumPy が必要です (pip install numpy)")
+
+
+def normalize_column(values):
+    """
+    1列分の値を評価用の配列に変換します。
+
+    数値・真偽値は float64（欠損はNaN）、それ以外は文字列配列（欠損は空文字）になります。
+
+    Args:
+        values: 配列またはシーケンス
+
+    Returns:
+        numpy.ndarray: 正規化済みの列
+    """
+    _require_numpy()
+    arr = np.asarray(values)
+    if arr.dtype.kind in "biuf":
+        return arr.astype(np.float64)
+    if arr.dtype.kind == "U":
+        return arr
+    obj = arr.astype(object)
+    try:
+        return obj.astype(np.float64)
+    except (TypeError, ValueError):
+        return np.where(np.equal(obj, None), "", obj).astype(str)
+
+
+def _column_kind(raw):
+    arr = np.asarray(raw, dtype=str)
+    missing = arr == ""
+    lowered = np.char.lower(np.char.strip(arr))
+    if np.all(missing | np.isin(lowered, _TRUE_WORDS + _FALSE_WORDS)):
+        return "bool"
+    try:
+        np.where(missing, "nan", arr).astype(np.float64)
+    except ValueError:
+        return "str"
+    return "float"
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _parse_text_column(raw, kind=None):
+    arr = np.asarray(raw, dtype=str)
+    if kind == "str":
+        return arr
+    missing = arr == ""
+    if kind != "float":
+        lowered = np.char.lower(np.char.strip(arr))
+        is_true = np.isin(lowered, _TRUE_WORDS)
+        is_false = np.isin(lowered, _FALSE_WORDS)
+        if kind == "bool" or np.all(missing | is_true | is_false):
+            return np.where(is_true, 1.0, np.where(is_false, 0.0, np.nan))
+    try:
+        return np.where(missing, "nan", arr).astype(np.float64)
+    except ValueError:
+        if kind is None:
+            return arr
+    # Values that do not fit the given kind count as missing
+    return np.array([_to_float(value) for value in arr.tolist()], dtype=np.float64)
+
+
+def _transpose(width, rows):
+    raw = [[] for _ in range(width)]
+    for row in rows:
+        for i, column in enumerate(raw):
+            column.append(row[i] if i < len(row) else "")
+    return raw
+
+
+def infer_column_kinds(header, rows):
+    """
+    CSVの行から各列の型を推定します。
+
+    Args:
+        header (list): 列名のリスト
+        rows (iterable): 行（文字列のリスト）のイテラブル
+
+    Returns:
+        dict: 列名から型（"bool", "float", "str"）への辞書
+    """
+    _require_numpy()
+    return {name: _column_kind(column) for name, column in zip(header, _transpose(len(header), rows))}
+
+
+def columns_from_rows(header, rows, kinds=None):
+    """
+    CSVの行を列ごとの配列に変換します。
+
+    Args:
+        header (list): 列名のリスト
+        rows (iterable): 行（文字列のリスト）のイテラブル
+        kinds (dict, optional): 列名から型への辞書（`infer_column_kinds` の戻り値）。
+            指定した列はその型で読み込み、型に合わない値は欠損として扱います。
+            省略した列は値から型を推定します
+
+    Returns:
+        dict: 列名から正規化済み配列への辞書
+    """
+    _require_numpy()
+    kinds = kinds or {}
+    return {name: _parse_text_column(column, kinds.get(name))
+            for name, column in zip(header, _transpose(len(header), rows))}
+
+
+def load_csv(source):
+    """
+    ヘッダー付きCSVを列ごとの配列に読み込みます。
+
+    Args:
+        source (str or file): CSVファイルのパスまたはファイルオブジェクト
+
+    Returns:
+        dict: 列名から正規化済み配列への辞書
+    """
+    _require_numpy()
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8") as f:
+            return load_csv(f)
+    reader = csv.reader(source)
+    header = next(reader, [])
+    return columns_from_rows(header, reader)
+
+
+def _condition_mask(condition, column):
+    """条件を満たす（かつ欠損でない）行のマスクを返します。"""
+    if column.dtype.kind == "f":
+        known = ~np.isnan(column)
+    else:
+        known = column != ""
+    if isinstance(condition, Mapping):
+        mask = known
+        for op, operand in condition.items():
+            if op == "in":
+                mask = mask & np.isin(column, list(operand))
+            else:
+                with np.errstate(invalid="ignore"):
+                    mask = mask & _VECTOR_OPERATORS[op](column, operand)
+        return mask
+    return known & (column == condition)
+
+
+class BatchTriage:
+    """
+    フローチャートを決定表にコンパイルし、列指向データを一括評価するエンジン。
+    """
+    def __init__(self, flowchart=None):
+        """
+        決定表を構築します。
+
+        Args:
+            flowchart (dict, optional): FLOWCHARTと同じ形式のフローチャート
+        """
+        _require_numpy()
+        compiled = self.flowchart = AnemiaWorkflow(flowchart).flowchart
+        self.node_ids = [node.id for node in compiled.nodes]
+        self.root = compiled.root
+
+        # rules[code] = [(target_code, [(key, condition), ...]), ...] for predicate-bearing options
+        self.rules = {}
+        self.diagnoses = []
+        diagnosis_of = []
+        for node in compiled.nodes:
+            if node.type == "result":
+                diagnosis_of.append(len(self.diagnoses))
+                self.diagnoses.append(list(node.diagnosis or ()))
+                continue
+            diagnosis_of.append(-1)
+            rules = [
+                (option.target, list(option.when.items()))
+                for option in node.options or ()
+                if option.when and option.target >= 0
+            ]
+            if rules:
+                self.rules[node.index] = rules
+        self.diagnosis_of = np.array(diagnosis_of, dtype=np.int32)
+
+    def evaluate_codes(self, columns):
+        """
+        全行を評価し、停止したノードの整数コードを返します。
+
+        Args:
+            columns (dict): 検査項目名から配列への辞書（全列同じ長さ）
+
+        Returns:
+            numpy.ndarray: 行ごとのノードコード（`node_ids` の添字, int32）
+        """
+        return self._run(columns, track_paths=False)[0]
+
+    def evaluate_paths(self, columns):
+        """
+        全行を評価し、停止ノードに加えて各行が辿った経路を返します。
+
+        経路は行ごとに整数の経路コードで表し、経路表（経路コードを添字とする
+        ノードコードのタプルのリスト）と組にして返します。経路表の大きさは
+        実際に現れた経路の数（フローチャートの大きさ程度）に収まります。
+
+        Args:
+            columns (dict): 検査項目名から配列への辞書（全列同じ長さ）
+
+        Returns:
+            tuple: (行ごとのノードコード, 行ごとの経路コード（int32）, 経路表)
+        """
+        return self._run(columns, track_paths=True)
+
+    def _run(self, columns, track_paths):
+        cols = {key: normalize_column(values) for key, values in columns.items()}
+        n = len(next(iter(cols.values()))) if cols else 0
+        state = np.full(n, self.root, dtype=np.int32)
+        active = np.arange(n)
+        path_codes = np.zeros(n, dtype=np.int32) if track_paths else None
+        paths = [(self.root,)]
+        path_ids = {}  # (parent path code, node code) -> path code
+
+        # Each pass advances every still-moving row by one edge
+        for _ in range(len(self.node_ids)):
+            if active.size == 0:
+                break
+            moved = []
+            current = state[active]
+            for code in np.unique(current):
+                rules = self.rules.get(int(code))
+                if rules is None:
+                    continue
+                rows = active[current == code]
+                undecided = np.ones(rows.size, dtype=bool)
+                for target, conditions in rules:
+                    mask = undecided.copy()
+                    for key, condition in conditions:
+                        column = cols.get(key)
+                        if column is None:
+                            mask[:] = False
+                            break
+                        mask &= _condition_mask(condition, column[rows])
+                    state[rows[mask]] = target
+                    undecided &= ~mask
+                moved.append(rows[~undecided])
+            active = np.concatenate(moved) if moved else active[:0]
+            if track_paths and active.size:
+                self._extend_paths(active, state, path_codes, paths, path_ids)
+        return state, path_codes, paths
+
+    def _extend_paths(self, rows, state, path_codes, paths, path_ids):
+        # One np.unique per pass over (parent path, new node) pairs instead of a dict update per row
+        width = len(self.node_ids)
+        keys = path_codes[rows].astype(np.int64) * width + state[rows]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        codes = np.empty(unique.size, dtype=np.int32)
+        for i, key in enumerate(unique.tolist()):
+            parent, node = divmod(key, width)
+            code = path_ids.get((parent, node))
+            if code is None:
+                code = path_ids[(parent, node)] = len(paths)
+                paths.append(paths[parent] + (node,))
+            codes[i] = code
+        path_codes[rows] = codes[inverse.reshape(-1)]
+
+    def evaluate(self, columns):
+        """
+        全行を評価します。
+
+        Args:
+            columns (dict): 検査項目名から配列への辞書
+
+        Returns:
+            tuple: (行ごとの停止ノードID配列, 行ごとの診断リストインデックス配列)。
+            resultノード以外で停止した行の診断リストインデックスは -1。
+        """
+        codes = self.evaluate_codes(columns)
+        return np.asarray(self.node_ids)[codes], self.diagnosis_of[codes]
+
+    def evaluate_csv(self, source):
+        """
+        CSVを読み込んで全行を評価します。
+
+        Args:
+            source (str or file): CSVファイルのパスまたはファイルオブジェクト
+
+        Returns:
+            tuple: `evaluate` と同じ
+        """
+        return self.evaluate(load_csv(source))
+
+
+OUTPUT_HEADER = ["node_id", "diagnosis_index", "diagnosis"]
+
+
+def output_rows(engine, node_ids, diagnosis_index):
+    """
+    評価結果をCSV出力用の行に変換します。
+
+    Yields:
+        list: [ノードID, 診断リストインデックス, 診断名（カンマ区切り）]
+    """
+    for node_id, index in zip(node_ids.tolist(), diagnosis_index.tolist()):
+        diagnosis = ", ".join(engine.diagnoses[index]) if index >= 0 else ""
+        yield [node_id, index, diagnosis]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    source = argv[0] if argv else sys.stdin
+    engine = BatchTriage()
+    node_ids, diagnosis_index = engine.evaluate_csv(source)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(OUTPUT_HEADER)
+    writer.writerows(output_rows(engine, node_ids, diagnosis_index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+ランダムウォークによる負荷・ファズ試験（リリース前のソーク試験用）。
+
+Alfredでの操作と同じように、出力されたJSONの項目から次の引数をランダムに選んで
+rootからresultノードまで辿るセッションを大量に生成し、一定の割合で不正な入力
+（存在しないノードID・循環エイリアス・長すぎるエイリアス連鎖・壊れた経路トークンなど）を混ぜます。
+各ステップの出力について以下の不変条件を検査します。
+
+    - 例外が発生しない（CLIの場合は終了コード0・標準エラー出力なし）
+    - 出力が "items" を持つ正しいJSONで、各項目にtitleがある
+    - 解決できない入力にはErrorの項目だけを返す（CLIでは検索結果を返す）
+    - questionノードでは選択肢ごとに次の引数の項目があり、resultノードには「最初に戻る」項目がある
+    - 経路トークンで1問以上回答していれば「1つ前に戻る」項目がある
+    - 選択可能な項目の引数はすべて解決できる（行き止まりにならない）
+
+対象は `get_node` / `generate_json_output` を直接呼ぶ api（既定）と、
+`run_diagnosis.py` をステップごとに新規プロセスで実行する cli の2種類です。
+ウォークはチャンクに分けてワーカー（プロセスまたはスレッド）に配り、
+スループットとステップごとのレイテンシ（p50/p99）を表示します。
+
+実行:
+    python3 benchmarks/fuzz_walks.py --walks 1000000 --workers 8
+    python3 benchmarks/fuzz_walks.py --duration 600 --executor thread     # 時間指定のソーク試験
+    python3 benchmarks/fuzz_walks.py --target cli --walks 200 --workers 4
+"""
+import argparse
+import collections
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from anemia_flow import (FLOWCHART, MAX_ALIAS_DEPTH, PATH_TOKEN_PREFIX, AnemiaWorkflow,
+                         decode_path, encode_path)
+
+DEFAULT_CHUNK_SIZE = 2000
+RESTART_TITLE = "最初に戻る"
+BACK_TITLE = "1つ前に戻る"
+
+# Broken aliases mixed into the api target's flowchart (the CLI serves the built-in one)
+FUZZ_ALIASES = {
+    "loop_a": "loop_b",
+    "loop_b": "loop_a",
+    "self_loop": "self_loop",
+    "dangling": "NO_SUCH_NODE",
+}
+FUZZ_ALIASES.update({f"chain_{i}": f"chain_{i + 1}" for i in range(MAX_ALIAS_DEPTH + 1)})
+FUZZ_ALIASES[f"chain_{MAX_ALIAS_DEPTH + 1}"] = "A"
+
+INVALID_INPUTS = (
+    "INVALID_ID", "a", "ROOT", "root ", "Ｓ５", "S5\n", "null", "0", "-1", "../A", "鉄欠乏",
+    "~z", "~~", "~-1", "~ 1", "~9", "~0000000", "~" + "1" * 40, "~Ｓ", "~\x00",
+) + tuple(FUZZ_ALIASES)
+
+_TOKEN_DIGITS = "0123456789abcz"
+_GARBAGE = "AHS_~01 あ鉄\t\"\\{}"
+
+
+def fuzz_flowchart():
+    """FLOWCHART に循環・宙吊り・長すぎるエイリアスを加えたフローチャートを返します。"""
+    flowchart = dict(FLOWCHART)
+    flowchart.update(FUZZ_ALIASES)
+    return flowchart
+
+
+def random_invalid_input(rng):
+    """不正（または不正かもしれない）入力を1つ生成します。"""
+    kind = rng.randrange(3)
+    if kind == 0:
+        return rng.choice(INVALID_INPUTS)
+    if kind == 1:
+        # Random path token: some decode to real nodes, most run off the flowchart
+        return PATH_TOKEN_PREFIX + "".join(rng.choice(_TOKEN_DIGITS) for _ in range(rng.randrange(12)))
+    return "".join(rng.choice(_GARBAGE) for _ in range(rng.randrange(1, 8)))
+
+
+class LatencyHistogram:
+    """
+    対数バケット（約9%刻み）のレイテンシ分布。件数に関わらず一定サイズで、プロセス間で合算できます。
+    """
+    BASE = 2 ** 0.125
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        """1件記録します。"""
+        nanos = seconds * 1e9
+        self.counts[int(math.log(nanos, self.BASE)) if nanos >= 1 else 0] += 1
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, other):
+        """別のヒストグラムの内容を加算します。"""
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, fraction):
+        """
+        分位点（秒）を返します（バケットの上端）。
+
+        Args:
+            fraction (float): 0〜1の割合 (例: 0.99)
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * fraction))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return self.BASE ** (bucket + 1) / 1e9
+        return 0.0
+
+
+def expected_node(wf, arg):
+    """
+    `generate_json_output` とは独立に、引数が指すノードを求めます。
+
+    Returns:
+        Node or None: ノード（解決できない場合はNone）
+    """
+    if arg.startswith(PATH_TOKEN_PREFIX):
+        try:
+            return wf.walk_path(decode_path(arg))
+        except ValueError:
+            return None
+    return wf.get_node(arg)
+
+
+def check_output(wf, arg, output, search_fallback=False):
+    """
+    1ステップ分の出力の不変条件を検査します。
+
+    Args:
+        wf (AnemiaWorkflow): 出力したワークフロー
+        arg (str): 入力した引数
+        output (str): 出力されたJSON文字列
+        search_fallback (bool): ノードIDでない入力に検索結果を返す実装（CLI）か
+
+    Returns:
+        tuple: (違反内容のリスト, 次に選択できる引数のリスト)
+    """
+    try:
+        items = json.loads(output)["items"]
+    except (ValueError, KeyError, TypeError) as e:
+        return [f"invalid JSON: {e}"], []
+    if not isinstance(items, list) or not items:
+        return ["empty items"], []
+    if any(not isinstance(item, dict) or not isinstance(item.get("title"), str) for item in items):
+        return ["item without title"], []
+
+    node = expected_node(wf, arg)
+    args = [item["arg"] for item in items if item.get("valid") and isinstance(item.get("arg"), str)]
+    if node is None:
+        is_token = arg.startswith(PATH_TOKEN_PREFIX)
+        if search_fallback and not is_token and arg not in wf.flowchart:
+            return [], args
+        if len(items) != 1 or items[0]["title"] != "Error":
+            return [f"unresolvable input did not render Error: {items[0]['title']!r}"], []
+        return [], []
+
+    violations = []
+    if node.type == "question":
+        if arg.startswith(PATH_TOKEN_PREFIX):
+            choices = decode_path(arg)
+            wanted = [encode_path(choices + (i,)) for i in range(len(node.options))]
+        else:
+            wanted = [option.next for option in node.options]
+        missing = [value for value in wanted if value not in args]
+        if missing:
+            violations.append(f"question {node.id} lacks options {missing}")
+    elif not any(item["title"] == RESTART_TITLE and item.get("valid") for item in items):
+        violations.append(f"result {node.id} has no restart item")
+    if arg.startswith(PATH_TOKEN_PREFIX) and len(arg) > 1:
+        back = [item for item in items if item["title"] == BACK_TITLE]
+        if not back or back[0].get("arg") != arg[:-1]:
+            violations.append(f"token {arg} has no back item")
+    for value in args:
+        if expected_node(wf, value) is None:
+            violations.append(f"item arg {value!r} does not resolve")
+    return violations, args
+
+
+def _render_api(wf, arg):
+    wf.get_node(arg)
+    return wf.generate_json_output(arg)
+
+
+def _render_cli(wf, arg):
+    result = subprocess.run([sys.executable, os.path.join(ROOT_DIR, "run_diagnosis.py"), arg],
+                            cwd=ROOT_DIR, capture_output=True)
+    if result.returncode != 0 or result.stderr:
+        raise RuntimeError(f"exit {result.returncode}: {result.stderr.decode('utf-8', 'replace')[-200:]}")
+    return result.stdout.decode("utf-8")
+
+
+TARGETS = {"api": _render_api, "cli": _render_cli}
+
+# Per-worker workflow, created on first use (one per process; shared by threads)
+_WORKFLOWS = {}
+
+
+def _workflow(target):
+    wf = _WORKFLOWS.get(target)
+    if wf is None:
+        # The CLI always serves the built-in flowchart; the api target gets the broken aliases too
+        wf = _WORKFLOWS[target] = AnemiaWorkflow(fuzz_flowchart() if target == "api" else None)
+    return wf
+
+
+def run_walks(target, seed, walks, invalid_rate=0.05, max_steps=40, token_rate=0.5, max_violations=20):
+    """
+    ランダムウォークを実行し、集計結果を返します（ワーカー1つ分の処理）。
+
+    Args:
+        target (str): "api" または "cli"
+        seed (int): 乱数シード
+        walks (int): ウォーク数
+        invalid_rate (float): 各ステップで不正な入力に置き換える確率
+        max_steps (int): 1ウォークあたりの最大ステップ数
+        token_rate (float): 経路トークンで開始するウォークの割合（残りはノードIDで辿る）
+        max_violations (int): 保持する違反例の最大数
+
+    Returns:
+        dict: {"walks", "steps", "invalid", "violation_count", "violations", "histogram"}
+    """
+    wf = _workflow(target)
+    render = TARGETS[target]
+    search_fallback = target == "cli"
+    rng = random.Random(seed)
+    histogram = LatencyHistogram()
+    stats = {"walks": walks, "steps": 0, "invalid": 0, "violation_count": 0, "violations": []}
+    for _ in range(walks):
+        arg = PATH_TOKEN_PREFIX if rng.random() < token_rate else "root"
+        for _ in range(max_steps):
+            if rng.random() < invalid_rate:
+                arg = random_invalid_input(rng)
+                stats["invalid"] += 1
+            if search_fallback:
+                # run_diagnosis.py strips its argument and treats an empty one as "~";
+                # NUL cannot be passed through argv at all
+                arg = arg.replace("\x00", "").strip() or PATH_TOKEN_PREFIX
+            start = time.perf_counter()
+            try:
+                output = render(wf, arg)
+            except Exception as e:
+                violations, choices = [f"crash: {e!r}"], []
+            else:
+                histogram.add(time.perf_counter() - start)
+                violations, choices = check_output(wf, arg, output, search_fallback)
+            stats["steps"] += 1
+            if violations:
+                stats["violation_count"] += len(violations)
+                for violation in violations:
+                    if len(stats["violations"]) < max_violations:
+                        stats["violations"].append({"arg": arg, "violation": violation})
+            node = expected_node(wf, arg)
+            if not choices or (node is not None and node.type == "result"):
+                break
+            arg = rng.choice(choices)
+    stats["histogram"] = histogram
+    return stats
+
+
+def _run_chunk(task):
+    return run_walks(*task)
+
+
+def run_fuzz(target="api", walks=100_000, workers=None, executor="process", duration=None,
+             chunk_size=DEFAULT_CHUNK_SIZE, seed=0, invalid_rate=0.05, max_steps=40):
+    """
+    ウォークをチャンクに分けて並列に実行し、結果をまとめます。
+
+    Args:
+        target (str): "api" または "cli"
+        walks (int): ウォーク総数（duration 指定時は上限）
+        workers (int, optional): ワーカー数（既定: CPU数）
+        executor (str): "process" または "thread"
+        duration (float, optional): 指定秒数が経過したら新しいチャンクを投入しない
+        chunk_size (int): 1チャンクあたりのウォーク数
+        seed (int): 乱数シード（チャンクごとに seed + チャンク番号）
+        invalid_rate (float): 不正な入力に置き換える確率
+        max_steps (int): 1ウォークあたりの最大ステップ数
+
+    Returns:
+        dict: {"target", "walks", "steps", "invalid", "violation_count", "violations",
+               "seconds", "steps_per_sec", "walks_per_sec", "latency_us"}
+    """
+    if target not in TARGETS:
+        raise ValueError(f"Unknown target: {target}")
+    workers = workers or os.cpu_count() or 1
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    histogram = LatencyHistogram()
+    totals = {"walks": 0, "steps": 0, "invalid": 0, "violation_count": 0, "violations": []}
+    start = time.perf_counter()
+    deadline = None if duration is None else start + duration
+
+    def collect(stats):
+        histogram.merge(stats.pop("histogram"))
+        for key in ("walks", "steps", "invalid", "violation_count"):
+            totals[key] += stats[key]
+        totals["violations"].extend(stats["violations"][:20 - len(totals["violations"])])
+
+    with pool_class(max_workers=workers) as pool:
+        # Keep a bounded window of chunks in flight, as parallel_jobs.run does
+        pending = collections.deque()
+        submitted = 0
+        chunk = 0
+        while submitted < walks and (deadline is None or time.perf_counter() < deadline):
+            size = min(chunk_size, walks - submitted)
+            pending.append(pool.submit(_run_chunk, (target, seed + chunk, size, invalid_rate, max_steps)))
+            submitted += size
+            chunk += 1
+            if len(pending) >= workers * 2:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    return dict(
+        totals,
+        target=target,
+        seconds=elapsed,
+        steps_per_sec=totals["steps"] / elapsed if elapsed else 0.0,
+        walks_per_sec=totals["walks"] / elapsed if elapsed else 0.0,
+        latency_us={name: histogram.percentile(q) * 1e6
+                    for name, q in (("p50", 0.5), ("p99", 0.99), ("max", 1.0))},
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ランダムウォークによる負荷・ファズ試験")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="api", help="試験対象")
+    parser.add_argument("--walks", type=int, help="ウォーク総数（既定: 100000、--duration 指定時は無制限）")
+    parser.add_argument("--duration", type=float, help="試験時間（秒）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカー数（既定: CPU数）")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process", help="ワーカーの種類")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1チャンクあたりのウォーク数")
+    parser.add_argument("--invalid-rate", type=float, default=0.05, help="不正な入力に置き換える確率")
+    parser.add_argument("--max-steps", type=int, default=40, help="1ウォークあたりの最大ステップ数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--output", help="結果JSONの出力先")
+    args = parser.parse_args(argv)
+
+    walks = args.walks
+    if walks is None:
+        walks = 100_000 if args.duration is None else sys.maxsize
+    result = run_fuzz(args.target, walks, args.workers, args.executor, args.duration,
+                      args.chunk_size, args.seed, args.invalid_rate, args.max_steps)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    latency = result["latency_us"]
+    print(f"{result['walks']} walks / {result['steps']} steps ({result['invalid']} invalid inputs) "
+          f"in {result['seconds']:.2f}s: {result['steps_per_sec']:.0f} steps/s, "
+          f"{result['walks_per_sec']:.0f} walks/s")
+    print("latency us: " + ", ".join(f"{name} {value:.1f}" for name, value in latency.items()))
+    for violation in result["violations"]:
+        print(f"VIOLATION {violation['arg']!r}: {violation['violation']}")
+    print(f"{result['violation_count']} violation(s)")
+    return 1 if result["violation_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+HTTPサービス（http_service.py）用の負荷生成ツール。
+
+指定数のkeep-alive接続を張り、各接続でパイプライン深さ分のリクエストをまとめて送信しながら
+一定時間（またはリクエスト数）負荷をかけ、スループットとレイテンシ分布を表示します。
+リクエストは render（GET /nodes/...）・walk・batch を --mix の比率で混ぜます。
+
+実行:
+    python3 benchmarks/http_loadgen.py --spawn                       # サーバーを同一プロセスで起動して計測
+    python3 benchmarks/http_loadgen.py --port 8080 --connections 32 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from anemia_flow import AnemiaWorkflow, encode_path
+from run_benchmarks import random_sessions
+
+DEFAULT_MIX = "render=8,walk=3,batch=1"
+
+# Lab value records cycled through by the batch requests
+SAMPLE_LABS = [
+    {"cytopenia": True},
+    {"cytopenia": False, "reticulocytosis": True, "hemolysis": True},
+    {"cytopenia": False, "reticulocytosis": False, "mcv": 72, "fe": "low", "tibc": "high", "ferritin": "low"},
+    {"cytopenia": False, "reticulocytosis": False, "mcv": 110, "vitb12_or_folate_low": True, "deficiency": "vitb12"},
+    {"cytopenia": False, "reticulocytosis": False, "mcv": 90},
+]
+
+
+def build_requests(wf, count=1000, mix=DEFAULT_MIX, batch_size=20, seed=0):
+    """
+    送信するリクエスト（生のHTTPバイト列）の一覧を生成します。
+
+    Args:
+        wf (AnemiaWorkflow): 経路の生成に使うワークフロー
+        count (int): 生成する件数（送信時は循環して使用）
+        mix (str): "render=8,walk=3,batch=1" 形式の比率
+        batch_size (int): batchリクエスト1件あたりのレコード数
+        seed (int): 乱数シード
+
+    Returns:
+        list: (種別, リクエストのバイト列) のリスト
+    """
+    rng = random.Random(seed)
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    kinds = list(weights)
+    sessions = random_sessions(wf, count, seed)
+    requests = []
+    for i in range(count):
+        kind = rng.choices(kinds, [weights[k] for k in kinds])[0]
+        choices = sessions[i]
+        if kind == "render":
+            # Any prefix of a real session is a valid path token
+            token = encode_path(choices[:rng.randrange(len(choices) + 1)])
+            requests.append((kind, _request("GET", "/nodes/" + token)))
+        elif kind == "walk":
+            requests.append((kind, _request("POST", "/walk", {"choices": list(choices)})))
+        elif kind == "batch":
+            records = [SAMPLE_LABS[(i + j) % len(SAMPLE_LABS)] for j in range(batch_size)]
+            requests.append((kind, _request("POST", "/batch", {"records": records})))
+        else:
+            raise ValueError(f"Unknown request kind: {kind}")
+    return requests
+
+
+def _request(method, path, payload=None):
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+    return head.encode("ascii") + body
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, requests, offset, pipeline, deadline, limit, stats):
+    reader, writer = await asyncio.open_connection(host, port)
+    position = offset
+    try:
+        while time.perf_counter() < deadline and (limit is None or stats["sent"] < limit):
+            batch = []
+            for _ in range(pipeline):
+                if limit is not None and stats["sent"] >= limit:
+                    break
+                batch.append(requests[position % len(requests)])
+                position += 1
+                stats["sent"] += 1
+            if not batch:
+                break
+            start = time.perf_counter()
+            writer.write(b"".join(data for _, data in batch))
+            await writer.drain()
+            for kind, _ in batch:
+                status = await _read_response(reader)
+                stats["latencies"].append(time.perf_counter() - start)
+                stats["by_kind"][kind] = stats["by_kind"].get(kind, 0) + 1
+                if status != 200:
+                    stats["errors"] += 1
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def run_load(host, port, connections=16, pipeline=4, duration=5.0, total=None, mix=DEFAULT_MIX):
+    """
+    負荷をかけて結果を返します。
+
+    Args:
+        host (str): サーバーのアドレス
+        port (int): サーバーのポート
+        connections (int): 同時接続数
+        pipeline (int): 1接続あたりにまとめて送るリクエスト数
+        duration (float): 計測時間（秒）
+        total (int, optional): 送信するリクエスト総数（指定時は duration より優先して停止）
+        mix (str): リクエスト種別の比率
+
+    Returns:
+        dict: {"requests", "errors", "seconds", "requests_per_sec", "latency_ms", "by_kind"}
+    """
+    requests = build_requests(AnemiaWorkflow(), mix=mix)
+    stats = {"sent": 0, "errors": 0, "latencies": [], "by_kind": {}}
+    start = time.perf_counter()
+    deadline = start + (duration if total is None else float("inf"))
+    await asyncio.gather(*(
+        _client(host, port, requests, i * 61, pipeline, deadline, total, stats)
+        for i in range(connections)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(stats["latencies"])
+    return {
+        "requests": len(latencies),
+        "errors": stats["errors"],
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {name: _percentile(latencies, q) * 1000
+                       for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+        "by_kind": stats["by_kind"],
+    }
+
+
+async def _spawn_and_run(args):
+    from http_service import DiagnosisService
+
+    service = DiagnosisService(concurrency=args.concurrency)
+    server = await service.start(args.host, 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        result = await run_load(args.host, port, args.connections, args.pipeline,
+                                args.duration, args.requests, args.mix)
+        await service.wait_closed()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTPサービスの負荷生成")
+    parser.add_argument("--host", default="127.0.0.1", help="サーバーのアドレス")
+    parser.add_argument("--port", type=int, default=8080, help="サーバーのポート")
+    parser.add_argument("--spawn", action="store_true", help="サーバーを同一プロセス内で起動して計測")
+    parser.add_argument("--concurrency", type=int, default=64, help="--spawn 時のサーバー同時処理数")
+    parser.add_argument("--connections", type=int, default=16, help="同時接続数")
+    parser.add_argument("--pipeline", type=int, default=4, help="1接続あたりのパイプライン深さ")
+    parser.add_argument("--duration", type=float, default=5.0, help="計測時間（秒）")
+    parser.add_argument("--requests", type=int, help="送信するリクエスト総数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="リクエスト種別の比率")
+    parser.add_argument("--output", help="結果JSONの出力先")
+    args = parser.parse_args(argv)
+
+    if args.spawn:
+        result = asyncio.run(_spawn_and_run(args))
+    else:
+        result = asyncio.run(run_load(args.host, args.port, args.connections, args.pipeline,
+                                      args.duration, args.requests, args.mix))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    latency = result["latency_ms"]
+    print(f"{result['requests']} requests in {result['seconds']:.2f}s "
+          f"({result['requests_per_sec']:.0f} req/s), {result['errors']} errors")
+    print("latency ms: " + ", ".join(f"{name} {value:.2f}" for name, value in latency.items()))
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
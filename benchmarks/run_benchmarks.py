@@ -0,0 +1,229 @@
+"""
+起動時間・レンダリング性能・一括走破性能のベンチマーク。
+
+計測項目:
+    - cold_start_ms: `run_diagnosis.py` をノードごとに新規プロセスで実行した壁時計時間
+    - render_per_sec: 全ノードに対する `generate_json_output` の呼び出し回数/秒
+    - get_node_ns / get_node_alias_ns: `get_node` の1回あたりの所要時間（エイリアス解決込み）
+    - walk_<N>_per_sec: N件のセッションを `walk_path` で辿るスループット
+    - search_us: `AnemiaWorkflow.search` の1クエリあたりの所要時間（索引構築後）
+
+結果はJSONで書き出し、保存済みのベースライン（benchmarks/baseline.json）と比較して
+閾値を超える劣化があれば終了コード1で終了します。ベースラインが無い場合は計測せずに終了コード2で終了します。
+
+実行:
+    python3 benchmarks/run_benchmarks.py --save-baseline          # ベースラインを保存
+    python3 benchmarks/run_benchmarks.py --threshold 0.25         # ベースラインと比較
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from anemia_flow import AnemiaWorkflow, FLOWCHART
+
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, "benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, "bench_results.json")
+DEFAULT_WALK_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def _metric(value, unit, higher_is_better):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def bench_cold_start(node_ids, repeat=3):
+    """
+    `run_diagnosis.py` をノードごとに新規プロセスで実行し、中央値（ミリ秒）を返します。
+
+    Returns:
+        dict: ノードIDから起動時間（ミリ秒）への辞書
+    """
+    script = os.path.join(ROOT_DIR, "run_diagnosis.py")
+    timings = {}
+    for node_id in node_ids:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, script, node_id], cwd=ROOT_DIR,
+                           stdout=subprocess.DEVNULL, check=True)
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[node_id] = statistics.median(samples)
+    return timings
+
+
+def bench_render(wf, min_time=0.5):
+    """全ノードを繰り返しレンダリングし、呼び出し回数/秒を返します。"""
+    node_ids = list(FLOWCHART)
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for node_id in node_ids:
+            wf.generate_json_output(node_id)
+        calls += len(node_ids)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+def bench_get_node(wf, node_id, iterations=200_000):
+    """`get_node` の1回あたりの所要時間（ナノ秒）を返します。"""
+    get_node = wf.get_node
+    start = time.perf_counter()
+    for _ in range(iterations):
+        get_node(node_id)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+SEARCH_QUERIES = ("鉄欠乏", "PNH", "骨髄異形成", "溶血", "フェリチン", "MCV", "ビタミンB12", "xyz")
+
+
+def bench_search(wf, queries=SEARCH_QUERIES, iterations=2_000):
+    """`search` の1クエリあたりの所要時間（マイクロ秒）を返します。"""
+    search = wf.search
+    search(queries[0])  # build the index outside the timed loop
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for query in queries:
+            search(query)
+    return (time.perf_counter() - start) / (iterations * len(queries)) * 1e6
+
+
+def random_sessions(wf, count, seed=0):
+    """
+    rootからresultノードまでのランダムな回答履歴を生成します。
+
+    Returns:
+        list: 選択肢インデックスのタプルのリスト
+    """
+    rng = random.Random(seed)
+    # Sample from a pool of walks so that generation does not dominate large sizes
+    pool = []
+    for _ in range(min(count, 1000)):
+        node = wf.get_node("root")
+        choices = []
+        while node.type == "question":
+            choice = rng.randrange(len(node.options))
+            choices.append(choice)
+            node = wf.flowchart.nodes[node.options[choice].target]
+        pool.append(tuple(choices))
+    return [pool[rng.randrange(len(pool))] for _ in range(count)]
+
+
+def bench_walk(wf, count):
+    """count件のセッションを辿り、セッション数/秒を返します。"""
+    sessions = random_sessions(wf, count)
+    walk_path = wf.walk_path
+    start = time.perf_counter()
+    for choices in sessions:
+        walk_path(choices)
+    return count / (time.perf_counter() - start)
+
+
+def run_benchmarks(walk_sizes=DEFAULT_WALK_SIZES, cold_nodes=None, cold_repeat=3):
+    """
+    全ベンチマークを実行します。
+
+    Args:
+        walk_sizes (iterable): 一括走破のセッション数
+        cold_nodes (list, optional): 起動時間を計測するノードID（既定: 全ノード）
+        cold_repeat (int): ノードごとの起動回数
+
+    Returns:
+        dict: 結果（"metrics" に計測値、"cold_start_by_node" にノード別起動時間）
+    """
+    wf = AnemiaWorkflow()
+    metrics = {}
+
+    cold = bench_cold_start(cold_nodes if cold_nodes is not None else list(FLOWCHART), cold_repeat)
+    if cold:
+        metrics["cold_start_ms"] = _metric(statistics.median(cold.values()), "ms", False)
+    metrics["render_per_sec"] = _metric(bench_render(wf), "calls/s", True)
+    metrics["get_node_ns"] = _metric(bench_get_node(wf, "S5"), "ns", False)
+    metrics["get_node_alias_ns"] = _metric(bench_get_node(wf, "root"), "ns", False)
+    metrics["search_us"] = _metric(bench_search(wf), "us", False)
+    for size in walk_sizes:
+        metrics[f"walk_{size}_per_sec"] = _metric(bench_walk(wf, size), "sessions/s", True)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": metrics,
+        "cold_start_by_node": cold,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    結果をベースラインと比較し、閾値を超えて劣化した項目を返します。
+
+    Args:
+        results (dict): 今回の結果
+        baseline (dict): ベースラインの結果
+        threshold (float): 許容する劣化率（0.25 = 25%）
+
+    Returns:
+        list: (項目名, ベースライン値, 今回の値, 劣化率) のリスト
+    """
+    regressions = []
+    for name, base in baseline.get("metrics", {}).items():
+        current = results["metrics"].get(name)
+        if current is None or not base["value"]:
+            continue
+        if base["higher_is_better"]:
+            change = (base["value"] - current["value"]) / base["value"]
+        else:
+            change = (current["value"] - base["value"]) / base["value"]
+        if change > threshold:
+            regressions.append((name, base["value"], current["value"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="貧血鑑別診断ワークフローのベンチマーク")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="結果JSONの出力先")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="ベースラインJSONのパス")
+    parser.add_argument("--threshold", type=float, default=0.25, help="許容する劣化率（既定: 0.25）")
+    parser.add_argument("--save-baseline", action="store_true", help="結果をベースラインとして保存")
+    parser.add_argument("--walk-sizes", type=int, nargs="+", default=list(DEFAULT_WALK_SIZES),
+                        help="一括走破のセッション数")
+    parser.add_argument("--cold-nodes", nargs="*", default=None,
+                        help="起動時間を計測するノードID（既定: 全ノード）")
+    parser.add_argument("--cold-repeat", type=int, default=3, help="ノードごとの起動回数")
+    args = parser.parse_args(argv)
+
+    # Fail before measuring: without a baseline the regression gate cannot run
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        sys.stderr.write(f"No baseline at {args.baseline}; run with --save-baseline first\n")
+        return 2
+
+    results = run_benchmarks(args.walk_sizes, args.cold_nodes, args.cold_repeat)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    for name, metric in results["metrics"].items():
+        print(f"{name:24s} {metric['value']:14.1f} {metric['unit']}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, base, current, change in regressions:
+        print(f"REGRESSION {name}: {base:.1f} -> {current:.1f} ({change:+.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+合成フローチャート（synthetic_flowchart.py）によるスケーリングベンチマーク。
+
+ノード数を変えながら（既定: 1千〜100万）、ワークフローエンジンの各操作の所要時間と
+ピークメモリ（tracemallocで計測した、その操作中に確保されたメモリの最大値）を計測します。
+時間の計測はtracemallocを止めた状態で行い、メモリの計測は同じ操作を別途もう一度実行して行います。
+
+計測項目:
+    - generate: 合成フローチャートの生成
+    - compile: `compile_flowchart`
+    - validate: `validate_flowchart`
+    - get_node: `get_node`（ノードIDとエイリアスを混ぜたサンプル）
+    - render_cold: コンパイル直後の `generate_json_output`（各ノードの出力断片の初回構築を含む）
+    - render / render_token: 構築後の `generate_json_output`（ノードID / 経路トークン）
+    - walk: `walk_path` によるセッションの走破
+    - path_index / search_index: 全経路索引・検索索引の構築
+    - batch: `BatchTriage.evaluate_codes` による一括トリアージ（NumPyがある場合）
+
+実行:
+    python3 benchmarks/scaling.py                                   # 1k, 10k, 100k, 1M ノード
+    python3 benchmarks/scaling.py --sizes 1000 100000 --ops compile render walk --no-memory
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from anemia_flow import AnemiaWorkflow, compile_flowchart, encode_path
+from path_index import PathIndex
+from run_benchmarks import random_sessions
+from search_index import SearchIndex
+from synthetic_flowchart import generate_flowchart, level_keys
+from validation import validate_flowchart
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+SAMPLE_SIZE = 20_000
+BATCH_ROWS = 100_000
+
+
+def _op_generate(ctx):
+    params = ctx["params"]
+    return lambda: (generate_flowchart(**params), 1)[1]
+
+
+def _op_compile(ctx):
+    flowchart = ctx["flowchart"]
+    return lambda: (compile_flowchart(flowchart), 1)[1]
+
+
+def _op_validate(ctx):
+    flowchart = ctx["flowchart"]
+    return lambda: (validate_flowchart(flowchart), 1)[1]
+
+
+def _op_get_node(ctx):
+    get_node = ctx["wf"].get_node
+    ids = ctx["sample_ids"]
+
+    def run():
+        for node_id in ids:
+            get_node(node_id)
+        return len(ids)
+    return run
+
+
+def _op_render_cold(ctx):
+    # A fresh compilation so that the per-node output fragments are built inside the measurement
+    render = AnemiaWorkflow(compile_flowchart(ctx["flowchart"])).generate_json_output
+    ids = ctx["sample_ids"]
+
+    def run():
+        for node_id in ids:
+            render(node_id)
+        return len(ids)
+    return run
+
+
+def _op_render(ctx):
+    render = ctx["wf"].generate_json_output
+    ids = ctx["sample_ids"]
+
+    def run():
+        for node_id in ids:
+            render(node_id)
+        return len(ids)
+    return run
+
+
+def _op_render_token(ctx):
+    render = ctx["wf"].generate_json_output
+    rng = random.Random(1)
+    tokens = [encode_path(choices[:rng.randrange(len(choices) + 1)]) for choices in ctx["sessions"]]
+
+    def run():
+        for token in tokens:
+            render(token)
+        return len(tokens)
+    return run
+
+
+def _op_walk(ctx):
+    walk_path = ctx["wf"].walk_path
+    sessions = ctx["sessions"]
+
+    def run():
+        for choices in sessions:
+            walk_path(choices)
+        return len(sessions)
+    return run
+
+
+def _op_path_index(ctx):
+    compiled = ctx["wf"].flowchart
+    return lambda: (PathIndex(compiled), 1)[1]
+
+
+def _op_search_index(ctx):
+    compiled = ctx["wf"].flowchart
+    return lambda: (SearchIndex(compiled), 1)[1]
+
+
+def _op_batch(ctx):
+    from batch_triage import BatchTriage, np
+    if np is None:
+        return None
+    engine = BatchTriage(ctx["wf"].flowchart)
+    rng = np.random.default_rng(0)
+    branching = ctx["params"]["branching"]
+    columns = {key: rng.integers(0, branching, size=BATCH_ROWS).astype(np.float64)
+               for key in level_keys(ctx["flowchart"])}
+
+    def run():
+        engine.evaluate_codes(columns)
+        return BATCH_ROWS
+    return run
+
+
+OPERATIONS = {
+    "generate": _op_generate,
+    "compile": _op_compile,
+    "validate": _op_validate,
+    "get_node": _op_get_node,
+    "render_cold": _op_render_cold,
+    "render": _op_render,
+    "render_token": _op_render_token,
+    "walk": _op_walk,
+    "path_index": _op_path_index,
+    "search_index": _op_search_index,
+    "batch": _op_batch,
+}
+
+
+def measure(op, ctx, memory=True):
+    """
+    1つの操作の所要時間とピークメモリを計測します。
+
+    Args:
+        op (callable): ctx を受け取り、計測対象の関数（処理件数を返す）を返す関数
+        ctx (dict): 計測用のコンテキスト
+        memory (bool): tracemallocでピークメモリを計測するか
+
+    Returns:
+        dict or None: {"count", "seconds", "per_op_us", "peak_mb"}（計測できない操作はNone）
+    """
+    run = op(ctx)
+    if run is None:
+        return None
+    gc.collect()
+    start = time.perf_counter()
+    count = run()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if memory:
+        run = op(ctx)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return {"count": count, "seconds": elapsed, "per_op_us": elapsed / count * 1e6, "peak_mb": peak}
+
+
+def run_scaling(sizes=DEFAULT_SIZES, ops=None, branching=3, alias_chain=3, memory=True, seed=0, report=None):
+    """
+    ノード数ごとに各操作を計測します。
+
+    Args:
+        sizes (iterable): ノード数
+        ops (list, optional): 計測する操作名（既定: すべて）
+        branching (int): 合成フローチャートの選択肢数
+        alias_chain (int): 合成フローチャートのエイリアス連鎖の段数
+        memory (bool): ピークメモリを計測するか
+        seed (int): 乱数シード
+        report (callable, optional): 計測結果1件ごとに呼ばれる関数
+
+    Returns:
+        list: {"nodes", "entries", "op", "count", "seconds", "per_op_us", "peak_mb"} のリスト
+    """
+    ops = list(OPERATIONS) if ops is None else ops
+    results = []
+    for size in sizes:
+        params = {"nodes": size, "branching": branching, "alias_chain": alias_chain, "seed": seed}
+        flowchart = generate_flowchart(**params)
+        wf = AnemiaWorkflow(flowchart)
+        rng = random.Random(seed)
+        keys = list(flowchart)
+        ctx = {
+            "params": params,
+            "flowchart": flowchart,
+            "wf": wf,
+            "sample_ids": [keys[rng.randrange(len(keys))] for _ in range(SAMPLE_SIZE)],
+            "sessions": random_sessions(wf, SAMPLE_SIZE, seed),
+        }
+        # Build every node's output fragments outside the warm measurements
+        for node in wf.flowchart.nodes:
+            wf.generate_json_output(node.id)
+        for name in ops:
+            measured = measure(OPERATIONS[name], ctx, memory)
+            if measured is None:
+                continue
+            row = dict(measured, nodes=len(wf.flowchart.nodes), entries=len(flowchart), op=name)
+            results.append(row)
+            if report is not None:
+                report(row)
+    return results
+
+
+def _print_row(row):
+    peak = "-" if row["peak_mb"] is None else f"{row['peak_mb']:.1f}"
+    print(f"{row['nodes']:>9d} {row['op']:14s} {row['count']:>8d} {row['seconds']:10.4f} "
+          f"{row['per_op_us']:14.2f} {peak:>10s}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成フローチャートによるスケーリングベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="ノード数")
+    parser.add_argument("--ops", nargs="+", choices=list(OPERATIONS), help="計測する操作（既定: すべて）")
+    parser.add_argument("--branching", type=int, default=3, help="選択肢数")
+    parser.add_argument("--alias-chain", type=int, default=3, help="エイリアス連鎖の段数")
+    parser.add_argument("--no-memory", action="store_true", help="ピークメモリを計測しない")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--output", help="結果JSONの出力先")
+    args = parser.parse_args(argv)
+
+    print(f"{'nodes':>9s} {'op':14s} {'count':>8s} {'seconds':>10s} {'us/op':>14s} {'peak MB':>10s}")
+    results = run_scaling(args.sizes, args.ops, args.branching, args.alias_chain,
+                          not args.no_memory, args.seed, report=_print_row)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+高速起動用のzipappバンドルを作成するビルドスクリプト。
+
+実行時に必要なモジュールだけをバイトコンパイル済み（.pyc）でzipappにまとめ、
+事前レンダリング済みストアと、バンドルを呼び出すように書き換えた info.plist を
+出力ディレクトリに配置します。バンドルは `python3 -IS anemia.pyz "{query}"`
+（isolatedモード・site処理なし）で起動します。
+
+.pyc はビルドに使ったPythonのバージョンでのみ有効です。実行環境（/usr/bin/python3）と
+バージョンが異なる場合に備えて .py も同梱しており、その場合はソースから読み込まれます。
+
+実行:
+    python3 build_bundle.py [--output dist/workflow]
+    python3 build_bundle.py --report      # 現行エントリーポイントとのimport時間比較
+"""
+import argparse
+import os
+import py_compile
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, "dist", "workflow")
+BUNDLE_NAME = "anemia.pyz"
+
+# Modules reachable from run_diagnosis.main
+RUNTIME_MODULES = ["run_diagnosis", "output_store", "anemia_flow", "metrics", "search_index", "audit_log",
+                   "alfred_cache"]
+
+MAIN_SOURCE = "import run_diagnosis\nrun_diagnosis.main()\n"
+INTERPRETER = "/usr/bin/python3"
+BUNDLE_SCRIPT = f'{INTERPRETER} -IS {BUNDLE_NAME} "{{query}}"'
+
+
+def build_zipapp(path, modules=RUNTIME_MODULES):
+    """
+    バイトコンパイル済みモジュールを含むzipappを作成します。
+
+    Args:
+        path (str): 出力先パス
+        modules (list): 同梱するモジュール名
+
+    Returns:
+        str: 作成したzipappのパス
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(path, "wb") as f:
+            f.write(f"#!{INTERPRETER} -IS\n".encode("utf-8"))
+            with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED) as zf:
+                zf.writestr("__main__.py", MAIN_SOURCE)
+                for name in modules:
+                    source = os.path.join(ROOT_DIR, name + ".py")
+                    compiled = os.path.join(tmpdir, name + ".pyc")
+                    # Unchecked hash-based pycs skip the source mtime check at import
+                    py_compile.compile(
+                        source, cfile=compiled, dfile=name + ".py", doraise=True,
+                        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+                    )
+                    zf.write(compiled, name + ".pyc")
+                    zf.write(source, name + ".py")
+    os.chmod(path, 0o755)
+    return path
+
+
+def _bundle_plist(source, dest):
+    with open(source, encoding="utf-8") as f:
+        plist = f.read()
+    plist, count = re.subn(
+        r"<string>/usr/bin/python3 run_diagnosis\.py &quot;\{query\}&quot;</string>|"
+        r'<string>/usr/bin/python3 run_diagnosis\.py "\{query\}"</string>',
+        f"<string>{BUNDLE_SCRIPT}</string>",
+        plist,
+    )
+    if count != 1:
+        raise ValueError("info.plist: script filter command not found")
+    with open(dest, "w", encoding="utf-8") as f:
+        f.write(plist)
+
+
+def build_workflow(output=DEFAULT_OUTPUT):
+    """
+    バンドル版のワークフローディレクトリを作成します。
+
+    Args:
+        output (str): 出力先ディレクトリ（既存の内容は削除されます）
+
+    Returns:
+        str: zipappのパス
+    """
+    import incremental_build
+
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    os.makedirs(output)
+    bundle = build_zipapp(os.path.join(output, BUNDLE_NAME))
+    # Rendered after the archive so that the store is never older than its source;
+    # only the entries whose inputs changed since the last build are re-rendered
+    incremental_build.build(store_path=os.path.join(output, "prerendered.bin"))
+    shutil.copy2(os.path.join(ROOT_DIR, "icon.png"), output)
+    _bundle_plist(os.path.join(ROOT_DIR, "info.plist"), os.path.join(output, "info.plist"))
+    return bundle
+
+
+def _import_profile(cmd, cwd, repeat):
+    walls = []
+    modules = total_us = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, text=True, check=True)
+        walls.append((time.perf_counter() - start) * 1000)
+    for line in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|", line)
+        if match:
+            modules += 1
+            total_us += int(match.group(1))
+    return {"modules": modules, "import_ms": total_us / 1000, "wall_ms": statistics.median(walls)}
+
+
+def import_report(bundle_dir=DEFAULT_OUTPUT, node_id="root", repeat=10):
+    """
+    現行エントリーポイントとバンドルのimport数・import時間・壁時計時間を比較します。
+
+    ストアの有無で処理が大きく変わるため、どちらも同じストアを置いた場合（store hit）と
+    置かない場合（store miss、anemia_flow でレンダリング）を別々に計測します。
+    現行エントリーポイントは実行時モジュールのソースを一時ディレクトリに置いて実行します。
+
+    Returns:
+        dict: {"store hit": {"source": {...}, "bundle": {...}}, "store miss": {...}}
+    """
+    python = sys.executable
+    source_cmd = [python, "-X", "importtime", "run_diagnosis.py", node_id]
+    bundle_cmd = [python, "-X", "importtime", "-I", "-S", BUNDLE_NAME, node_id]
+    store = os.path.join(bundle_dir, "prerendered.bin")
+    report = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_dir = os.path.join(tmpdir, "source")
+        miss_dir = os.path.join(tmpdir, "bundle")
+        os.makedirs(source_dir)
+        os.makedirs(miss_dir)
+        for name in RUNTIME_MODULES:
+            shutil.copyfile(os.path.join(ROOT_DIR, name + ".py"), os.path.join(source_dir, name + ".py"))
+        shutil.copyfile(os.path.join(bundle_dir, BUNDLE_NAME), os.path.join(miss_dir, BUNDLE_NAME))
+        report["store miss"] = {
+            "source": _import_profile(source_cmd, source_dir, repeat),
+            "bundle": _import_profile(bundle_cmd, miss_dir, repeat),
+        }
+        # Copied after the sources so that the store is fresh for both entry points
+        shutil.copyfile(store, os.path.join(source_dir, "prerendered.bin"))
+        report["store hit"] = {
+            "source": _import_profile(source_cmd, source_dir, repeat),
+            "bundle": _import_profile(bundle_cmd, bundle_dir, repeat),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="高速起動用のzipappバンドルを作成します")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="出力先ディレクトリ")
+    parser.add_argument("--report", action="store_true", help="ビルド後にimport時間の比較レポートを表示")
+    parser.add_argument("--node", default="root", help="レポートで表示するノードID")
+    args = parser.parse_args(argv)
+
+    bundle = build_workflow(args.output)
+    print(f"Bundle written to {bundle}")
+    if args.report:
+        report = import_report(args.output, args.node)
+        print(f"{'store':10s} {'entry point':12s} {'modules':>8s} {'import ms':>10s} {'wall ms':>8s}")
+        for case, rows in report.items():
+            for name, row in rows.items():
+                print(f"{case:10s} {name:12s} {row['modules']:8d} {row['import_ms']:10.1f} {row['wall_ms']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
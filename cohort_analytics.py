@@ -0,0 +1,288 @@
+"""
+一括トリアージ結果のコホート集計。
+
+`BatchTriage.evaluate_paths` の結果（行ごとの停止ノードコードと経路コード）から、
+以下の集計表を作成し、JSONまたはCSVで出力します。
+
+    - terminals: 停止ノードごとの件数
+    - diagnoses: 診断名ごとの件数（resultノードの診断リストの各項目に計上）
+    - branches: 分岐ノード（既定はMCVで分かれる "H"）からどの子ノードへ進んだかの件数
+    - paths: 経路ごとの件数（回答履歴トークン付き）と経路の深さのヒストグラム
+    - stalls: questionノードで停止した行の件数と、そのうち検査値の欠損が原因の件数（項目別）
+
+行数に比例する処理は `np.bincount` と列ごとのマスク演算だけで、
+以降の集計は経路表（実際に現れた経路の数）に対して行うため、数百万行でも数秒で集計できます。
+
+実行:
+    python3 cohort_analytics.py labs.csv                      # JSONを標準出力へ
+    python3 cohort_analytics.py labs.csv --csv-dir report/    # 表ごとのCSVを出力
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from anemia_flow import BREADCRUMB_SEPARATOR, encode_path
+from batch_triage import BatchTriage, load_csv, normalize_column, np
+
+DEFAULT_BRANCH_NODES = ("H",)
+
+TABLE_COLUMNS = {
+    "terminals": ["node_id", "type", "count", "share"],
+    "diagnoses": ["diagnosis", "count", "share"],
+    "branches": ["branch", "node_id", "label", "count", "share"],
+    "paths": ["path", "token", "node_id", "depth", "count", "share"],
+    "depths": ["depth", "count", "share"],
+    "stalls": ["node_id", "count", "missing", "missing_by_key", "share"],
+}
+
+
+class CohortReport:
+    """
+    コホート全体の集計結果。
+
+    Attributes:
+        rows (int): 行数
+        node_counts (numpy.ndarray): ノードコードごとの停止件数
+        path_counts (numpy.ndarray): 経路コードごとの件数
+        paths (list): 経路表（経路コードを添字とするノードコードのタプル）
+        stall_missing (dict): ノードコード -> (欠損が原因の件数, {検査項目: 欠損件数})
+    """
+    def __init__(self, engine, rows, node_counts, path_counts, paths, stall_missing):
+        self.engine = engine
+        self.rows = rows
+        self.node_counts = node_counts
+        self.path_counts = path_counts
+        self.paths = paths
+        self.stall_missing = stall_missing
+        self._nodes = engine.flowchart.nodes
+
+    def _share(self, count):
+        return round(count / self.rows, 6) if self.rows else 0.0
+
+    def terminals(self):
+        """停止ノードごとの件数を多い順に返します。"""
+        order = np.argsort(-self.node_counts, kind="stable")
+        return [
+            {"node_id": self.engine.node_ids[code], "type": self._nodes[code].type,
+             "count": int(self.node_counts[code]), "share": self._share(int(self.node_counts[code]))}
+            for code in order.tolist() if self.node_counts[code]
+        ]
+
+    def diagnoses(self):
+        """診断名ごとの件数を多い順に返します。"""
+        totals = {}
+        for code in np.flatnonzero(self.node_counts).tolist():
+            for name in self._nodes[code].diagnosis or ():
+                totals[name] = totals.get(name, 0) + int(self.node_counts[code])
+        return [
+            {"diagnosis": name, "count": count, "share": self._share(count)}
+            for name, count in sorted(totals.items(), key=lambda item: -item[1])
+        ]
+
+    def branches(self, branch_nodes=DEFAULT_BRANCH_NODES):
+        """
+        分岐ノードから各子ノードへ進んだ件数を返します。
+
+        Args:
+            branch_nodes (tuple): 分岐ノードIDのタプル
+
+        Returns:
+            list: {"branch", "node_id", "label", "count", "share"} のリスト（選択肢の順）
+        """
+        table = []
+        for branch_id in branch_nodes:
+            branch = self.engine.flowchart.node(branch_id)
+            if branch is None or branch.type != "question":
+                raise KeyError(f"Unknown question node: {branch_id}")
+            children = {}
+            for path_code, path in enumerate(self.paths):
+                count = int(self.path_counts[path_code])
+                if not count or branch.index not in path[:-1]:
+                    continue
+                child = path[path.index(branch.index) + 1]
+                children[child] = children.get(child, 0) + count
+            for option in branch.options:
+                if option.target < 0:
+                    continue
+                count = children.pop(option.target, 0)
+                table.append({"branch": branch.id, "node_id": option.next, "label": option.label,
+                              "count": count, "share": self._share(count)})
+        return table
+
+    def path_table(self, limit=None):
+        """
+        行が停止した経路ごとの件数を多い順に返します。
+
+        Args:
+            limit (int, optional): 返す件数の上限
+
+        Returns:
+            list: {"path", "token", "node_id", "depth", "count", "share"} のリスト
+        """
+        order = np.argsort(-self.path_counts, kind="stable")
+        table = []
+        for path_code in order.tolist():
+            count = int(self.path_counts[path_code])
+            if not count or (limit is not None and len(table) >= limit):
+                break
+            path = self.paths[path_code]
+            table.append({
+                "path": BREADCRUMB_SEPARATOR.join(self.engine.node_ids[code] for code in path),
+                "token": self._token(path),
+                "node_id": self.engine.node_ids[path[-1]],
+                "depth": len(path) - 1,
+                "count": count,
+                "share": self._share(count),
+            })
+        return table
+
+    def _token(self, path):
+        choices = []
+        for parent, child in zip(path, path[1:]):
+            targets = [option.target for option in self._nodes[parent].options]
+            choices.append(targets.index(child))
+        try:
+            return encode_path(choices)
+        except ValueError:
+            return ""
+
+    def depths(self):
+        """経路の深さ（回答した質問の数）ごとの件数を返します。"""
+        lengths = np.fromiter((len(path) - 1 for path in self.paths), dtype=np.int64, count=len(self.paths))
+        counts = np.bincount(lengths, weights=self.path_counts, minlength=1).astype(np.int64)
+        return [{"depth": depth, "count": int(count), "share": self._share(int(count))}
+                for depth, count in enumerate(counts.tolist())]
+
+    def stalls(self):
+        """questionノードで停止した行の件数と欠損による停止の内訳を多い順に返します。"""
+        table = []
+        for code, (missing, by_key) in self.stall_missing.items():
+            count = int(self.node_counts[code])
+            table.append({"node_id": self.engine.node_ids[code], "count": count, "missing": missing,
+                          "missing_by_key": by_key, "share": self._share(count)})
+        table.sort(key=lambda row: -row["count"])
+        return table
+
+    def to_dict(self, branch_nodes=DEFAULT_BRANCH_NODES, path_limit=None):
+        """
+        すべての集計表をJSON出力用のdictにまとめます。
+
+        Args:
+            branch_nodes (tuple): 分岐ノードIDのタプル
+            path_limit (int, optional): 経路表の件数上限
+
+        Returns:
+            dict: {"rows", "terminals", "diagnoses", "branches", "paths", "depths", "stalls"}
+        """
+        return {
+            "rows": self.rows,
+            "terminals": self.terminals(),
+            "diagnoses": self.diagnoses(),
+            "branches": self.branches(branch_nodes),
+            "paths": self.path_table(path_limit),
+            "depths": self.depths(),
+            "stalls": self.stalls(),
+        }
+
+    def write_csv(self, directory, branch_nodes=DEFAULT_BRANCH_NODES, path_limit=None):
+        """
+        集計表ごとに `<表名>.csv` を出力します。
+
+        Args:
+            directory (str): 出力先ディレクトリ（無ければ作成）
+            branch_nodes (tuple): 分岐ノードIDのタプル
+            path_limit (int, optional): 経路表の件数上限
+
+        Returns:
+            list: 出力したファイルのパス
+        """
+        os.makedirs(directory, exist_ok=True)
+        written = []
+        for name, rows in self.to_dict(branch_nodes, path_limit).items():
+            if name not in TABLE_COLUMNS:
+                continue
+            path = os.path.join(directory, name + ".csv")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=TABLE_COLUMNS[name])
+                writer.writeheader()
+                for row in rows:
+                    if "missing_by_key" in row:
+                        row = dict(row, missing_by_key=json.dumps(row["missing_by_key"], ensure_ascii=False))
+                    writer.writerow(row)
+            written.append(path)
+        return written
+
+
+def _missing_mask(column):
+    if column.dtype.kind == "f":
+        return np.isnan(column)
+    return column == ""
+
+
+def _stall_missing(engine, codes, node_counts, columns):
+    # For each question node that stopped rows, count rows lacking a value its predicates need
+    result = {}
+    for code in np.flatnonzero(node_counts).tolist():
+        node = engine.flowchart.nodes[code]
+        if node.type != "question":
+            continue
+        keys = list(dict.fromkeys(key for _, conditions in engine.rules.get(code, ()) for key, _ in conditions))
+        rows = np.flatnonzero(codes == code)
+        any_missing = np.zeros(rows.size, dtype=bool)
+        by_key = {}
+        for key in keys:
+            column = columns.get(key)
+            mask = np.ones(rows.size, dtype=bool) if column is None else _missing_mask(column[rows])
+            by_key[key] = int(mask.sum())
+            any_missing |= mask
+        result[code] = (int(any_missing.sum()), by_key)
+    return result
+
+
+def analyze(columns, engine=None):
+    """
+    列指向の検査データを一括トリアージし、コホート集計を作成します。
+
+    Args:
+        columns (dict): 検査項目名から配列への辞書（全列同じ長さ）
+        engine (BatchTriage, optional): 評価に使うエンジン（省略時は組み込みのフローチャート）
+
+    Returns:
+        CohortReport: 集計結果
+    """
+    engine = BatchTriage() if engine is None else engine
+    columns = {key: normalize_column(values) for key, values in columns.items()}
+    codes, path_codes, paths = engine.evaluate_paths(columns)
+    node_counts = np.bincount(codes, minlength=len(engine.node_ids))
+    path_counts = np.bincount(path_codes, minlength=len(paths))
+    return CohortReport(engine, int(codes.size), node_counts, path_counts, paths,
+                        _stall_missing(engine, codes, node_counts, columns))
+
+
+def main(argv=None, stdout=None):
+    parser = argparse.ArgumentParser(description="一括トリアージ結果をコホート集計します")
+    parser.add_argument("source", nargs="?", help="検査データのCSV（省略時は標準入力）")
+    parser.add_argument("--csv-dir", help="集計表ごとのCSVの出力先ディレクトリ")
+    parser.add_argument("--json", help="JSONの出力先（省略時は --csv-dir が無ければ標準出力）")
+    parser.add_argument("--branch", action="append", help="分岐ノードID（複数指定可、既定: H）")
+    parser.add_argument("--paths", type=int, help="経路表の件数上限")
+    args = parser.parse_args(argv)
+    stdout = sys.stdout if stdout is None else stdout
+
+    report = analyze(load_csv(args.source or sys.stdin))
+    branch_nodes = tuple(args.branch) if args.branch else DEFAULT_BRANCH_NODES
+    if args.csv_dir:
+        report.write_csv(args.csv_dir, branch_nodes, args.paths)
+    if args.json or not args.csv_dir:
+        text = json.dumps(report.to_dict(branch_nodes, args.paths), ensure_ascii=False, indent=2)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
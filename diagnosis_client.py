@@ -0,0 +1,82 @@
+"""
+診断デーモン（diagnosis_daemon.py）用の軽量クライアント。
+
+Alfredのスクリプトフィルタから `run_diagnosis.py` の代わりに呼び出します。
+引数（ノードID・経路トークン・検索語。無い場合は "~"）をデーモンへ転送して応答をそのまま出力し、
+デーモンが起動していない場合は `run_diagnosis.py` と同じプロセス内レンダリングにフォールバックします。
+
+環境変数 `ANEMIA_DAEMON_AUTOSTART=1` を設定すると、フォールバック時に
+次回以降のためにデーモンをバックグラウンドで起動します。
+"""
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "ANEMIA_SOCKET",
+    os.path.join(os.environ.get("TMPDIR", "/tmp"), "alfred-anemia.sock"),
+)
+
+
+def request(node_id, socket_path=DEFAULT_SOCKET_PATH, timeout=2.0):
+    """
+    デーモンにノードIDを送り、応答を受け取ります。
+
+    Args:
+        node_id (str): ノードID
+        socket_path (str): デーモンのソケットパス
+        timeout (float): 接続・受信のタイムアウト秒数
+
+    Returns:
+        bytes or None: 応答のバイト列。デーモンに接続できない場合はNone。
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(node_id.encode("utf-8") + b"\n")
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return None
+    data = b"".join(chunks)
+    return data or None
+
+
+def _spawn_daemon(socket_path):
+    import subprocess
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diagnosis_daemon.py")
+    subprocess.Popen(
+        [sys.executable, script, "--socket", socket_path],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def main():
+    # Start from the empty path token, as run_diagnosis.py does
+    node_id = "~"
+
+    if len(sys.argv) > 1 and sys.argv[1].strip():
+        node_id = sys.argv[1].strip()
+
+    data = request(node_id)
+    if data is not None:
+        sys.stdout.buffer.write(data)
+        return
+
+    # Daemon not running: render in-process
+    import run_diagnosis
+    run_diagnosis.main()
+    if os.environ.get("ANEMIA_DAEMON_AUTOSTART") == "1":
+        _spawn_daemon(DEFAULT_SOCKET_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+常駐型の診断デーモン。
+
+`AnemiaWorkflow` を読み込んだ状態でUnixドメインソケットを待ち受け、
+1接続につき1リクエスト（改行終端のノードID・経路トークン・検索語）を受け取り、
+`run_diagnosis.py` と同じAlfred用JSONを返します（空のリクエストは空の経路トークン "~" として扱います）。
+一定時間リクエストが無ければ自動的に終了します。
+同じソケットで別のデーモンが応答している場合は、起動せずにすぐ終了します。
+
+監査ログ（audit_log.py）が有効な場合は、応答を返した後にバッファへ積み、
+バックグラウンドスレッドがまとめて書き出します。
+
+起動:
+    python3 diagnosis_daemon.py [--socket PATH] [--idle-timeout 秒] [--metrics-file PATH] [--audit-log PATH]
+"""
+import argparse
+import errno
+import os
+import socket
+
+import audit_log
+from anemia_flow import AnemiaWorkflow
+from metrics import METRICS, PeriodicFlusher
+from run_diagnosis import render_error, render_output
+from serializers import encode
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "ANEMIA_SOCKET",
+    os.path.join(os.environ.get("TMPDIR", "/tmp"), "alfred-anemia.sock"),
+)
+DEFAULT_IDLE_TIMEOUT = float(os.environ.get("ANEMIA_DAEMON_IDLE", "600"))
+
+# Upper bound on a request line; node IDs are short
+MAX_REQUEST_SIZE = 4096
+
+
+def render(wf, node_id):
+    """
+    ノードIDに対する応答（末尾改行付きJSON）を生成します。
+
+    Args:
+        wf (AnemiaWorkflow): ワークフロー
+        node_id (str): ノードID・経路トークン・検索語（空の場合は "~"）
+
+    Returns:
+        bytes: 応答のバイト列
+    """
+    try:
+        node_id = node_id or "~"
+        # Memoized per node, so repeated requests are a dictionary lookup
+        data = encode(wf, node_id)
+        if data is not None:
+            return data + b"\n"
+        # Same routing as run_diagnosis.render_output: an unknown token is "not found", not a query
+        output = render_output(wf, node_id)
+    except Exception as e:
+        output = render_error(e)
+    return (output + "\n").encode("utf-8")
+
+
+def _read_request(conn):
+    buf = b""
+    while b"\n" not in buf and len(buf) < MAX_REQUEST_SIZE:
+        chunk = conn.recv(MAX_REQUEST_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+    if not buf:
+        # Closed without a request, e.g. a start-up probe from another daemon
+        return None
+    return buf.split(b"\n", 1)[0].decode("utf-8", "replace").strip()
+
+
+def serve(socket_path=DEFAULT_SOCKET_PATH, idle_timeout=DEFAULT_IDLE_TIMEOUT, wf=None, ready=None, audit=None):
+    """
+    デーモンを起動し、アイドルタイムアウトまでリクエストを処理します。
+
+    Args:
+        socket_path (str): 待ち受けるUnixドメインソケットのパス
+        idle_timeout (float): 最後のリクエストからこの秒数が経過すると終了
+        wf (AnemiaWorkflow, optional): 使用するワークフロー
+        ready (threading.Event, optional): 待ち受け開始時にsetされるイベント
+        audit (audit_log.AuditLog, optional): 応答を記録する監査ログ
+
+    Returns:
+        int: 処理したリクエスト数（別のデーモンが既に待ち受けている場合は0）
+    """
+    if wf is None:
+        wf = AnemiaWorkflow()
+
+    if _is_live(socket_path):
+        return 0
+
+    served = 0
+    bound = False
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            server.bind(socket_path)
+        except OSError as e:
+            # Lost a start-up race against another daemon that bound the path first
+            if e.errno == errno.EADDRINUSE:
+                return 0
+            raise
+        bound = True
+        server.listen(16)
+        server.settimeout(idle_timeout)
+        if ready is not None:
+            ready.set()
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            with conn:
+                conn.settimeout(1.0)
+                try:
+                    node_id = _read_request(conn)
+                    if node_id is None:
+                        continue
+                    data = render(wf, node_id)
+                    conn.sendall(data)
+                except OSError:
+                    continue
+            if audit is not None:
+                audit.append(node_id or "~", data)
+            served += 1
+    finally:
+        server.close()
+        if bound and os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return served
+
+
+def _is_live(socket_path):
+    """
+    ソケットで別のデーモンが応答しているかを確認し、応答しない残骸のソケットは削除します。
+
+    Args:
+        socket_path (str): Unixドメインソケットのパス
+
+    Returns:
+        bool: 別のデーモンが待ち受けている場合True
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except FileNotFoundError:
+            return False
+        except ConnectionRefusedError:
+            # Left behind by a daemon that did not shut down cleanly
+            os.unlink(socket_path)
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="貧血鑑別診断デーモン")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unixドメインソケットのパス")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="アイドル時に自動終了するまでの秒数")
+    parser.add_argument("--metrics-file", help="メトリクスの出力先（.prom ならPrometheus形式）")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="メトリクスの書き出し間隔（秒）")
+    parser.add_argument("--audit-log", help="監査ログの出力先（既定: $ANEMIA_AUDIT_LOG）")
+    args = parser.parse_args(argv)
+
+    flusher = None
+    if args.metrics_file:
+        METRICS.enabled = True
+        flusher = PeriodicFlusher(METRICS, args.metrics_file, args.metrics_interval).start()
+    audit = audit_log.open_log(args.audit_log, buffered=True)
+    try:
+        serve(args.socket, args.idle_timeout, audit=audit)
+    finally:
+        if audit is not None:
+            audit.close()
+        if flusher is not None:
+            flusher.stop()
+
+
+if __name__ == "__main__":
+    main()
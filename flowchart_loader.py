@@ -0,0 +1,247 @@
+"""
+外部定義ファイルからのフローチャート読み込み。
+
+対応形式:
+    - JSON (.json): FLOWCHART と同じ構造のオブジェクト
+    - Mermaid (.md / .mmd / .mermaid): `flowchart TD` 形式の定義
+      （.md の場合は ```mermaid ブロックを使用）
+
+解析・検証済みの結果は marshal 形式でキャッシュし、ソースの mtime とハッシュが
+一致する限り次回以降は解析を省略します。キャッシュはソースと同じディレクトリの
+`__pycache__/` に保存されます。
+
+Mermaidからの変換規則:
+    - `{...}` のノード、またはラベル付きの出力エッジを持つノードは question
+      （エッジのラベル、無ければ遷移先テキストの1行目を選択肢名とします）
+    - 出力エッジの無い `[...]` ノードは result（テキストの各行が診断名）
+    - 葉ノードのみを複数持つ `[...]` ノードは result（子ノードのテキストが診断名）
+    - 葉ノードを1つだけ持つ `[...]` ノードは result（自身のテキストが診断名、子ノードが備考）
+    - それ以外で出力エッジが1本の `[...]` ノードは遷移先へのエイリアス
+    - 最初に定義されたノードが "root" になります
+"""
+import hashlib
+import json
+import marshal
+import os
+import re
+
+from validation import check_flowchart
+
+# Bump when the cached representation changes
+CACHE_VERSION = 1
+
+_MERMAID_BLOCK = re.compile(r"```mermaid\s*\n(.*?)```", re.S)
+_NODE = r"([A-Za-z0-9_]+)\s*(?:\[([^\]]*)\]|\{([^}]*)\})?"
+_EDGE_LINE = re.compile(r"^" + _NODE + r"\s*-->\s*(?:\|([^|]*)\|\s*)?" + _NODE + r"\s*;?$")
+_NODE_LINE = re.compile(r"^" + _NODE + r"\s*;?$")
+_BR = re.compile(r"<br\s*/?>", re.I)
+
+
+def _text(raw):
+    return _BR.sub("\n", raw).strip()
+
+
+def parse_json(text):
+    """
+    JSON形式の定義を読み込みます。
+
+    Args:
+        text (str): JSON文字列
+
+    Returns:
+        dict: FLOWCHARTと同じ形式のフローチャート
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Flowchart definition must be a JSON object")
+    return data
+
+
+def parse_mermaid(text):
+    """
+    Mermaid形式（またはMermaidブロックを含むMarkdown）の定義を読み込みます。
+
+    Args:
+        text (str): Mermaid定義またはMarkdown
+
+    Returns:
+        dict: FLOWCHARTと同じ形式のフローチャート
+    """
+    block = _MERMAID_BLOCK.search(text)
+    if block:
+        text = block.group(1)
+
+    shapes = {}   # node id -> ("question" | "process", text)
+    order = []
+    edges = {}    # node id -> [(label or None, target id)]
+
+    def declare(node_id, square, curly):
+        if node_id not in shapes:
+            order.append(node_id)
+            shapes[node_id] = ("process", node_id)
+        if curly is not None:
+            shapes[node_id] = ("question", _text(curly))
+        elif square is not None:
+            shapes[node_id] = ("process", _text(square))
+        edges.setdefault(node_id, [])
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("%%") or line.startswith(("flowchart", "graph")):
+            continue
+        match = _EDGE_LINE.match(line)
+        if match:
+            src, src_sq, src_cu, label, dst, dst_sq, dst_cu = match.groups()
+            declare(src, src_sq, src_cu)
+            declare(dst, dst_sq, dst_cu)
+            edges[src].append((_text(label) if label else None, dst))
+            continue
+        match = _NODE_LINE.match(line)
+        if match:
+            declare(*match.groups())
+            continue
+        raise ValueError(f"Unsupported Mermaid line: {line}")
+
+    if not order:
+        raise ValueError("Mermaid definition contains no nodes")
+
+    def is_leaf(node_id):
+        return not edges[node_id] and shapes[node_id][0] == "process"
+
+    incoming = {node_id: 0 for node_id in order}
+    for node_id in order:
+        for _, dst in edges[node_id]:
+            incoming[dst] += 1
+
+    flowchart = {"root": order[0]}
+    absorbed = set()
+    for node_id in order:
+        kind, text_ = shapes[node_id]
+        out = edges[node_id]
+        labeled = any(label for label, _ in out)
+        leaf_children = out and not labeled and all(is_leaf(dst) for _, dst in out)
+        if kind == "question" or labeled or (len(out) > 1 and not leaf_children):
+            flowchart[node_id] = {
+                "text": text_,
+                "type": "question",
+                "options": [
+                    {"label": (label or shapes[dst][1].split("\n")[0]).replace("\n", ", "), "next": dst}
+                    for label, dst in out
+                ],
+            }
+        elif not out:
+            flowchart[node_id] = {"text": text_, "type": "result", "diagnosis": text_.split("\n")}
+        elif leaf_children and len(out) > 1:
+            flowchart[node_id] = {
+                "text": text_,
+                "type": "result",
+                "diagnosis": [line for _, dst in out for line in shapes[dst][1].split("\n")],
+            }
+            absorbed.update(dst for _, dst in out)
+        elif leaf_children:
+            dst = out[0][1]
+            flowchart[node_id] = {
+                "text": text_,
+                "type": "result",
+                "diagnosis": text_.split("\n"),
+                "note": shapes[dst][1].replace("\n", "、"),
+            }
+            absorbed.add(dst)
+        else:
+            flowchart[node_id] = out[0][1]
+
+    # Leaves folded into their parent's diagnosis/note are dropped unless referenced elsewhere
+    for node_id in absorbed:
+        if incoming[node_id] == 1:
+            del flowchart[node_id]
+    return flowchart
+
+
+def read_source(path, data=None):
+    """
+    拡張子に応じてソースを解析します（検証は行いません）。
+
+    Args:
+        path (str): 定義ファイルのパス
+        data (bytes, optional): 読み込み済みのファイル内容
+
+    Returns:
+        dict: FLOWCHARTと同じ形式のフローチャート
+    """
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    text = data.decode("utf-8")
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        return parse_json(text)
+    if ext in (".md", ".mmd", ".mermaid"):
+        return parse_mermaid(text)
+    raise ValueError(f"Unsupported flowchart file type: {path}")
+
+
+def parse_file(path, data):
+    """拡張子に応じてソースを解析・検証します。"""
+    flowchart = read_source(path, data)
+    check_flowchart(flowchart)
+    return flowchart
+
+
+def cache_path(path):
+    """ソースファイルに対応するキャッシュファイルのパスを返します。"""
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, "__pycache__", name + ".flowchart.marshal")
+
+
+def _write_cache(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(marshal.dumps(payload))
+    os.replace(tmp_path, path)
+
+
+def load_flowchart(path, use_cache=True):
+    """
+    定義ファイルからフローチャートを読み込みます（キャッシュ付き）。
+
+    Args:
+        path (str): 定義ファイルのパス
+        use_cache (bool): キャッシュを使うか
+
+    Returns:
+        dict: FLOWCHARTと同じ形式のフローチャート
+
+    Raises:
+        ValueError: 解析に失敗した場合（検証エラーは FlowchartValidationError）
+    """
+    st = os.stat(path)
+    cache = cache_path(path)
+    cached = None
+    if use_cache:
+        try:
+            with open(cache, "rb") as f:
+                cached = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            cached = None
+        # Anything but a current-version 5-tuple (another writer, a truncated rewrite) is a miss
+        if not (isinstance(cached, tuple) and len(cached) == 5 and cached[0] == CACHE_VERSION
+                and isinstance(cached[4], dict)):
+            cached = None
+        # Unchanged mtime and size: skip reading the source entirely
+        if cached is not None and cached[1] == st.st_mtime_ns and cached[2] == st.st_size:
+            return cached[4]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if cached is not None and cached[3] == digest:
+        flowchart = cached[4]
+    else:
+        flowchart = parse_file(path, data)
+    if use_cache:
+        try:
+            _write_cache(cache, (CACHE_VERSION, st.st_mtime_ns, st.st_size, digest, flowchart))
+        except OSError:
+            pass
+    return flowchart
@@ -0,0 +1,364 @@
+"""
+電子カルテ（EHR）連携用のHTTP/JSONサービス（標準ライブラリのasyncioのみ）。
+
+1つの `AnemiaWorkflow` を共有し、以下のエンドポイントを提供します。
+
+    GET  /nodes/<ノードIDまたは経路トークン>  Alfredと同じJSON出力（?format= で serializers の形式を指定）
+    POST /walk    {"choices": [1, 1, 2], "start": "root"}  → 到達ノード
+    POST /batch   {"records": [{"mcv": 72, ...}, ...]}    → 各検査値の自動ルーティング結果
+    GET  /flowcharts                                       → 登録済みフローチャートとキャッシュ統計
+    GET  /healthz
+
+クエリ `?flowchart=<名前>&version=<バージョン>` を付けると、レジストリ（registry.py）に
+登録された別のフローチャートを使用します（省略時は既定のワークフロー）。
+
+HTTP/1.1のkeep-aliveとパイプライン（同一接続上の連続リクエストを並行処理し、
+受信順に応答）に対応し、処理中のリクエスト数は --concurrency で上限を設けます。
+
+起動:
+    python3 http_service.py [--host 127.0.0.1] [--port 8080] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import json
+from time import perf_counter
+from urllib.parse import parse_qs, unquote
+
+from anemia_flow import AnemiaWorkflow
+from metrics import METRICS, PeriodicFlusher
+from registry import default_registry
+from serializers import FORMATS, encode, node_payload
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_CONCURRENCY = 64
+
+# Requests parsed ahead of the response currently being written, per connection
+PIPELINE_DEPTH = 16
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+MAX_BATCH_RECORDS = 10_000
+# JSON scalars accepted as lab values (null means not measured)
+LAB_VALUE_TYPES = (bool, int, float, str)
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """エラー応答として返す例外。"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _response(status, body, keep_alive=True):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+
+def _error_body(status, message):
+    return json.dumps({"error": message, "status": status}, ensure_ascii=False)
+
+
+class DiagnosisService:
+    """
+    共有ワークフローに対するHTTPリクエストの処理。
+    """
+    def __init__(self, wf=None, concurrency=DEFAULT_CONCURRENCY, registry=None):
+        """
+        Args:
+            wf (AnemiaWorkflow, optional): 既定で使用するワークフロー
+            concurrency (int): 同時に処理するリクエスト数の上限
+            registry (FlowchartRegistry, optional): ?flowchart= で選択できるフローチャートのレジストリ
+        """
+        self.wf = wf if wf is not None else AnemiaWorkflow()
+        self.registry = registry if registry is not None else default_registry()
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._connections = set()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        サーバーを起動します（実行中のイベントループ上で呼び出します）。
+
+        Returns:
+            asyncio.Server: 起動したサーバー
+        """
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_SIZE)
+
+    async def wait_closed(self, timeout=5.0):
+        """クライアントが切断した接続の処理がすべて終わるまで待ちます。"""
+        if self._connections:
+            await asyncio.wait(set(self._connections), timeout=timeout)
+
+    async def handle_connection(self, reader, writer):
+        """1つの接続上のリクエストを順に読み、受信順に応答します。"""
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        pending = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        sender = asyncio.ensure_future(self._send_responses(pending, writer))
+        try:
+            while not sender.done():
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as e:
+                    await pending.put((_ready(_response(e.status, _error_body(e.status, e.message), False)), False))
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive, body = request
+                task = asyncio.ensure_future(self._respond(method, target, body, keep_alive))
+                await pending.put((task, keep_alive))
+                if not keep_alive:
+                    break
+        finally:
+            await pending.put(None)
+            await sender
+            writer.close()
+            self._connections.discard(connection)
+
+    async def _send_responses(self, pending, writer):
+        connected = True
+        while True:
+            entry = await pending.get()
+            if entry is None:
+                return
+            task, keep_alive = entry
+            data = await task
+            if connected:
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                except ConnectionError:
+                    # Keep draining the queue so that the reader never blocks on a full pipeline
+                    connected = False
+            if not keep_alive:
+                return
+
+    async def _respond(self, method, target, body, keep_alive):
+        start = perf_counter() if METRICS.enabled else 0.0
+        async with self._semaphore:
+            try:
+                status, payload = await self.dispatch(method, target, body)
+            except HTTPError as e:
+                status, payload = e.status, _error_body(e.status, e.message)
+            except Exception as e:
+                status, payload = 500, _error_body(500, str(e))
+        if METRICS.enabled:
+            METRICS.observe("http_request", perf_counter() - start)
+        return _response(status, payload, keep_alive)
+
+    async def dispatch(self, method, target, body):
+        """
+        リクエストを各エンドポイントに振り分けます。
+
+        Args:
+            method (str): HTTPメソッド
+            target (str): リクエストパス
+            body (bytes): リクエストボディ
+
+        Returns:
+            tuple: (ステータスコード, 応答ボディ)
+        """
+        path, _, query = target.partition("?")
+        params = parse_qs(query)
+        if path.startswith("/nodes/"):
+            _require(method, "GET")
+            fmt = params.get("format", ["alfred"])[0]
+            return self.render_node(unquote(path[len("/nodes/"):]), self.engine(params), fmt)
+        if path == "/walk":
+            _require(method, "POST")
+            return self.walk(_parse_json(body), self.engine(params))
+        if path == "/batch":
+            _require(method, "POST")
+            # Large batches run off the event loop so other connections stay responsive
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.batch, _parse_json(body), self.engine(params))
+        if path == "/flowcharts":
+            _require(method, "GET")
+            listing = {name: self.registry.versions(name) for name in self.registry.names()}
+            return 200, json.dumps({"flowcharts": listing, "cache": self.registry.stats()}, ensure_ascii=False)
+        if path == "/healthz":
+            _require(method, "GET")
+            return 200, '{"status": "ok"}'
+        raise HTTPError(404, f"Unknown endpoint: {path}")
+
+    def engine(self, params):
+        """
+        クエリパラメータで指定されたフローチャートのエンジンを返します。
+
+        Args:
+            params (dict): parse_qs の結果
+
+        Returns:
+            AnemiaWorkflow: エンジン（flowchart 指定が無ければ既定のワークフロー）
+        """
+        name = params.get("flowchart", [None])[0]
+        if name is None:
+            return self.wf
+        try:
+            return self.registry.get(name, params.get("version", [None])[0])
+        except KeyError as e:
+            raise HTTPError(404, e.args[0])
+
+    def render_node(self, node_id, wf=None, fmt="alfred"):
+        """ノード（または経路トークン）を指定形式で返します（エンコード結果はメモ化されます）。"""
+        if fmt not in FORMATS:
+            raise HTTPError(400, f"Unknown format: {fmt}")
+        data = encode(wf or self.wf, node_id, fmt)
+        if data is None:
+            raise HTTPError(404, f"Node not found: {node_id}")
+        return 200, data
+
+    def walk(self, request, wf=None):
+        """選択肢インデックス列を辿り、到達ノードを返します。"""
+        wf = wf or self.wf
+        choices = request.get("choices") if isinstance(request, dict) else None
+        # bool is a subclass of int, but true/false are not option indexes
+        if not isinstance(choices, list) or not all(type(c) is int for c in choices):
+            raise HTTPError(400, "'choices' must be a list of integers")
+        start = request.get("start", "root")
+        if not isinstance(start, str):
+            raise HTTPError(400, "'start' must be a node ID string")
+        try:
+            node = wf.walk_path(choices, start)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return 200, json.dumps({"node": node_payload(node)}, ensure_ascii=False)
+
+    def batch(self, request, wf=None):
+        """検査値レコードごとに自動ルーティングした結果を返します。"""
+        wf = wf or self.wf
+        records = request.get("records") if isinstance(request, dict) else None
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise HTTPError(400, "'records' must be a list of objects")
+        if len(records) > MAX_BATCH_RECORDS:
+            raise HTTPError(413, f"At most {MAX_BATCH_RECORDS} records per request")
+        for i, labs in enumerate(records):
+            for key, value in labs.items():
+                if value is not None and not isinstance(value, LAB_VALUE_TYPES):
+                    raise HTTPError(400, f"records[{i}].{key}: lab values must be numbers, strings, booleans or null")
+        results = []
+        for i, labs in enumerate(records):
+            try:
+                node_id, path = wf.route_labs(labs)
+            except TypeError:
+                # e.g. {"mcv": "abc"} compared with a numeric threshold
+                raise HTTPError(400, f"records[{i}]: lab value of the wrong type for the flowchart's predicates") from None
+            node = wf.get_node(node_id) if node_id is not None else None
+            result = {"node": node_id, "path": path, "type": node.type if node else None}
+            if node is not None and node.diagnosis is not None:
+                result["diagnosis"] = list(node.diagnosis)
+            results.append(result)
+        return 200, json.dumps({"results": results}, ensure_ascii=False)
+
+
+def _ready(data):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(data)
+    return future
+
+
+def _require(method, expected):
+    if method != expected:
+        raise HTTPError(405, f"Use {expected}")
+
+
+def _parse_json(body):
+    try:
+        return json.loads(body or b"null")
+    except ValueError as e:
+        raise HTTPError(400, f"Invalid JSON: {e}")
+
+
+async def _read_request(reader):
+    """
+    リクエストを1件読み込みます。
+
+    Returns:
+        tuple or None: (メソッド, パス, keep-aliveか, ボディ)。接続が閉じられた場合はNone。
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise HTTPError(400, "Incomplete request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "Request header too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        keep_alive = connection == "keep-alive"
+    else:
+        keep_alive = connection != "close"
+
+    if "transfer-encoding" in headers:
+        raise HTTPError(411, "Chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, keep_alive, body
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="貧血鑑別診断HTTPサービス")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="待ち受けアドレス")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="待ち受けポート")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同時処理数の上限")
+    parser.add_argument("--metrics-file", help="メトリクスの出力先（.prom ならPrometheus形式）")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="メトリクスの書き出し間隔（秒）")
+    args = parser.parse_args(argv)
+
+    flusher = None
+    if args.metrics_file:
+        METRICS.enabled = True
+        flusher = PeriodicFlusher(METRICS, args.metrics_file, args.metrics_interval).start()
+
+    async def run():
+        server = await DiagnosisService(concurrency=args.concurrency).start(args.host, args.port)
+        print(f"Listening on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if flusher is not None:
+            flusher.stop()
+
+
+if __name__ == "__main__":
+    main()
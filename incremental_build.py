@@ -0,0 +1,295 @@
+"""
+フローチャート変更時の派生成果物の差分ビルド。
+
+フローチャートの各エントリの内容ハッシュから、成果物ごとの入力ダイジェストを求め、
+前回のビルドから入力が変わった成果物だけを作り直します。
+
+成果物は `prerendered.bin` の各エントリ、つまりノードID・エイリアス・経路トークンごとのAlfred JSON出力です。
+エイリアス連鎖と表示するノード、経路トークンの場合は経路上のノード（選択肢名・遷移先）に依存します。
+検索索引・経路索引は実行時にフローチャートから作るため、ここでは扱いません。
+
+ビルドディレクトリには成果物（artifacts.marshal: 内容ハッシュ・入力ダイジェスト付き）と、
+確認用の依存グラフ（manifest.json: エントリごとの内容ハッシュ、成果物ごとの入力ダイジェストと依存エントリ）を保存します。
+描画の実装（BUILD_SOURCES のソース）が変わるとビルドキーが変わり、前回の成果物は使わずにすべて作り直します。
+
+実行:
+    python3 incremental_build.py                 # FLOWCHART から prerendered.bin を差分ビルド
+    python3 incremental_build.py --source flowchart.json --store out/prerendered.bin --verbose
+"""
+import argparse
+import hashlib
+import json
+import marshal
+import os
+import sys
+import time
+
+import output_store
+from anemia_flow import MAX_ALIAS_DEPTH, AnemiaWorkflow, FLOWCHART, encode_path
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Sources whose code determines the rendered bytes for a given flowchart
+BUILD_SOURCES = output_store.RENDER_SOURCES + ("incremental_build.py",)
+
+MANIFEST_NAME = "manifest.json"
+ARTIFACTS_NAME = "artifacts.marshal"
+
+DEFAULT_BUILD_DIR = os.path.join(_HERE, "__pycache__", "incremental")
+
+
+def _digest(*parts):
+    return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def content_digest(value):
+    """
+    フローチャートの1エントリ（ノードのdictまたはエイリアス文字列）の内容ハッシュを返します。
+
+    Args:
+        value (dict or str): エントリの値
+
+    Returns:
+        str: 16進のハッシュ値
+    """
+    return _digest(json.dumps(value, ensure_ascii=False, sort_keys=True))
+
+
+def build_key(sources=BUILD_SOURCES):
+    """
+    描画の実装のソースから、前回の成果物を再利用できるかを決めるビルドキーを求めます。
+
+    Args:
+        sources (iterable): ソースファイル名（このモジュールと同じディレクトリからの相対パス）
+
+    Returns:
+        str: 16進のハッシュ値
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for name in sources:
+        h.update(name.encode("utf-8") + b"\0")
+        try:
+            with open(os.path.join(_HERE, name), "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(b"-")
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class DependencyGraph:
+    """
+    フローチャートから求めた、ストアのエントリごとの入力ダイジェストと依存エントリ。
+    """
+    def __init__(self, source, wf=None):
+        """
+        Args:
+            source (dict): FLOWCHARTと同じ形式のフローチャート
+            wf (AnemiaWorkflow, optional): source をコンパイルしたワークフロー
+        """
+        self.source = source
+        self.wf = AnemiaWorkflow(source, cache=None) if wf is None else wf
+        self.nodes = {key: content_digest(value) for key, value in source.items()}
+        # Store key -> (input digest, IDs of the flowchart entries it depends on)
+        self.artifacts = {}
+        self._add_outputs()
+
+    def _chain(self, key):
+        # The entries visited while resolving key through aliases (same bound as compile_flowchart)
+        keys = [key]
+        value = self.source.get(key)
+        while isinstance(value, str) and value not in keys and len(keys) <= MAX_ALIAS_DEPTH:
+            keys.append(value)
+            value = self.source.get(value)
+        return keys
+
+    def _chain_digests(self, keys):
+        return [key + "=" + self.nodes.get(key, "-") for key in keys]
+
+    def _add_outputs(self):
+        for key in self.source:
+            chain = self._chain(key)
+            self.artifacts[key] = (_digest("output", key, *self._chain_digests(chain)), chain)
+
+        # Path tokens: every prefix of every root-to-terminal path, as output_store prerenders them.
+        # A token's output shows the chosen labels (breadcrumb) and the node it ends at, so the walk
+        # digest covers the chosen options and aliases only, and the final node's content is added last.
+        compiled = self.wf.flowchart
+        root_chain = self._chain("root")
+        # Token -> (walk digest, entries it depends on, entry the walk ends at)
+        walks = {"~": (_digest("~", *self._chain_digests(root_chain[:-1]), root_chain[-1]),
+                       root_chain, root_chain[-1])}
+        for path in self.wf.paths():
+            token = "~"
+            full = encode_path(path.choices)
+            for depth, choice in enumerate(path.choices):
+                child = full[:depth + 2]
+                if child not in walks:
+                    digest, inputs, _ = walks[token]
+                    option = compiled.node(path.nodes[depth]).options[choice]
+                    chain = self._chain(option.next)
+                    walks[child] = (_digest(digest, str(choice), option.label,
+                                            *self._chain_digests(chain[:-1]), chain[-1]),
+                                    inputs + [key for key in chain if key not in inputs], chain[-1])
+                token = child
+        for token, (digest, inputs, final) in walks.items():
+            self.artifacts[token] = (_digest("output", digest, *self._chain_digests([final])), inputs)
+
+    def build_artifact(self, key):
+        """
+        1つの成果物を作ります。
+
+        Args:
+            key (str): ストアのキー（"S5", "~1121" など）
+
+        Returns:
+            bytes: 出力のバイト列
+        """
+        return (self.wf.generate_json_output(key) + "\n").encode("utf-8")
+
+
+def load_artifacts(build_dir=DEFAULT_BUILD_DIR, key=None):
+    """
+    前回のビルド結果を読み込みます。
+
+    Args:
+        build_dir (str): ビルドディレクトリ
+        key (str, optional): 現在のビルドキー（省略時は build_key() で求める）
+
+    Returns:
+        tuple: (エントリID → 内容ハッシュ のdict, ストアのキー → (入力ダイジェスト, 内容) のdict)。
+        無い・壊れている・ビルドキーが異なる場合は空のdict。
+    """
+    try:
+        with open(os.path.join(build_dir, ARTIFACTS_NAME), "rb") as f:
+            saved_key, nodes, values = marshal.loads(f.read())
+    except (OSError, ValueError, EOFError, TypeError):
+        return {}, {}
+    if saved_key != (build_key() if key is None else key) or not isinstance(nodes, dict) or not isinstance(values, dict):
+        return {}, {}
+    return nodes, values
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(flowchart=None, build_dir=DEFAULT_BUILD_DIR, store_path=output_store.STORE_PATH, force=False):
+    """
+    入力が変わった成果物だけを作り直し、ストア（prerendered.bin）とビルドディレクトリを更新します。
+
+    Args:
+        flowchart (dict, optional): フローチャート（省略時はFLOWCHART）
+        build_dir (str): ビルドディレクトリ（依存グラフと成果物の保存先）
+        store_path (str, optional): 書き出すストアのパス（Noneなら書き出さない）
+        force (bool): 前回のビルド結果を使わずにすべて作り直すか
+
+    Returns:
+        dict: {"changed_nodes": 内容が変わった・追加・削除されたエントリID,
+        "rebuilt" / "removed": ストアのキーのリスト, "reused": 再利用した成果物の数,
+        "store_written": ストアを書き出したか, "seconds": 所要時間}
+
+    Raises:
+        validation.FlowchartValidationError: フローチャートに問題がある場合
+    """
+    from validation import check_flowchart
+
+    start = time.perf_counter()
+    source = FLOWCHART if flowchart is None else flowchart
+    check_flowchart(source)
+    graph = DependencyGraph(source)
+    current_key = build_key()
+    old_nodes, previous = ({}, {}) if force else load_artifacts(build_dir, current_key)
+
+    changed = {key for key, digest in graph.nodes.items() if old_nodes.get(key) != digest}
+    changed.update(old_nodes.keys() - graph.nodes.keys())
+    report = {
+        "changed_nodes": sorted(changed),
+        "rebuilt": [],
+        "reused": 0,
+        "removed": sorted(previous.keys() - graph.artifacts.keys()),
+        "store_written": False,
+    }
+    values = {}
+    for key, (digest, _) in graph.artifacts.items():
+        cached = previous.get(key)
+        if cached is not None and cached[0] == digest:
+            values[key] = cached
+            report["reused"] += 1
+        else:
+            values[key] = (digest, graph.build_artifact(key))
+            report["rebuilt"].append(key)
+
+    if store_path is not None and (report["rebuilt"] or report["removed"] or not os.path.exists(store_path)):
+        _write_atomic(store_path, output_store.pack((key, value) for key, (_, value) in values.items()))
+        report["store_written"] = True
+    elif store_path is not None and not output_store.is_fresh(store_path):
+        # The contents are current (same build key and inputs), but a source was touched, e.g. by a
+        # checkout; bump the mtime so that run_diagnosis.py keeps using the store
+        os.utime(store_path)
+
+    unchanged = not (changed or report["rebuilt"] or report["removed"])
+    if unchanged and os.path.exists(os.path.join(build_dir, MANIFEST_NAME)):
+        report["seconds"] = time.perf_counter() - start
+        return report
+    os.makedirs(build_dir, exist_ok=True)
+    # Artifacts carry their own input digests; the manifest only describes the dependency graph
+    _write_atomic(os.path.join(build_dir, ARTIFACTS_NAME), marshal.dumps((current_key, graph.nodes, values)))
+    manifest = {
+        "build_key": current_key,
+        "nodes": graph.nodes,
+        "artifacts": {key: {"digest": digest, "inputs": inputs}
+                      for key, (digest, inputs) in graph.artifacts.items()},
+    }
+    _write_atomic(os.path.join(build_dir, MANIFEST_NAME),
+                  json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def _print_report(report, verbose, stdout):
+    changed = report["changed_nodes"]
+    listed = ", ".join(changed[:20]) + (", ..." if len(changed) > 20 else "")
+    stdout.write(f"changed entries: {len(changed)}" + (f" ({listed})" if changed else "") + "\n")
+    stdout.write(f"outputs rebuilt {len(report['rebuilt']):6d}  reused {report['reused']:6d}  "
+                 f"removed {len(report['removed']):6d}\n")
+    if verbose:
+        for name in report["rebuilt"]:
+            stdout.write(f"  + {name}\n")
+        for name in report["removed"]:
+            stdout.write(f"  - {name}\n")
+    stdout.write(f"store {'written' if report['store_written'] else 'unchanged'} ({report['seconds']:.3f} s)\n")
+
+
+def main(argv=None, stdout=None):
+    stdout = sys.stdout if stdout is None else stdout
+    parser = argparse.ArgumentParser(description="事前レンダリング出力（prerendered.bin）の差分ビルド")
+    parser.add_argument("--source", help="フローチャート定義ファイル（省略時は FLOWCHART）")
+    parser.add_argument("--build-dir", default=DEFAULT_BUILD_DIR, help="依存グラフと成果物の保存先")
+    parser.add_argument("--store", help="書き出すストアのパス（FLOWCHART の場合の既定: prerendered.bin）")
+    parser.add_argument("--force", action="store_true", help="すべて作り直す")
+    parser.add_argument("--verbose", action="store_true", help="作り直した成果物を列挙する")
+    parser.add_argument("--json", action="store_true", help="レポートをJSONで出力する")
+    args = parser.parse_args(argv)
+
+    flowchart = None
+    store = args.store
+    if args.source:
+        from flowchart_loader import load_flowchart
+        flowchart = load_flowchart(args.source)
+    elif store is None:
+        store = output_store.STORE_PATH
+    report = build(flowchart, args.build_dir, store, args.force)
+    if args.json:
+        json.dump(report, stdout, ensure_ascii=False, indent=2)
+        stdout.write("\n")
+    else:
+        _print_report(report, args.verbose, stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
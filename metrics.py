@@ -0,0 +1,174 @@
+"""
+ホットパスの計測（任意機能）。
+
+`AnemiaWorkflow.get_node` / `generate_json_output` と `run_diagnosis.main` の所要時間、
+ノードごとの表示回数を記録します。無効時は属性チェック1回分のコストしかかかりません。
+
+有効化:
+    環境変数 ANEMIA_METRICS=1（CLIでは ANEMIA_METRICS_FILE に出力先を指定）
+    またはデーモン等の --metrics-file オプション
+
+出力形式:
+    拡張子が .prom の場合はPrometheusテキスト形式、それ以外はJSONスナップショット
+"""
+import _thread
+import os
+import time
+
+ENV_ENABLED = "ANEMIA_METRICS"
+ENV_FILE = "ANEMIA_METRICS_FILE"
+
+
+class Metrics:
+    """
+    所要時間・ノード表示回数・ゲージを保持するレジストリ。
+    """
+    def __init__(self, enabled=False):
+        """
+        Args:
+            enabled (bool): 記録を有効にするか
+        """
+        self.enabled = enabled
+        self._lock = _thread.allocate_lock()
+        self.reset()
+
+    def reset(self):
+        """記録済みの値をすべて消去します。"""
+        with self._lock:
+            # name -> [count, total seconds, max seconds]
+            self.timings = {}
+            self.node_hits = {}
+            self.gauges = {}
+
+    def observe(self, name, seconds):
+        """
+        操作の所要時間を1件記録します。
+
+        Args:
+            name (str): 操作名 (例: "get_node")
+            seconds (float): 所要時間（秒）
+        """
+        with self._lock:
+            entry = self.timings.get(name)
+            if entry is None:
+                self.timings[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def hit(self, node_id):
+        """ノードの表示回数を1増やします。"""
+        with self._lock:
+            self.node_hits[node_id] = self.node_hits.get(node_id, 0) + 1
+
+    def set_gauge(self, name, value):
+        """ゲージ値（起動時間など）を設定します。"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        """
+        現在の値のスナップショットを返します。
+
+        Returns:
+            dict: {"timestamp", "timings", "node_hits", "gauges"}
+        """
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "timings": {
+                    name: {"count": count, "total_seconds": total, "max_seconds": peak}
+                    for name, (count, total, peak) in self.timings.items()
+                },
+                "node_hits": dict(self.node_hits),
+                "gauges": dict(self.gauges),
+            }
+
+    def to_json(self):
+        """スナップショットをJSON文字列で返します。"""
+        import json
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """スナップショットをPrometheusテキスト形式で返します。"""
+        snap = self.snapshot()
+        lines = [
+            "# HELP anemia_operation_seconds Time spent in instrumented operations.",
+            "# TYPE anemia_operation_seconds summary",
+        ]
+        for name, t in sorted(snap["timings"].items()):
+            lines.append(f'anemia_operation_seconds_sum{{operation="{name}"}} {t["total_seconds"]!r}')
+            lines.append(f'anemia_operation_seconds_count{{operation="{name}"}} {t["count"]}')
+        lines.append("# HELP anemia_operation_seconds_max Slowest observed call per operation.")
+        lines.append("# TYPE anemia_operation_seconds_max gauge")
+        for name, t in sorted(snap["timings"].items()):
+            lines.append(f'anemia_operation_seconds_max{{operation="{name}"}} {t["max_seconds"]!r}')
+        lines.append("# HELP anemia_node_hits_total Number of times each node was rendered.")
+        lines.append("# TYPE anemia_node_hits_total counter")
+        for node_id, count in sorted(snap["node_hits"].items()):
+            lines.append(f'anemia_node_hits_total{{node="{_escape_label(node_id)}"}} {count}')
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"# TYPE anemia_{name} gauge")
+            lines.append(f"anemia_{name} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, path, fmt=None):
+        """
+        スナップショットをファイルへ書き出します（一時ファイル経由で置き換え）。
+
+        Args:
+            path (str): 出力先パス
+            fmt (str, optional): "prometheus" または "json"。省略時は拡張子から判定。
+        """
+        if fmt is None:
+            fmt = "prometheus" if path.endswith(".prom") else "json"
+        text = self.to_prometheus() if fmt == "prometheus" else self.to_json()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class PeriodicFlusher:
+    """
+    一定間隔でメトリクスをファイルへ書き出すバックグラウンドスレッド（デーモン・バッチ用）。
+    """
+    def __init__(self, metrics, path, interval=10.0, fmt=None):
+        """
+        Args:
+            metrics (Metrics): 書き出すレジストリ
+            path (str): 出力先パス
+            interval (float): 書き出し間隔（秒）
+            fmt (str, optional): 出力形式
+        """
+        import threading
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.fmt = fmt
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.metrics.flush(self.path, self.fmt)
+
+    def stop(self):
+        """スレッドを停止し、最後にもう一度書き出します。"""
+        self._stop.set()
+        self._thread.join()
+        self.metrics.flush(self.path, self.fmt)
+
+
+# Process-wide registry used by the instrumented hot paths
+METRICS = Metrics(enabled=os.environ.get(ENV_ENABLED) == "1")
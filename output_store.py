@@ -0,0 +1,203 @@
+"""
+全ノードのAlfred JSON出力を事前レンダリングしたバイナリストア。
+
+ノードごとの出力は不変なので、ビルド時に一度だけレンダリングして
+1つのバイナリファイル（オフセットインデックス付き）にまとめます。
+`run_diagnosis.py` は `anemia_flow` をimportせずにこのファイルをmmapし、
+該当ノードのバイト列をそのまま標準出力へ書き出します。
+
+ファイル形式:
+    MAGIC (4 bytes) | エントリ数 (uint32) | データ部の開始位置 (uint32)
+    インデックス: [キーの位置 (uint32) | キー長 (uint16) | オフセット (uint32) | 長さ (uint32)] * エントリ数
+    キー部: 各キー（UTF-8）を連結したもの
+    データ部: 各ノードのJSON出力（末尾改行込み）を連結したもの
+
+インデックスは固定長でキーのバイト列順に並んでいるため、検索は二分探索（O(log n)）で済みます。
+
+ストアにはAlfredのキャッシュ指定を含めません（実行時の設定で `alfred_cache.add_cache` が付加します）。
+
+ビルド:
+    python3 output_store.py [出力先パス]
+"""
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"AFS2"
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose code determines the pre-rendered bytes (node layout, breadcrumbs, store format)
+RENDER_SOURCES = ("anemia_flow.py", "alfred_cache.py", "search_index.py", "output_store.py")
+
+# Default locations of the pre-rendered blob and the modules it is rendered from
+if os.path.isfile(_HERE):
+    # Imported from a zipapp bundle: the blob sits next to the archive,
+    # and the archive itself is what the blob was rendered from
+    STORE_PATH = os.path.join(os.path.dirname(_HERE), "prerendered.bin")
+    SOURCE_PATHS = (_HERE,)
+else:
+    STORE_PATH = os.path.join(_HERE, "prerendered.bin")
+    SOURCE_PATHS = tuple(os.path.join(_HERE, name) for name in RENDER_SOURCES)
+
+_HEADER = struct.Struct("<4sII")
+_SLOT = struct.Struct("<IHII")
+
+
+def is_fresh(path=STORE_PATH, source=SOURCE_PATHS):
+    """
+    ストアが存在し、生成元モジュールのどれよりも新しいかを判定します。
+
+    Args:
+        path (str): ストアファイルのパス
+        source (str or iterable): 生成元モジュールのパス（RENDER_SOURCES の各モジュール）
+
+    Returns:
+        bool: ストアが利用可能な場合True
+    """
+    try:
+        store_mtime = os.stat(path).st_mtime
+    except OSError:
+        return False
+    for source_path in (source,) if isinstance(source, str) else source:
+        try:
+            if os.stat(source_path).st_mtime > store_mtime:
+                return False
+        except OSError:
+            # Source not shipped alongside the store; trust the store as built
+            continue
+    return True
+
+
+def lookup(node_id, path=STORE_PATH, source=SOURCE_PATHS):
+    """
+    事前レンダリング済みの出力をストアから取得します。
+
+    Args:
+        node_id (str): ノードID
+        path (str): ストアファイルのパス
+        source (str or iterable): 生成元モジュールのパス（鮮度判定用）
+
+    Returns:
+        bytes or None: 出力のバイト列。ストアが無い・古い・キーが無い場合はNone。
+    """
+    if not is_fresh(path, source):
+        return None
+    key = node_id.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if len(mm) < _HEADER.size:
+            return None
+        magic, count, data_start = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            return None
+        keys_start = _HEADER.size + count * _SLOT.size
+        if data_start > len(mm) or keys_start > data_start:
+            return None
+        # Binary search over the fixed-width slots, which are sorted by key bytes
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            key_pos, key_len, offset, length = _SLOT.unpack_from(mm, _HEADER.size + mid * _SLOT.size)
+            entry_key = mm[keys_start + key_pos:keys_start + key_pos + key_len]
+            if entry_key == key:
+                start = data_start + offset
+                return mm[start:start + length]
+            if entry_key < key:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+    finally:
+        mm.close()
+
+
+def pack(entries):
+    """
+    (キー, 出力バイト列) の組をストア形式のバイト列にまとめます。
+
+    Args:
+        entries (iterable): (str, bytes) のタプル列
+
+    Returns:
+        bytes: ストアファイルの内容
+    """
+    # Sorted by the encoded key so that lookup can bisect; the first payload wins for a repeated key
+    encoded = {}
+    for key, payload in entries:
+        encoded.setdefault(key.encode("utf-8"), payload)
+    index = bytearray()
+    keys = bytearray()
+    data = bytearray()
+    for encoded_key in sorted(encoded):
+        payload = encoded[encoded_key]
+        index += _SLOT.pack(len(keys), len(encoded_key), len(data), len(payload))
+        keys += encoded_key
+        data += payload
+    data_start = _HEADER.size + len(index) + len(keys)
+    return _HEADER.pack(MAGIC, len(encoded), data_start) + bytes(index) + bytes(keys) + bytes(data)
+
+
+def render_entries(wf=None):
+    """
+    ワークフローのフローチャートの全ノード（エイリアス含む）と、rootから到達できるすべての経路トークンを
+    `run_diagnosis.py` と同じ形式でレンダリングします。
+
+    Args:
+        wf (AnemiaWorkflow, optional): レンダリングに使うワークフロー（キャッシュ指定は無視されます）
+
+    Yields:
+        tuple: (ノードID, 出力バイト列)
+    """
+    from anemia_flow import AnemiaWorkflow, encode_path
+
+    if wf is None or wf.cache is not None:
+        # The cache directive is added at run time, from the environment of each call
+        wf = AnemiaWorkflow(wf and wf.flowchart, cache=None)
+    # Every prefix of every root-to-result path, e.g. "~", "~1", "~11", ...
+    tokens = {}
+    for path in wf.paths():
+        for depth in range(len(path.choices) + 1):
+            tokens[encode_path(path.choices[:depth])] = None
+    for node_id in list(wf.flowchart) + list(tokens):
+        output = wf.generate_json_output(node_id)
+        yield node_id, (output + "\n").encode("utf-8")
+
+
+def build_store(path=STORE_PATH, wf=None):
+    """
+    全ノードをレンダリングしてストアファイルを書き出します。
+
+    Args:
+        path (str): 出力先パス
+        wf (AnemiaWorkflow, optional): レンダリングに使うワークフロー
+
+    Returns:
+        int: 書き出したエントリ数
+
+    Raises:
+        validation.FlowchartValidationError: フローチャートに問題がある場合
+    """
+    from anemia_flow import AnemiaWorkflow
+    from validation import check_flowchart
+
+    if wf is None:
+        wf = AnemiaWorkflow()
+    check_flowchart(wf.flowchart)
+    entries = list(render_entries(wf))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pack(entries))
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else STORE_PATH
+    count = build_store(target)
+    print(f"{count} entries rendered to {target}")
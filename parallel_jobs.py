@@ -0,0 +1,144 @@
+"""
+リプレイ・一括トリアージのプロセス並列実行。
+
+入力ファイルを行単位のチャンクに分割して `ProcessPoolExecutor` に配り、
+ワーカーごとに一度だけワークフロー（またはトリアージエンジン）を初期化します。
+triageではCSVを親プロセスで `csv.reader` によりレコード単位に分割し、
+ヘッダーと先頭チャンクから推定した列の型は初期化時にワーカーへ一度だけ渡します。
+結果は入力順にマージして出力します。処理中のチャンク数を制限しているため、
+入力サイズに関わらずメモリ使用量は一定です。
+
+実行:
+    python3 parallel_jobs.py replay sessions.jsonl --workers 32 --chunk-size 20000 > results.jsonl
+    python3 parallel_jobs.py triage labs.csv --workers 32 > triage.csv
+"""
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Per-process engine (and CSV header/column kinds for triage), set once by the pool initializer
+_ENGINE = None
+_CSV_LAYOUT = None
+
+
+def _init_worker(job, csv_layout=None):
+    global _ENGINE, _CSV_LAYOUT
+    if job == "triage":
+        from batch_triage import BatchTriage
+        _ENGINE = BatchTriage()
+        _CSV_LAYOUT = csv_layout
+    else:
+        from anemia_flow import AnemiaWorkflow
+        _ENGINE = AnemiaWorkflow()
+
+
+def _replay_chunk(args):
+    from replay_sessions import read_records, replay
+    start, lines, fmt = args
+    return [json.dumps(result, ensure_ascii=False) + "\n"
+            for result in replay(read_records(lines, fmt, start), _ENGINE)]
+
+
+def _triage_chunk(rows):
+    from batch_triage import columns_from_rows, output_rows
+    header, kinds = _CSV_LAYOUT
+    node_ids, diagnosis_index = _ENGINE.evaluate(columns_from_rows(header, rows, kinds))
+    out = io.StringIO()
+    csv.writer(out).writerows(output_rows(_ENGINE, node_ids, diagnosis_index))
+    return [out.getvalue()]
+
+
+def iter_chunks(lines, chunk_size):
+    """
+    行（またはCSVレコード）のイテラブルをチャンクに分割します。
+
+    Yields:
+        tuple: (チャンク先頭の行番号, 行のリスト)
+    """
+    iterator = iter(lines)
+    line_no = 1
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield line_no, chunk
+        line_no += len(chunk)
+
+
+def run(job, stream, output, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, fmt="auto"):
+    """
+    ジョブを並列実行し、結果を入力順に書き出します。
+
+    Args:
+        job (str): "replay" または "triage"
+        stream (iterable): 入力行のイテラブル（triageの場合は先頭行がCSVヘッダー）
+        output (file): 出力先
+        workers (int, optional): ワーカープロセス数（既定: CPU数）
+        chunk_size (int): 1チャンクあたりの行数（triageではCSVレコード数）
+        fmt (str): replayの入力形式
+
+    Returns:
+        int: 処理したチャンク数
+    """
+    workers = workers or os.cpu_count() or 1
+    stream = iter(stream)
+    initargs = (job,)
+    if job == "triage":
+        # Split on record boundaries here so that quoted fields with newlines stay in one chunk
+        from batch_triage import OUTPUT_HEADER, infer_column_kinds
+        reader = csv.reader(stream)
+        header = next(reader, [])
+        chunks = (rows for _, rows in iter_chunks(reader, chunk_size))
+        first = next(chunks, [])
+        initargs = (job, (header, infer_column_kinds(header, first)))
+        csv.writer(output).writerow(OUTPUT_HEADER)
+        func = _triage_chunk
+        tasks = chain([first] if first else [], chunks)
+    elif job == "replay":
+        func = _replay_chunk
+        tasks = ((start, chunk, fmt) for start, chunk in iter_chunks(stream, chunk_size))
+    else:
+        raise ValueError(f"Unknown job: {job}")
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        # Keep a bounded window of chunks in flight and drain it in submission order
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.submit(func, task))
+            if len(pending) >= workers * 2:
+                output.writelines(pending.popleft().result())
+                done += 1
+        while pending:
+            output.writelines(pending.popleft().result())
+            done += 1
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="リプレイ・一括トリアージを並列実行します")
+    parser.add_argument("job", choices=["replay", "triage"], help="実行するジョブ")
+    parser.add_argument("input", nargs="?", help="入力ファイル（省略時は標準入力）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（既定: CPU数）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1チャンクあたりの行数")
+    parser.add_argument("--format", choices=["auto", "csv", "jsonl"], default="auto",
+                        help="replayの入力形式")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, newline="", encoding="utf-8") as f:
+            run(args.job, f, sys.stdout, args.workers, args.chunk_size, args.format)
+    else:
+        run(args.job, sys.stdin, sys.stdout, args.workers, args.chunk_size, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+フローチャートの経路索引と、診断名からの逆引き。
+
+コンパイル済みフローチャートごとに一度だけ構築し（`CompiledFlowchart.derived` にキャッシュ）、
+以下をdict参照で引けるようにします。
+
+    - rootから各末端ノードまでのすべての経路（ノードID列と選択肢インデックス列）
+    - 各ノードの深さ（rootからの最短ステップ数）と祖先ノード
+    - 診断名 → その診断に至る経路・末端ノード
+
+診断名は末尾の括弧書き（例: "骨髄異形成症候群 (MDS)" の "(MDS)"）を除いた形で照合するため、
+表記揺れのある同一診断（C・L14・N18 の骨髄異形成症候群など）をまとめて引けます。
+"""
+import re
+from collections import namedtuple
+
+INDEX_KEY = "path_index"
+
+# A root-to-terminal route: node IDs visited and the option index chosen at each question
+IndexedPath = namedtuple("IndexedPath", ["nodes", "choices"])
+
+_QUALIFIER = re.compile(r"\s*[(（][^()（）]*[)）]\s*$")
+
+
+def normalize_diagnosis(name):
+    """
+    診断名を照合用の形に正規化します（末尾の括弧書きを除去）。
+
+    Args:
+        name (str): 診断名 (例: "骨髄異形成症候群 (MDS)")
+
+    Returns:
+        str: 正規化した診断名 (例: "骨髄異形成症候群")
+    """
+    return _QUALIFIER.sub("", name.strip()) or name.strip()
+
+
+class PathIndex:
+    """
+    1つの CompiledFlowchart に対する経路・深さ・祖先・診断逆引きの索引。
+    """
+    def __init__(self, flowchart):
+        """
+        Args:
+            flowchart (CompiledFlowchart): 索引を作るフローチャート
+        """
+        self.flowchart = flowchart
+        size = len(flowchart.nodes)
+        self.depth = [None] * size
+        self.paths = ()
+        self._through = [[] for _ in range(size)]
+        self._ancestors = [()] * size
+        self._by_diagnosis = {}
+        self._terminals = {}
+        if flowchart.root is not None:
+            self._build_depths()
+            self._build_paths()
+            self._build_ancestors()
+
+    def _build_depths(self):
+        nodes = self.flowchart.nodes
+        root = self.flowchart.root
+        self.depth[root] = 0
+        frontier = [root]
+        while frontier:
+            next_frontier = []
+            for index in frontier:
+                for option in nodes[index].options or ():
+                    target = option.target
+                    if target >= 0 and self.depth[target] is None:
+                        self.depth[target] = self.depth[index] + 1
+                        next_frontier.append(target)
+            frontier = next_frontier
+
+    def _build_paths(self):
+        nodes = self.flowchart.nodes
+        paths = []
+        # Iterative DFS; each frame is [node index, next option to try, whether a child was followed]
+        stack = [[self.flowchart.root, 0, False]]
+        on_path = {self.flowchart.root}
+        choices = []
+        while stack:
+            frame = stack[-1]
+            options = nodes[frame[0]].options or ()
+            position = frame[1]
+            # Dangling targets and cycles back onto the current path are not followed
+            while position < len(options) and (options[position].target < 0
+                                               or options[position].target in on_path):
+                position += 1
+            if position < len(options):
+                frame[1] = position + 1
+                frame[2] = True
+                target = options[position].target
+                choices.append(position)
+                stack.append([target, 0, False])
+                on_path.add(target)
+                continue
+            if not frame[2]:
+                self._record_path(paths, [f[0] for f in stack], choices)
+            stack.pop()
+            on_path.discard(frame[0])
+            if choices:
+                choices.pop()
+        self.paths = tuple(paths)
+
+    def _record_path(self, paths, indexes, choices):
+        nodes = self.flowchart.nodes
+        path_id = len(paths)
+        paths.append(IndexedPath(tuple(nodes[i].id for i in indexes), tuple(choices)))
+        for i in set(indexes):
+            self._through[i].append(path_id)
+        for name in nodes[indexes[-1]].diagnosis or ():
+            key = normalize_diagnosis(name)
+            entries = self._by_diagnosis.setdefault(key, [])
+            if path_id not in entries:
+                entries.append(path_id)
+            self._terminals.setdefault(key, {})[nodes[indexes[-1]].id] = None
+
+    def _build_ancestors(self):
+        ancestors = [set() for _ in self.flowchart.nodes]
+        for path in self.paths:
+            seen = []
+            for node_id in path.nodes:
+                ancestors[self.flowchart.resolve(node_id)].update(seen)
+                seen.append(node_id)
+        depth = self.depth
+        resolve = self.flowchart.resolve
+        self._ancestors = [
+            tuple(sorted(found, key=lambda node_id: (depth[resolve(node_id)], resolve(node_id))))
+            for found in ancestors
+        ]
+
+    def paths_through(self, index):
+        """整数IDのノードを通る経路のタプルを返します。"""
+        return tuple(self.paths[i] for i in self._through[index])
+
+    def ancestors(self, index):
+        """整数IDのノードの祖先ノードID（浅い順）を返します。"""
+        return self._ancestors[index]
+
+    def paths_for_diagnosis(self, name):
+        """診断名に至る経路のタプルを返します。"""
+        return tuple(self.paths[i] for i in self._by_diagnosis.get(normalize_diagnosis(name), ()))
+
+    def terminals_for_diagnosis(self, name):
+        """診断名を出す末端ノードIDのタプル（重複なし、出現順）を返します。"""
+        return tuple(self._terminals.get(normalize_diagnosis(name), ()))
+
+    def diagnoses(self):
+        """索引に含まれる正規化済み診断名のタプルを返します。"""
+        return tuple(self._by_diagnosis)
+
+
+def get_index(flowchart):
+    """
+    フローチャートの PathIndex を返します（初回のみ構築）。
+
+    Args:
+        flowchart (CompiledFlowchart): フローチャート
+
+    Returns:
+        PathIndex: 経路索引
+    """
+    return flowchart.derived(INDEX_KEY, PathIndex)
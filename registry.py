@@ -0,0 +1,215 @@
+"""
+複数フローチャートのレジストリ（LRUキャッシュ付き）。
+
+貧血以外のガイドライン（血小板減少症・白血球減少症など）も同じエンジンで扱えるよう、
+フローチャートを名前とバージョンで登録し、`AnemiaWorkflow` 形式のエンジンとして取り出します。
+登録時には読み込み方法だけを保持し、コンパイル済みのエンジンは件数上限付きのLRUキャッシュに置くため、
+多数のガイドラインを扱う常駐プロセスでもメモリを使い切らず、リクエストごとの再解析も起きません。
+
+ディレクトリから一括登録する場合のファイル名は `<名前>@<バージョン>.json`（.md / .mmd も可）です。
+バージョンを省略した `<名前>.json` はバージョン "1" として登録されます。
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from time import perf_counter
+
+from anemia_flow import COMPILED_FLOWCHART, AnemiaWorkflow, CompiledFlowchart, compile_flowchart
+
+DEFAULT_MAX_SIZE = int(os.environ.get("ANEMIA_REGISTRY_SIZE", "16"))
+
+SOURCE_EXTENSIONS = (".json", ".md", ".mmd", ".mermaid")
+
+_VERSION_PART = re.compile(r"(\d+)")
+
+
+def version_key(version):
+    """
+    バージョン文字列を自然順で比較するためのキーを返します（"1.10" > "1.9"）。
+
+    Args:
+        version (str): バージョン
+
+    Returns:
+        tuple: 比較用のキー
+    """
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part)
+                 for part in _VERSION_PART.split(version) if part)
+
+
+class FlowchartRegistry:
+    """
+    名前とバージョンでフローチャートを管理し、コンパイル済みエンジンをLRUキャッシュするレジストリ。
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, engine=AnemiaWorkflow):
+        """
+        Args:
+            max_size (int): キャッシュするエンジン数の上限
+            engine (type): フローチャートを受け取るエンジンのクラス
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.engine = engine
+        self._sources = {}          # (name, version) -> dict / CompiledFlowchart / file path
+        self._cache = OrderedDict()  # (name, version) -> engine, least recently used first
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "load_seconds": 0.0}
+
+    def register(self, name, version, source):
+        """
+        フローチャートを登録します（コンパイルは最初の取得時に行います）。
+
+        同じ名前・バージョンで再登録した場合は、キャッシュ済みのエンジンを破棄します。
+
+        Args:
+            name (str): フローチャート名 (例: "anemia")
+            version (str): バージョン (例: "2015")
+            source (dict, CompiledFlowchart or str): 定義のdict・コンパイル済みフローチャート・定義ファイルのパス
+        """
+        key = (name, str(version))
+        with self._lock:
+            self._sources[key] = source
+            self._cache.pop(key, None)
+
+    def register_directory(self, directory):
+        """
+        ディレクトリ内の定義ファイルを `<名前>@<バージョン>.<拡張子>` の規則で一括登録します。
+
+        Args:
+            directory (str): 定義ファイルを置いたディレクトリ
+
+        Returns:
+            list: 登録した (名前, バージョン) のリスト
+        """
+        registered = []
+        for filename in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in SOURCE_EXTENSIONS:
+                continue
+            name, _, version = stem.partition("@")
+            self.register(name, version or "1", os.path.join(directory, filename))
+            registered.append((name, version or "1"))
+        return registered
+
+    def unregister(self, name, version):
+        """登録とキャッシュを削除します。"""
+        key = (name, str(version))
+        with self._lock:
+            self._sources.pop(key, None)
+            self._cache.pop(key, None)
+
+    def names(self):
+        """登録済みのフローチャート名を返します。"""
+        with self._lock:
+            return sorted({name for name, _ in self._sources})
+
+    def versions(self, name):
+        """登録済みのバージョンを古い順に返します。"""
+        with self._lock:
+            return sorted((v for n, v in self._sources if n == name), key=version_key)
+
+    def get(self, name, version=None):
+        """
+        エンジンを取得します。キャッシュに無ければ読み込み・コンパイルして追加し、
+        上限を超えた場合は最も長く使われていないものを破棄します。
+
+        Args:
+            name (str): フローチャート名
+            version (str, optional): バージョン（省略時は最新）
+
+        Returns:
+            AnemiaWorkflow: エンジン
+
+        Raises:
+            KeyError: 登録されていない場合
+        """
+        if version is None:
+            versions = self.versions(name)
+            if not versions:
+                raise KeyError(f"Unknown flowchart: {name}")
+            version = versions[-1]
+        key = (name, str(version))
+        with self._lock:
+            engine = self._cache.get(key)
+            if engine is not None:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return engine
+            if key not in self._sources:
+                raise KeyError(f"Unknown flowchart: {name}@{version}")
+            source = self._sources[key]
+            self._stats["misses"] += 1
+
+        # Load outside the lock so that a slow parse does not block lookups of cached engines
+        start = perf_counter()
+        engine = self.engine(_compile(source))
+        elapsed = perf_counter() - start
+
+        with self._lock:
+            self._stats["load_seconds"] += elapsed
+            if self._sources.get(key) is not source:
+                # Re-registered or removed while loading; hand out the engine without caching it
+                return engine
+            cached = self._cache.get(key)
+            if cached is not None:
+                # Another thread finished loading first
+                self._cache.move_to_end(key)
+                return cached
+            self._cache[key] = engine
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+                self._stats["evictions"] += 1
+        return engine
+
+    def invalidate(self, name=None, version=None):
+        """
+        キャッシュ済みのエンジンを破棄します（登録は残ります）。
+
+        Args:
+            name (str, optional): 対象のフローチャート名（省略時はすべて）
+            version (str, optional): 対象のバージョン（省略時はその名前のすべて）
+        """
+        with self._lock:
+            for key in list(self._cache):
+                if (name is None or key[0] == name) and (version is None or key[1] == str(version)):
+                    del self._cache[key]
+
+    def stats(self):
+        """
+        キャッシュの統計を返します。
+
+        Returns:
+            dict: {"hits", "misses", "evictions", "load_seconds", "size", "max_size", "registered"}
+        """
+        with self._lock:
+            return dict(self._stats, size=len(self._cache), max_size=self.max_size,
+                        registered=len(self._sources))
+
+    def cached(self):
+        """キャッシュ中の (名前, バージョン) を古い順に返します。"""
+        with self._lock:
+            return list(self._cache)
+
+
+def _compile(source):
+    if isinstance(source, CompiledFlowchart):
+        return source
+    if isinstance(source, str):
+        from flowchart_loader import load_flowchart
+        # The loader validates and keeps its own parse cache next to the file
+        return compile_flowchart(load_flowchart(source))
+    return compile_flowchart(source, validate=True)
+
+
+def default_registry(max_size=DEFAULT_MAX_SIZE):
+    """
+    組み込みの貧血フローチャートを "anemia" として登録したレジストリを作成します。
+
+    Returns:
+        FlowchartRegistry: レジストリ
+    """
+    registry = FlowchartRegistry(max_size)
+    registry.register("anemia", "2015", COMPILED_FLOWCHART)
+    return registry
@@ -0,0 +1,148 @@
+"""
+回答履歴のリプレイCLI。
+
+標準入力から1行1セッションの回答履歴を読み込み、`AnemiaWorkflow` で辿った結果を
+1行1レコードのJSONLとして標準出力へ逐次書き出します。
+入力はジェネレータで1行ずつ処理するため、入力サイズに関わらずメモリ使用量は一定です。
+不正な履歴はストリームを止めずにエラーレコードとして出力します。
+
+入力形式（1行ごと）:
+    CSV:   root,1,1,2,1,0
+    JSONL: ["root", 1, 1, 2, 1, 0]  または  {"id": "p1", "path": ["root", 1, 1, 2, 1, 0]}
+先頭要素は開始ノードID、以降は各questionノードで選んだ選択肢のインデックスです。
+開始ノードIDを省略した場合は "root" から辿ります。
+
+実行:
+    python3 replay_sessions.py [--format auto|csv|jsonl] < sessions.jsonl > results.jsonl
+"""
+import argparse
+import json
+import sys
+
+from anemia_flow import AnemiaWorkflow
+from metrics import METRICS, PeriodicFlusher
+
+
+def parse_line(line, fmt="auto"):
+    """
+    1行分の入力を (セッションID, 開始ノードID, 選択肢インデックスのリスト) に変換します。
+
+    Args:
+        line (str): 入力行
+        fmt (str): "auto", "csv" または "jsonl"
+
+    Returns:
+        tuple: (セッションID or None, 開始ノードID, 選択肢インデックスのリスト)
+
+    Raises:
+        ValueError: 行を解釈できない場合
+    """
+    text = line.strip()
+    session_id = None
+    if fmt == "jsonl" or (fmt == "auto" and text[:1] in ("[", "{")):
+        record = json.loads(text)
+        if isinstance(record, dict):
+            session_id = record.get("id")
+            record = record.get("path")
+        if not isinstance(record, list):
+            raise ValueError("path must be a list")
+        elements = record
+    else:
+        elements = [e.strip() for e in text.split(",")]
+
+    start = "root"
+    if elements and not _is_index(elements[0]):
+        start = str(elements[0])
+        elements = elements[1:]
+    choices = []
+    for element in elements:
+        if not _is_index(element):
+            raise ValueError(f"Invalid option index: {element!r}")
+        choices.append(int(element))
+    return session_id, start, choices
+
+
+def _is_index(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    return isinstance(value, str) and value.isdigit()
+
+
+def read_records(stream, fmt="auto", start=1):
+    """
+    入力ストリームを1行ずつ解釈します。
+
+    Args:
+        stream (iterable): 入力行のイテラブル
+        fmt (str): "auto", "csv" または "jsonl"
+        start (int): 先頭行の行番号
+
+    Yields:
+        tuple: (行番号, 解釈結果のタプル or ValueError, 元の行)
+    """
+    for line_no, line in enumerate(stream, start):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, parse_line(line, fmt), line
+        except ValueError as e:
+            yield line_no, e, line
+
+
+def replay(records, wf=None):
+    """
+    解釈済みレコードをワークフローで辿り、結果レコードを生成します。
+
+    Yields:
+        dict: 結果レコード（成功時は到達ノード、失敗時は "error" を含む）
+    """
+    if wf is None:
+        wf = AnemiaWorkflow()
+    for line_no, parsed, line in records:
+        if isinstance(parsed, Exception):
+            yield {"line": line_no, "input": line.rstrip("\n"), "error": str(parsed)}
+            continue
+        session_id, start, choices = parsed
+        result = {"line": line_no}
+        if session_id is not None:
+            result["id"] = session_id
+        try:
+            node = wf.walk_path(choices, start)
+        except ValueError as e:
+            result["input"] = line.rstrip("\n")
+            result["error"] = str(e)
+            yield result
+            continue
+        result["node"] = node.id
+        result["type"] = node.type
+        if node.diagnosis is not None:
+            result["diagnosis"] = list(node.diagnosis)
+        yield result
+
+
+def main(argv=None, stdin=None, stdout=None):
+    parser = argparse.ArgumentParser(description="回答履歴をリプレイして到達ノードを出力します")
+    parser.add_argument("--format", choices=["auto", "csv", "jsonl"], default="auto",
+                        help="入力形式（既定: 行ごとに自動判定）")
+    parser.add_argument("--metrics-file", help="メトリクスの出力先（.prom ならPrometheus形式）")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="メトリクスの書き出し間隔（秒）")
+    args = parser.parse_args(argv)
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+
+    flusher = None
+    if args.metrics_file:
+        METRICS.enabled = True
+        flusher = PeriodicFlusher(METRICS, args.metrics_file, args.metrics_interval).start()
+    try:
+        for result in replay(read_records(stdin, args.format)):
+            stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if flusher is not None:
+            flusher.stop()
+
+
+if __name__ == "__main__":
+    main()
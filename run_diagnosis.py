@@ -1,26 +1,115 @@
 """
 Alfredワークフローのエントリーポイントとなるスクリプト。
 引数として現在のノードIDを受け取り、次のステップ（質問または結果）をJSON形式で標準出力します。
+引数が無い場合は空の経路トークン "~" から開始し、以降は回答履歴を含む経路トークンを
+受け渡します（1つ前に戻る項目を表示するため）。
+引数がノードIDでも経路トークンでもない場合は検索語として扱い、一致するノードの一覧を出力します。
+
+事前レンダリング済みのストア（output_store.py）が新しければ、
+`anemia_flow` をimportせずにストアの内容をそのまま出力します
+（Alfredのキャッシュ指定が設定されていれば alfred_cache で付加します）。
 """
-import json
+import os
 import sys
-from anemia_flow import AnemiaWorkflow
+
+import output_store
+
+def render_error(e):
+    """
+    例外をAlfredに表示するエラー用JSONに変換します。
+
+    Args:
+        e (Exception): 発生した例外
+
+    Returns:
+        str: エラー表示用のJSON文字列
+    """
+    import json
+    return json.dumps({
+        "items": [{"title": "エラーが発生しました", "subtitle": str(e), "valid": False}]
+    }, ensure_ascii=False)
 
 def main():
-    node_id = "root"
+    # Start from the empty path token so that the session history is tracked
+    node_id = "~"
 
     if len(sys.argv) > 1 and sys.argv[1].strip():
         node_id = sys.argv[1].strip()
 
+    if os.environ.get("ANEMIA_METRICS") == "1":
+        _instrumented_main(node_id)
+    else:
+        _run(node_id)
+
+def render_output(wf, node_id):
+    """
+    ノードID・経路トークン・検索語に対する出力を生成します。
+
+    Args:
+        wf (AnemiaWorkflow): ワークフロー
+        node_id (str): ノードID・経路トークン・検索語
+
+    Returns:
+        str: Alfred用のJSON文字列
+    """
+    if node_id in wf.flowchart or node_id.startswith("~"):
+        return wf.generate_json_output(node_id)
+    # Free text typed into Alfred: jump to matching nodes
+    return wf.generate_search_output(node_id)
+
+def _run(node_id):
+    # Fast path: copy the pre-rendered bytes straight to stdout
+    _respond(node_id, output_store.lookup(node_id))
+
+def _respond(node_id, data):
+    """ストアから引いた出力（無ければNone）を、必要ならレンダリングして標準出力へ書き出します。"""
+    if data is not None:
+        if os.environ.get("ANEMIA_CACHE_SECONDS"):
+            import alfred_cache
+            data = alfred_cache.add_cache(data, alfred_cache.cache_from_env())
+    else:
+        try:
+            from anemia_flow import AnemiaWorkflow
+            data = (render_output(AnemiaWorkflow(), node_id) + "\n").encode("utf-8")
+        except Exception as e:
+            data = (render_error(e) + "\n").encode("utf-8")
+    sys.stdout.buffer.write(data)
+
+    if os.environ.get("ANEMIA_AUDIT_LOG"):
+        _audit(node_id, data)
+
+def _audit(node_id, data):
+    """応答を出力した後に監査ログへ1レコード追記します（失敗しても応答には影響させません）。"""
+    sys.stdout.flush()
     try:
-        wf = AnemiaWorkflow()
-        output = wf.generate_json_output(node_id)
-        print(output)
-    except Exception as e:
-        error_output = json.dumps({
-            "items": [{"title": "エラーが発生しました", "subtitle": str(e), "valid": False}]
-        }, ensure_ascii=False)
-        print(error_output)
+        import audit_log
+        audit_log.open_log().append(node_id, data)
+    except OSError as e:
+        sys.stderr.write(f"audit log write failed: {e}\n")
+
+def _instrumented_main(node_id):
+    """計測付きで実行し、ANEMIA_METRICS_FILE が指定されていればスナップショットを書き出します。"""
+    import time
+    from metrics import METRICS, ENV_FILE
+
+    # CPU time consumed before main() approximates interpreter start-up and imports
+    METRICS.set_gauge("startup_cpu_seconds", time.process_time())
+    start = time.perf_counter()
+    data = output_store.lookup(node_id)
+    METRICS.observe("store_lookup", time.perf_counter() - start)
+    if data is None:
+        # Timed here so that _respond finds the module already imported
+        import_start = time.perf_counter()
+        import anemia_flow  # noqa: F401
+        METRICS.observe("import_anemia_flow", time.perf_counter() - import_start)
+    else:
+        METRICS.hit(node_id)
+    _respond(node_id, data)
+    sys.stdout.flush()
+    METRICS.observe("main", time.perf_counter() - start)
+    path = os.environ.get(ENV_FILE)
+    if path:
+        METRICS.flush(path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+"""
+ノード・選択肢・診断名の文字n-gram全文検索。
+
+日本語は単語境界が無いため、NFKC正規化・小文字化したテキストを文字単位の
+ユニグラム／バイグラムに分解し、転置索引（n-gram → {ノード整数ID: 重み}）を作ります。
+索引はコンパイル済みフローチャートごとに一度だけ構築されます（`CompiledFlowchart.derived`）。
+
+検索対象と重み:
+    - diagnosis: 3.0（resultノードの診断名）
+    - text: 2.0（ノードの表示テキスト）
+    - label: 1.5（選択肢の表示名。遷移先ノードの語として扱います）
+    - note: 1.0（備考）
+
+スコアは「一致したクエリn-gramの割合」を主キー、重みの合計を副キーとし、
+クエリ全体を部分文字列として含むノードにはボーナスを加えます。
+"""
+import unicodedata
+
+INDEX_KEY = "search_index"
+
+FIELD_WEIGHTS = {"diagnosis": 3.0, "text": 2.0, "label": 1.5, "note": 1.0}
+
+# Fraction of query n-grams a node must contain to be returned
+MIN_COVERAGE = 0.5
+
+# Added once when the whole normalized query occurs verbatim in the node
+EXACT_BONUS = 10.0
+
+
+def normalize(text):
+    """
+    検索用にテキストを正規化します（NFKC・小文字化・空白除去）。
+
+    Args:
+        text (str): 元のテキスト
+
+    Returns:
+        str: 正規化したテキスト
+    """
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def ngrams(text):
+    """
+    正規化済みテキストのn-gram集合を返します。
+
+    2文字以上ならバイグラム、1文字ならユニグラムのみを使います。
+
+    Args:
+        text (str): 正規化済みテキスト
+
+    Returns:
+        set: n-gramの集合
+    """
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def node_fields(flowchart):
+    """
+    各ノードの検索対象テキストを集めます。
+
+    Args:
+        flowchart (CompiledFlowchart): フローチャート
+
+    Returns:
+        list: ノード整数IDごとの (フィールド名, テキスト) のリスト。
+        選択肢の表示名は遷移先ノードの "label" として含まれます。
+    """
+    fields = [[] for _ in flowchart.nodes]
+    for node in flowchart.nodes:
+        fields[node.index].append(("text", node.text or ""))
+        for name in node.diagnosis or ():
+            fields[node.index].append(("diagnosis", name))
+        if node.note:
+            fields[node.index].append(("note", node.note))
+        for option in node.options or ():
+            if option.target >= 0:
+                fields[option.target].append(("label", option.label))
+    return fields
+
+
+def term_weights(fields):
+    """
+    1ノード分の検索対象テキストから、n-gramごとの重みを求めます。
+
+    Args:
+        fields (iterable): (フィールド名, テキスト) の列
+
+    Returns:
+        dict: n-gram → 重み（複数のフィールドに現れる場合は最大の重み）
+    """
+    weights = {}
+    get = weights.get
+    for field, text in fields:
+        normalized = normalize(text)
+        weight = FIELD_WEIGHTS[field]
+        # Unigrams let single-character queries match; bigrams carry the ranking
+        for gram in ngrams(normalized).union(normalized):
+            if get(gram, 0.0) < weight:
+                weights[gram] = weight
+    return weights
+
+
+class SearchIndex:
+    """
+    1つの CompiledFlowchart に対する文字n-gram転置索引。
+    """
+    def __init__(self, flowchart):
+        """
+        Args:
+            flowchart (CompiledFlowchart): 索引を作るフローチャート
+        """
+        self.flowchart = flowchart
+        self.postings = postings = {}
+        self._haystacks = []
+        for index, fields in enumerate(node_fields(flowchart)):
+            for gram, weight in term_weights(fields).items():
+                entry = postings.get(gram)
+                if entry is None:
+                    postings[gram] = {index: weight}
+                else:
+                    entry[index] = weight
+            self._haystacks.append("\n".join(normalize(text) for _, text in fields))
+
+    def search(self, query, limit=9):
+        """
+        クエリに一致するノードを関連度順に返します。
+
+        Args:
+            query (str): 検索文字列 (例: "鉄欠乏", "PNH")
+            limit (int): 返す最大件数
+
+        Returns:
+            list: (ノードID, スコア) のリスト（スコア降順）
+        """
+        normalized = normalize(query)
+        grams = ngrams(normalized)
+        if not grams:
+            return []
+        scores = {}
+        hits = {}
+        for gram in grams:
+            for index, weight in self.postings.get(gram, {}).items():
+                scores[index] = scores.get(index, 0.0) + weight
+                hits[index] = hits.get(index, 0) + 1
+        needed = len(grams) * MIN_COVERAGE
+        ranked = []
+        for index, count in hits.items():
+            if count < needed:
+                continue
+            score = count / len(grams) * 100 + scores[index]
+            if normalized in self._haystacks[index]:
+                score += EXACT_BONUS
+            ranked.append((-score, index))
+        ranked.sort()
+        nodes = self.flowchart.nodes
+        return [(nodes[index].id, -neg_score) for neg_score, index in ranked[:limit]]
+
+
+def get_index(flowchart):
+    """
+    フローチャートの SearchIndex を返します（初回のみ構築）。
+
+    Args:
+        flowchart (CompiledFlowchart): フローチャート
+
+    Returns:
+        SearchIndex: 検索索引
+    """
+    return flowchart.derived(INDEX_KEY, SearchIndex)
@@ -0,0 +1,151 @@
+"""
+出力形式（シリアライザ）の切り替えと、ノードごとのエンコード結果のメモ化。
+
+組み込みの形式:
+    - alfred: Alfred Script Filter用JSON（`generate_json_output` と同じ、indent=2）
+    - alfred-compact: 同じ内容の空白なしJSON
+    - api: API向けの素のJSON（{"node": {...}}、経路トークンの場合は "choices" 付き）
+    - jsonl: api形式を1行にしたもの（末尾改行付き）
+
+エンコード結果はコンパイル済みフローチャートごと・(形式, ノードIDまたは経路トークン) ごとに
+バイト列でメモ化されるため、デーモン・HTTPサービス・バッチ処理で同じノードを繰り返し出力しても
+2回目以降はdict参照1回で済みます。メモはコンパイル済みフローチャートに付随するので、
+フローチャートを再読み込み（再コンパイル）すると自動的に新しいメモが使われます。
+
+新しい形式は `register_format` で追加できます。
+"""
+import json
+from time import perf_counter
+
+from anemia_flow import PATH_TOKEN_PREFIX, decode_path
+from metrics import METRICS
+
+MEMO_KEY = "serializer_memo"
+
+# Upper bound on memoized entries per flowchart; further encodings are returned uncached
+MAX_MEMO_ENTRIES = 65536
+
+FORMATS = {}
+
+
+def register_format(name):
+    """
+    出力形式を登録するデコレータ。
+
+    登録する関数は (ワークフロー, ノード, 経路の選択肢またはNone, 引数文字列) を受け取り、
+    バイト列を返します。
+
+    Args:
+        name (str): 形式名
+    """
+    def decorator(encoder):
+        FORMATS[name] = encoder
+        return encoder
+    return decorator
+
+
+def node_payload(node):
+    """
+    ノードをAPI応答用のdictに変換します。
+
+    Args:
+        node (Node): ノード
+
+    Returns:
+        dict: {"id", "type", "text", ["options"], ["diagnosis"], ["note"]}
+    """
+    payload = {"id": node.id, "type": node.type, "text": node.text}
+    if node.options is not None:
+        payload["options"] = [{"label": opt.label, "next": opt.next} for opt in node.options]
+    if node.diagnosis is not None:
+        payload["diagnosis"] = list(node.diagnosis)
+    if node.note is not None:
+        payload["note"] = node.note
+    return payload
+
+
+# The Alfred encoders call the uninstrumented renderer; encode() records the metrics itself
+@register_format("alfred")
+def _encode_alfred(wf, node, choices, arg):
+    return wf._render_json(arg).encode("utf-8")
+
+
+@register_format("alfred-compact")
+def _encode_alfred_compact(wf, node, choices, arg):
+    items = json.loads(wf._render_json(arg))
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _api_document(node, choices):
+    document = {"node": node_payload(node)}
+    if choices is not None:
+        document["choices"] = list(choices)
+    return document
+
+
+@register_format("api")
+def _encode_api(wf, node, choices, arg):
+    return json.dumps(_api_document(node, choices), ensure_ascii=False).encode("utf-8")
+
+
+@register_format("jsonl")
+def _encode_jsonl(wf, node, choices, arg):
+    line = json.dumps(_api_document(node, choices), ensure_ascii=False, separators=(",", ":"))
+    return (line + "\n").encode("utf-8")
+
+
+def _resolve(wf, arg):
+    if arg.startswith(PATH_TOKEN_PREFIX):
+        try:
+            choices = decode_path(arg)
+            return wf.walk_path(choices), choices
+        except ValueError:
+            return None, None
+    return wf.flowchart.node(arg), None
+
+
+def encode(wf, arg, fmt="alfred"):
+    """
+    ノード（または経路トークン）を指定形式のバイト列にエンコードします（メモ化あり）。
+
+    Args:
+        wf (AnemiaWorkflow): ワークフロー
+        arg (str): ノードIDまたは経路トークン
+        fmt (str): 形式名（FORMATS のキー）
+
+    Returns:
+        bytes or None: エンコード結果。ノードが存在しない場合はNone。
+
+    Raises:
+        KeyError: 未登録の形式名の場合
+    """
+    memo = wf.flowchart.derived(MEMO_KEY, _new_memo)
+    # Workflows sharing a flowchart may differ in the Alfred cache directive they emit
+    key = (fmt, arg, wf._tail)
+    entry = memo.get(key)
+    if entry is not None:
+        if METRICS.enabled:
+            METRICS.hit(entry[1])
+        return entry[0]
+
+    encoder = FORMATS[fmt]
+    start = perf_counter() if METRICS.enabled else 0.0
+    node, choices = _resolve(wf, arg)
+    if node is None:
+        return None
+    data = encoder(wf, node, choices, arg)
+    if len(memo) < MAX_MEMO_ENTRIES:
+        memo[key] = (data, node.id)
+    if METRICS.enabled:
+        METRICS.observe("encode", perf_counter() - start)
+        METRICS.hit(node.id)
+    return data
+
+
+def _new_memo(flowchart):
+    return {}
+
+
+def memo_size(wf):
+    """ワークフローのフローチャートに対するメモのエントリ数を返します。"""
+    return len(wf.flowchart.derived(MEMO_KEY, _new_memo))
@@ -0,0 +1,241 @@
+"""
+フローチャートのSQL CASE式へのコンパイル。
+
+questionノードの "when" 述語を入れ子の CASE 式に変換し、データベース内で
+`AnemiaWorkflow.route_labs` と同じトリアージ（停止したノードIDの算出）を行えるようにします。
+検査データをPythonへ書き出さずに、テーブルやビューの1列として評価できます。
+
+変換規則:
+    - questionノード: 述語を満たす最初の選択肢の遷移先へ進む
+      `CASE WHEN <述語> THEN <遷移先> ... ELSE '<ノードID>' END`
+    - resultノード: ノードIDの文字列リテラル
+    - 述語: キーごとの条件をANDで結合（"lt"/"le"/"gt"/"ge"/"eq" は比較演算子、"in" は IN、
+      値そのものは等価比較、真偽値は TRUE / FALSE との比較）
+    - 述語の無い選択肢は自動では選ばれないため出力しません
+
+SQLの3値論理では欠損値（NULL）との比較は NULL になり WHEN が成立しないため、
+Pythonの match_condition（値が無ければ判定不能）と同じく、データが尽きたノードで停止します。
+列の型は検査値の辞書と同じ（数値・文字列・真偽値（0/1））であることを前提とします。
+
+複数の親から参照されるノード（例: S5）の部分式は参照元ごとに展開されます。
+
+実行:
+    python3 sql_compiler.py                                  # CASE式を出力
+    python3 sql_compiler.py --view triage --table labs       # CREATE VIEW 文を出力
+    python3 sql_compiler.py --table labs --column mcv=mcv_fl # 列名の対応を指定
+"""
+import argparse
+import math
+import sys
+from collections.abc import Mapping
+
+from anemia_flow import AnemiaWorkflow
+
+# SQL counterparts of anemia_flow.CONDITION_OPERATORS ("in" is rendered as IN (...))
+SQL_OPERATORS = {"lt": "<", "le": "<=", "gt": ">", "ge": ">=", "eq": "="}
+
+DEFAULT_OUTPUT_COLUMN = "terminal_node"
+
+
+def quote_identifier(name):
+    """
+    識別子（列名・テーブル名）を二重引用符で囲みます。
+
+    Args:
+        name (str): 識別子
+
+    Returns:
+        str: 引用符付きの識別子 (例: 'mcv' -> '"mcv"')
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def sql_literal(value):
+    """
+    Pythonの値をSQLのリテラルに変換します。
+
+    Args:
+        value: 文字列・数値・真偽値・None
+
+    Returns:
+        str: SQLリテラル
+
+    Raises:
+        ValueError: 変換できない値（NaN・無限大・未対応の型）の場合
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f"Cannot express {value!r} as an SQL literal")
+        return repr(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    raise ValueError(f"Cannot express {value!r} as an SQL literal")
+
+
+def condition_sql(column, condition):
+    """
+    1つの検査値の条件をSQLの条件式に変換します。
+
+    Args:
+        column (str): 引用符付きの列名
+        condition: 値そのもの（等価比較）または {"ge": 101} のような比較の辞書
+
+    Returns:
+        str: 条件式 (例: '"mcv" > 80 AND "mcv" < 101')
+
+    Raises:
+        ValueError: 未対応の比較演算子の場合
+    """
+    if not isinstance(condition, Mapping):
+        return f"{column} = {sql_literal(condition)}"
+    parts = []
+    for op, operand in condition.items():
+        if op == "in":
+            # An empty IN () is not valid in every dialect; nothing can match it anyway
+            values = ", ".join(sql_literal(v) for v in operand)
+            parts.append(f"{column} IN ({values})" if values else "FALSE")
+        elif op in SQL_OPERATORS:
+            parts.append(f"{column} {SQL_OPERATORS[op]} {sql_literal(operand)}")
+        else:
+            raise ValueError(f"Unsupported comparison operator: {op}")
+    return " AND ".join(parts)
+
+
+def predicate_sql(when, columns=None):
+    """
+    選択肢の "when" 述語をSQLの条件式に変換します。
+
+    Args:
+        when (Mapping): 検査項目名 → 条件
+        columns (Mapping, optional): 検査項目名 → 列名（省略時は検査項目名そのもの）
+
+    Returns:
+        str: 条件式（複数の検査項目はANDで結合）
+    """
+    columns = columns or {}
+    return " AND ".join(condition_sql(quote_identifier(columns.get(key, key)), condition)
+                        for key, condition in when.items())
+
+
+def lab_keys(flowchart=None):
+    """
+    フローチャートの述語が参照する検査項目名を出現順に返します。
+
+    Args:
+        flowchart (dict or CompiledFlowchart, optional): フローチャート（省略時はFLOWCHART）
+
+    Returns:
+        list: 検査項目名のリスト
+    """
+    keys = {}
+    for node in AnemiaWorkflow(flowchart).flowchart.nodes:
+        for option in node.options or ():
+            keys.update(dict.fromkeys(option.when or ()))
+    return list(keys)
+
+
+def compile_case(flowchart=None, columns=None, start="root", indent="  "):
+    """
+    フローチャートを、停止したノードIDを返す1つのSQL CASE式にコンパイルします。
+
+    Args:
+        flowchart (dict or CompiledFlowchart, optional): フローチャート（省略時はFLOWCHART）
+        columns (Mapping, optional): 検査項目名 → 列名（省略時は検査項目名そのもの）
+        start (str): 開始ノードID
+        indent (str): 入れ子1段ごとのインデント
+
+    Returns:
+        str: SQLの式（resultノードから開始した場合はノードIDのリテラル）
+
+    Raises:
+        KeyError: 開始ノードが存在しない場合
+        ValueError: 選択肢の遷移が循環している、または述語をSQLに変換できない場合
+    """
+    compiled = AnemiaWorkflow(flowchart).flowchart
+    node = compiled.node(start)
+    if node is None:
+        raise KeyError(f"Node not found: {start}")
+    nodes = compiled.nodes
+    on_path = set()
+
+    def compile_node(node, depth):
+        # Without any predicate the walk always stops at this node
+        if node.type != "question" or not any(option.when for option in node.options):
+            return sql_literal(node.id)
+        if node.index in on_path:
+            raise ValueError(f"Node '{node.id}' leads back to itself (cycle)")
+        on_path.add(node.index)
+        pad = "\n" + indent * (depth + 1)
+        lines = ["CASE"]
+        for option in node.options:
+            if not option.when:
+                continue
+            # A matching option whose target is missing stops the walk here, as in route_labs
+            target = sql_literal(node.id) if option.target < 0 else compile_node(nodes[option.target], depth + 1)
+            lines.append(f"WHEN {predicate_sql(option.when, columns)} THEN {target}")
+        lines.append(f"ELSE {sql_literal(node.id)}")
+        on_path.discard(node.index)
+        return pad.join(lines) + "\n" + indent * depth + "END"
+
+    return compile_node(node, 0)
+
+
+def compile_view(view, table, flowchart=None, columns=None, select=None,
+                 output_column=DEFAULT_OUTPUT_COLUMN, start="root"):
+    """
+    検査データのテーブルに停止ノードIDの列を加えるビューの定義を生成します。
+
+    Args:
+        view (str): ビュー名
+        table (str): 検査データのテーブル名
+        flowchart (dict or CompiledFlowchart, optional): フローチャート（省略時はFLOWCHART）
+        columns (Mapping, optional): 検査項目名 → 列名
+        select (iterable, optional): ビューに含める元テーブルの列（省略時はすべての列）
+        output_column (str): 停止ノードIDの列名
+        start (str): 開始ノードID
+
+    Returns:
+        str: CREATE VIEW 文
+    """
+    case = compile_case(flowchart, columns, start, indent="  ").replace("\n", "\n  ")
+    selected = "*" if select is None else ", ".join(quote_identifier(name) for name in select)
+    return (f"CREATE VIEW {quote_identifier(view)} AS\nSELECT {selected},\n"
+            f"  {case} AS {quote_identifier(output_column)}\nFROM {quote_identifier(table)};\n")
+
+
+def main(argv=None, stdout=None):
+    stdout = sys.stdout if stdout is None else stdout
+    parser = argparse.ArgumentParser(description="フローチャートをSQLのCASE式・ビュー定義にコンパイルします")
+    parser.add_argument("--source", help="フローチャート定義ファイル（省略時は FLOWCHART）")
+    parser.add_argument("--table", help="検査データのテーブル名（指定するとCREATE VIEW文を出力）")
+    parser.add_argument("--view", default="anemia_triage", help="ビュー名")
+    parser.add_argument("--column", action="append", default=[], metavar="KEY=COLUMN",
+                        help="検査項目名と列名の対応（複数指定可）")
+    parser.add_argument("--output-column", default=DEFAULT_OUTPUT_COLUMN, help="停止ノードIDの列名")
+    parser.add_argument("--start", default="root", help="開始ノードID")
+    args = parser.parse_args(argv)
+
+    flowchart = None
+    if args.source:
+        from flowchart_loader import load_flowchart
+        flowchart = load_flowchart(args.source)
+    columns = {}
+    for mapping in args.column:
+        key, sep, column = mapping.partition("=")
+        if not sep:
+            parser.error(f"--column expects KEY=COLUMN: {mapping}")
+        columns[key] = column
+    if args.table:
+        stdout.write(compile_view(args.view, args.table, flowchart, columns,
+                                  output_column=args.output_column, start=args.start))
+    else:
+        stdout.write(compile_case(flowchart, columns, args.start) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+スケーリング試験用の合成フローチャート生成。
+
+実際の FLOWCHART（約50ノード）より大きなガイドラインを想定し、
+ノード数・分岐数・深さ・エイリアス連鎖の長さを指定して FLOWCHART と同じ形式のdictを生成します。
+生成したフローチャートは validation の検査を通り、`AnemiaWorkflow` ・ `BatchTriage` でそのまま扱えます。
+
+構造:
+    - questionノード "Q<n>" は分岐数ぶんの選択肢を持ち、選択肢 j の "when" は {"level<深さ>": j}
+      （同じ深さの質問は同じ検査項目を参照するため、一括トリアージの列数は深さ程度で済みます）
+    - 幅優先で展開し、ノード数の上限または深さの上限に達した位置はresultノード "R<n>" になります
+    - "root" と、一部の選択肢の遷移先（alias_rate の割合）はエイリアス連鎖を経由します
+
+実行:
+    python3 synthetic_flowchart.py --nodes 100000 --branching 4 > synthetic.json
+"""
+import argparse
+import json
+import random
+import sys
+from collections import deque
+
+LEVEL_PREFIX = "level"
+
+
+def generate_flowchart(nodes=1000, branching=3, depth=None, alias_chain=0, alias_rate=0.1, seed=0):
+    """
+    合成フローチャートを生成します。
+
+    Args:
+        nodes (int): questionノードとresultノードの合計数の上限（エイリアスは含まない）
+        branching (int): questionノードあたりの選択肢数（2〜36）
+        depth (int, optional): rootから最も深いresultノードまでの質問数の上限（省略時は制限なし）
+        alias_chain (int): エイリアス連鎖の段数（0なら "root" 以外はエイリアスなし。
+            MAX_ALIAS_DEPTH を超えると解決できない）
+        alias_rate (float): 遷移先をエイリアス連鎖経由にする選択肢の割合（alias_chain > 0 の場合）
+        seed (int): 乱数シード
+
+    Returns:
+        dict: FLOWCHARTと同じ形式のフローチャート
+
+    Raises:
+        ValueError: 引数が範囲外の場合
+    """
+    if nodes < 1:
+        raise ValueError("nodes must be at least 1")
+    if not 2 <= branching <= 36:
+        raise ValueError("branching must be between 2 and 36")
+    if depth is not None and depth < 0:
+        raise ValueError("depth must not be negative")
+    rng = random.Random(seed)
+    flowchart = {}
+    counter = [0]
+
+    def new_id(prefix):
+        counter[0] += 1
+        return f"{prefix}{counter[0]}"
+
+    def alias_to(target, name, length):
+        # name_1 -> name_2 -> ... -> name_<length> -> target
+        previous = target
+        for hop in range(length, 0, -1):
+            flowchart[f"{name}_{hop}"] = previous
+            previous = f"{name}_{hop}"
+        return previous
+
+    created = 1
+    unexpanded = 0
+    is_question = nodes > branching and (depth is None or depth > 0)
+    first = new_id("Q" if is_question else "R")
+    queue = deque([(first, 0, is_question)])
+    unexpanded += is_question
+    while queue:
+        node_id, level, is_question = queue.popleft()
+        if not is_question:
+            flowchart[node_id] = {
+                "text": f"結果 {node_id}（深さ {level}）",
+                "type": "result",
+                "diagnosis": [f"合成診断 {node_id}", f"鑑別 {node_id[1:]} (synthetic)"],
+            }
+            continue
+        unexpanded -= 1
+        created += branching
+        options = []
+        for choice in range(branching):
+            # A child may branch further only if every still-unexpanded question fits in the budget
+            child_question = (depth is None or level + 1 < depth) and \
+                created + branching * (unexpanded + 1) <= nodes
+            child = new_id("Q" if child_question else "R")
+            unexpanded += child_question
+            queue.append((child, level + 1, child_question))
+            target = child
+            if alias_chain and rng.random() < alias_rate:
+                target = alias_to(child, f"to_{child}", alias_chain)
+            options.append({"label": f"選択肢 {choice}", "next": target,
+                            "when": {f"{LEVEL_PREFIX}{level}": choice}})
+        node = {"text": f"質問 {node_id}（深さ {level}）", "type": "question", "options": options}
+        if rng.random() < 0.1:
+            node["note"] = f"備考 {node_id}"
+        flowchart[node_id] = node
+
+    # "root" is itself the first alias of its chain
+    flowchart["root"] = alias_to(first, "start", max(alias_chain - 1, 0))
+    return flowchart
+
+
+def level_keys(flowchart):
+    """
+    生成したフローチャートが参照する検査項目名を深さ順に返します。
+
+    Returns:
+        list: ["level0", "level1", ...]
+    """
+    levels = set()
+    for node in flowchart.values():
+        if isinstance(node, dict):
+            for option in node.get("options", ()):
+                levels.update(option.get("when", ()))
+    return sorted(levels, key=lambda key: int(key[len(LEVEL_PREFIX):]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成フローチャートをJSONで出力します")
+    parser.add_argument("--nodes", type=int, default=1000, help="ノード数の上限")
+    parser.add_argument("--branching", type=int, default=3, help="選択肢数")
+    parser.add_argument("--depth", type=int, help="深さの上限")
+    parser.add_argument("--alias-chain", type=int, default=0, help="エイリアス連鎖の段数")
+    parser.add_argument("--alias-rate", type=float, default=0.1, help="エイリアス経由にする選択肢の割合")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    args = parser.parse_args(argv)
+    flowchart = generate_flowchart(args.nodes, args.branching, args.depth, args.alias_chain,
+                                   args.alias_rate, args.seed)
+    json.dump(flowchart, sys.stdout, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Add parent directory to path to import alfred_cache
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+import alfred_cache
+import output_store
+import serializers
+from anemia_flow import AnemiaWorkflow, FLOWCHART, NOT_FOUND_JSON
+
+CACHE = {"seconds": 600, "loosereload": True}
+
+
+class TestCacheFromEnv(unittest.TestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(alfred_cache.cache_from_env({}))
+        self.assertIsNone(alfred_cache.cache_from_env({"ANEMIA_CACHE_SECONDS": "0"}))
+        self.assertIsNone(alfred_cache.cache_from_env({"ANEMIA_CACHE_SECONDS": "abc"}))
+
+    def test_seconds_and_loosereload(self):
+        env = {"ANEMIA_CACHE_SECONDS": "600", "ANEMIA_CACHE_LOOSERELOAD": "true"}
+        self.assertEqual(alfred_cache.cache_from_env(env), CACHE)
+        env = {"ANEMIA_CACHE_SECONDS": "600", "ANEMIA_CACHE_LOOSERELOAD": "0"}
+        self.assertFalse(alfred_cache.cache_from_env(env)["loosereload"])
+
+    def test_seconds_are_clamped_to_alfred_limits(self):
+        """Alfredが受け付ける範囲（5秒〜24時間）に丸める"""
+        self.assertEqual(alfred_cache.cache_from_env({"ANEMIA_CACHE_SECONDS": "1"})["seconds"], 5)
+        self.assertEqual(alfred_cache.cache_from_env({"ANEMIA_CACHE_SECONDS": "999999"})["seconds"], 86400)
+
+
+class TestCacheDirective(unittest.TestCase):
+    def setUp(self):
+        self.wf = AnemiaWorkflow(cache=None)
+        self.cached = AnemiaWorkflow(cache=CACHE)
+
+    def test_cache_object_is_emitted(self):
+        for node_id in ["root", "S5", "S6", "~", "~112", "~11210"]:
+            with self.subTest(node_id=node_id):
+                output = json.loads(self.cached.generate_json_output(node_id))
+                self.assertEqual(output["cache"], CACHE)
+                self.assertIs(output["skipknowledge"], True)
+                self.assertNotIn("cache", json.loads(self.wf.generate_json_output(node_id)))
+
+    def test_layout_matches_json_dumps(self):
+        """出力はjson.dumps(indent=2)と同じレイアウトを保つ"""
+        for node_id in ["S5", "~112"]:
+            output = self.cached.generate_json_output(node_id)
+            self.assertEqual(output, json.dumps(json.loads(output), ensure_ascii=False, indent=2))
+
+    def test_errors_and_search_results_are_not_cached(self):
+        """エラーと検索結果は次の入力で再表示されないようキャッシュ指定を付けない"""
+        self.assertEqual(self.cached.generate_json_output("INVALID_ID"), NOT_FOUND_JSON)
+        self.assertEqual(self.cached.generate_json_output("~z"), NOT_FOUND_JSON)
+        output = json.loads(self.cached.generate_search_output("鉄欠乏"))
+        self.assertNotIn("cache", output)
+        self.assertIs(output["skipknowledge"], True)
+        self.assertTrue(all(item["uid"].startswith("anemia:") for item in output["items"]))
+
+    def test_add_cache_matches_live_rendering(self):
+        """キャッシュ指定なしの出力に後から付加した結果がライブレンダリングと一致する"""
+        for node_id in list(FLOWCHART) + ["~", "~1", "~112"]:
+            with self.subTest(node_id=node_id):
+                plain = (self.wf.generate_json_output(node_id) + "\n").encode("utf-8")
+                expected = (self.cached.generate_json_output(node_id) + "\n").encode("utf-8")
+                self.assertEqual(alfred_cache.add_cache(plain, CACHE), expected)
+                self.assertEqual(alfred_cache.add_cache(plain, None), plain)
+
+    def test_strip_cache_reverses_add_cache(self):
+        for node_id in ["root", "S6", "~112"]:
+            with self.subTest(node_id=node_id):
+                plain = (self.wf.generate_json_output(node_id) + "\n").encode("utf-8")
+                self.assertEqual(alfred_cache.strip_cache(alfred_cache.add_cache(plain, CACHE)), plain)
+                self.assertEqual(alfred_cache.strip_cache(plain), plain)
+        search = self.cached.generate_search_output("鉄欠乏").encode("utf-8")
+        self.assertEqual(alfred_cache.strip_cache(search), search)
+
+    def test_serializer_memo_is_per_cache_setting(self):
+        """同じフローチャートを共有するワークフローでもキャッシュ指定ごとにエンコードする"""
+        plain = serializers.encode(self.wf, "S5")
+        cached = serializers.encode(self.cached, "S5")
+        self.assertNotIn("cache", json.loads(plain))
+        self.assertEqual(json.loads(cached)["cache"], CACHE)
+
+
+class TestStableUids(unittest.TestCase):
+    def setUp(self):
+        self.wf = AnemiaWorkflow(cache=None)
+
+    def _uids(self, node_id):
+        return [item.get("uid") for item in json.loads(self.wf.generate_json_output(node_id))["items"]]
+
+    def test_uids_per_node_and_option(self):
+        uids = self._uids("S5")
+        options = len(FLOWCHART["S5"]["options"])
+        self.assertEqual(uids, ["anemia:S5"] + [f"anemia:S5:{i}" for i in range(options)])
+        self.assertEqual(self._uids("S6"), ["anemia:S6", "anemia:S6:diagnosis", "anemia:restart"])
+
+    def test_uids_do_not_depend_on_how_the_node_was_reached(self):
+        """ノードID・エイリアス・経路トークンのどれで到達しても同じuidになる"""
+        self.assertEqual(self._uids("root"), self._uids(FLOWCHART["root"]))
+        self.assertEqual(self._uids("~1121")[:-1], self._uids("S5"))
+        self.assertEqual(self._uids("~1121")[-1], "anemia:back")
+
+    def test_uids_are_unique_within_each_output(self):
+        for node_id in FLOWCHART:
+            with self.subTest(node_id=node_id):
+                uids = self._uids(node_id)
+                self.assertTrue(all(uids))
+                self.assertEqual(len(uids), len(set(uids)))
+
+
+class TestRunDiagnosis(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "prerendered.bin")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_store_excludes_cache_directive(self):
+        """ストアにはキャッシュ指定を含めない（ビルド時のワークフローの設定に関わらず）"""
+        output_store.build_store(self.path, AnemiaWorkflow(cache=CACHE))
+        data = output_store.lookup("S5", self.path, self.path)
+        self.assertNotIn("cache", json.loads(data))
+
+    def test_cli_emits_cache_directive(self):
+        env = dict(os.environ, ANEMIA_CACHE_SECONDS="600", ANEMIA_CACHE_LOOSERELOAD="1")
+        script = os.path.join(ROOT_DIR, "run_diagnosis.py")
+        for arg in ["S5", "~112"]:
+            with self.subTest(arg=arg):
+                proc = subprocess.run([sys.executable, script, arg], env=env, capture_output=True, check=True)
+                expected = AnemiaWorkflow(cache=CACHE).generate_json_output(arg) + "\n"
+                self.assertEqual(proc.stdout.decode("utf-8"), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,10 @@ import os
 # Add parent directory to path to import anemia_flow
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from anemia_flow import AnemiaWorkflow, FLOWCHART
+from anemia_flow import (
+    AnemiaWorkflow, FLOWCHART, CONDITION_OPERATORS, MAX_ALIAS_DEPTH, compile_flowchart, match_condition,
+    decode_path, encode_path
+)
 
 class TestAnemiaWorkflow(unittest.TestCase):
     def setUp(self):
@@ -155,6 +158,202 @@ class TestPathTraversal(unittest.TestCase):
         self.assertEqual(node["type"], "result")
 
 
+class TestWalkPath(unittest.TestCase):
+    """walk_path のテスト"""
+
+    def setUp(self):
+        self.wf = AnemiaWorkflow()
+
+    def test_walk_to_result(self):
+        node = self.wf.walk_path([1, 1, 2, 1, 0])
+        self.assertEqual(node.id, "S6")
+
+    def test_walk_from_other_start(self):
+        self.assertEqual(self.wf.walk_path([0], start="S5").id, "S6")
+
+    def test_invalid_paths_raise(self):
+        for choices, start in [([5], "root"), ([0, 0], "root"), ([], "INVALID_ID")]:
+            with self.subTest(choices=choices, start=start):
+                with self.assertRaises(ValueError):
+                    self.wf.walk_path(choices, start)
+
+
+class TestCompiledFlowchart(unittest.TestCase):
+    """コンパイル済みフローチャートのテスト"""
+
+    def setUp(self):
+        self.compiled = compile_flowchart(FLOWCHART)
+
+    def test_dict_view_matches_source(self):
+        """Mappingビューが元のFLOWCHARTと同じ内容を返す"""
+        self.assertEqual(list(self.compiled), list(FLOWCHART))
+        self.assertEqual(self.compiled["root"], "A")
+        for node_id, node_data in FLOWCHART.items():
+            if isinstance(node_data, str):
+                continue
+            with self.subTest(node_id=node_id):
+                node = self.compiled[node_id]
+                self.assertEqual(set(node), set(node_data))
+                self.assertEqual(node["text"], node_data["text"])
+                if node_data["type"] == "question":
+                    self.assertEqual([o["next"] for o in node["options"]],
+                                     [o["next"] for o in node_data["options"]])
+
+    def test_option_targets_are_integer_ids(self):
+        for node in self.compiled.nodes:
+            for option in node.options or ():
+                with self.subTest(node_id=node.id, option=option.label):
+                    self.assertEqual(self.compiled.nodes[option.target].id, option.next)
+
+    def test_compiled_flowchart_is_immutable(self):
+        node = self.compiled.node("A")
+        with self.assertRaises(TypeError):
+            self.compiled["loop_a"] = "loop_b"
+        with self.assertRaises(AttributeError):
+            node.text = "changed"
+        with self.assertRaises(AttributeError):
+            node.options[0].next = "X"
+        with self.assertRaises(TypeError):
+            self.compiled.node("H").options[0].when["mcv"] = 0
+
+    def test_alias_chain_limit(self):
+        """MAX_ALIAS_DEPTH段を超えるエイリアスは解決しない"""
+        flowchart = {"n0": {"text": "t", "type": "result", "diagnosis": ["d"]}}
+        for i in range(1, MAX_ALIAS_DEPTH + 2):
+            flowchart[f"a{i}"] = f"a{i - 1}" if i > 1 else "n0"
+        compiled = compile_flowchart(flowchart)
+        self.assertIsNotNone(compiled.node(f"a{MAX_ALIAS_DEPTH}"))
+        self.assertIsNone(compiled.node(f"a{MAX_ALIAS_DEPTH + 1}"))
+
+
+class TestLabRouting(unittest.TestCase):
+    """検査値による自動ルーティングのテスト"""
+
+    def setUp(self):
+        self.wf = AnemiaWorkflow()
+
+    def test_iron_deficiency_in_one_call(self):
+        """root→D→H→K→S5→S6: 検査値から一度に鉄欠乏性貧血へ到達"""
+        labs = {"cytopenia": False, "reticulocytosis": False, "mcv": 72,
+                "fe": "low", "tibc": "high", "ferritin": "low"}
+        node_id, path = self.wf.route_labs(labs)
+        self.assertEqual(node_id, "S6")
+        self.assertEqual(path, ["A", "D", "H", "K", "S5", "S6"])
+
+    def test_stops_at_first_unanswerable_question(self):
+        """MCVが無ければHで停止する"""
+        node_id, path = self.wf.route_labs({"cytopenia": False, "reticulocytosis": False})
+        self.assertEqual(node_id, "H")
+        self.assertEqual(path, ["A", "D", "H"])
+
+    def test_partial_iron_panel_stops_at_s5(self):
+        labs = {"cytopenia": False, "reticulocytosis": False, "mcv": 75, "fe": "low"}
+        node_id, _ = self.wf.route_labs(labs)
+        self.assertEqual(node_id, "S5")
+
+    def test_question_without_predicates_stops(self):
+        """述語の無いquestionノード（N10）で停止する"""
+        labs = {"cytopenia": False, "reticulocytosis": False, "mcv": 90, "pancytopenia": False}
+        node_id, _ = self.wf.route_labs(labs)
+        self.assertEqual(node_id, "N10")
+
+    def test_mcv_thresholds(self):
+        cases = {80: "K", 80.5: "J", 100.9: "J", 101: "I", 120: "I"}
+        for mcv, expected in cases.items():
+            with self.subTest(mcv=mcv):
+                node_id, _ = self.wf.route_labs({"mcv": mcv, "reticulocytosis": None}, start="H")
+                self.assertEqual(node_id, expected)
+
+    def test_empty_labs_stays_at_start(self):
+        node_id, path = self.wf.route_labs({})
+        self.assertEqual(node_id, "A")
+        self.assertEqual(path, ["A"])
+
+    def test_unknown_start_returns_none(self):
+        self.assertEqual(self.wf.route_labs({}, start="INVALID_ID"), (None, []))
+
+    def test_match_condition(self):
+        self.assertTrue(match_condition({"gt": 80, "lt": 101}, 90))
+        self.assertFalse(match_condition({"in": ["normal", "low"]}, "high"))
+        self.assertTrue(match_condition(True, True))
+        self.assertIsNone(match_condition({"ge": 101}, None))
+
+    def test_all_predicates_use_known_operators(self):
+        """全述語が定義済みの演算子のみを使う"""
+        for node_id, node_data in FLOWCHART.items():
+            if isinstance(node_data, str) or node_data["type"] != "question":
+                continue
+            for option in node_data["options"]:
+                for key, condition in option.get("when", {}).items():
+                    if isinstance(condition, dict):
+                        with self.subTest(node_id=node_id, key=key):
+                            self.assertTrue(set(condition) <= set(CONDITION_OPERATORS))
+
+
+class TestPathTokens(unittest.TestCase):
+    """経路トークン（回答履歴付きのarg）のテスト"""
+
+    def setUp(self):
+        self.wf = AnemiaWorkflow()
+
+    def _items(self, token):
+        return json.loads(self.wf.generate_json_output(token))["items"]
+
+    def test_encode_decode_roundtrip(self):
+        self.assertEqual(encode_path([]), "~")
+        self.assertEqual(encode_path([1, 1, 2, 10, 35]), "~112az")
+        self.assertEqual(decode_path("~112az"), (1, 1, 2, 10, 35))
+        with self.assertRaises(ValueError):
+            encode_path([36])
+        with self.assertRaises(ValueError):
+            decode_path("~1!")
+        with self.assertRaises(ValueError):
+            decode_path("A")
+
+    def test_empty_token_renders_root(self):
+        """"~" はrootを表示し、戻る項目は出さない"""
+        items = self._items("~")
+        self.assertEqual([i.get("arg") for i in items[1:]], ["~0", "~1"])
+        self.assertNotIn("1つ前に戻る", [i["title"] for i in items])
+
+    def test_options_extend_token(self):
+        items = self._items("~112")
+        args = [i["arg"] for i in items if i.get("title") in ("増加", "低下〜正常")]
+        self.assertEqual(args, ["~1120", "~1121"])
+
+    def test_back_item_and_breadcrumb(self):
+        back = self._items("~112")[-1]
+        self.assertEqual(back["title"], "1つ前に戻る")
+        self.assertEqual(back["arg"], "~11")
+        self.assertEqual(back["subtitle"], "なし › なし › MCV ≦ 80 (小球性)")
+
+    def test_result_token_restarts_with_token(self):
+        """resultノードでは診断結果・最初に戻る・1つ前に戻るを表示する"""
+        items = self._items("~11210")
+        self.assertIn("鉄欠乏性貧血 (IDA)", items[1]["subtitle"])
+        args = [i.get("arg") for i in items if i.get("valid")]
+        self.assertEqual(args, ["~", "~1121"])
+
+    def test_token_body_matches_node_rendering(self):
+        """経路トークンでもノード本体の表示はノードID指定時と同じ"""
+        for path in self.wf.paths():
+            token = encode_path(path.choices)
+            with self.subTest(token=token):
+                by_token = self._items(token)
+                by_id = json.loads(self.wf.generate_json_output(path.nodes[-1]))["items"]
+                self.assertEqual(by_token[:-2], by_id[:-1])
+
+    def test_invalid_tokens(self):
+        for token in ["~9", "~00", "~1!", "~112100000"]:
+            with self.subTest(token=token):
+                self.assertEqual(self._items(token)[0]["title"], "Error")
+
+    def test_plain_node_ids_are_unchanged(self):
+        """ノードID指定時は従来どおり遷移先ノードIDをargにする"""
+        items = json.loads(self.wf.generate_json_output("S5"))["items"]
+        self.assertTrue(all(not i.get("arg", "").startswith("~") for i in items))
+
+
 class TestEdgeCases(unittest.TestCase):
     """エッジケースのテスト"""
 
@@ -167,14 +366,13 @@ class TestEdgeCases(unittest.TestCase):
 
     def test_get_node_handles_circular_alias(self):
         """循環エイリアスで無限ループしないことを検証"""
-        original = self.wf.flowchart.copy()
-        self.wf.flowchart["loop_a"] = "loop_b"
-        self.wf.flowchart["loop_b"] = "loop_a"
-        try:
-            node = self.wf.get_node("loop_a")
-            self.assertIsNone(node)
-        finally:
-            self.wf.flowchart = original
+        flowchart = dict(FLOWCHART)
+        flowchart["loop_a"] = "loop_b"
+        flowchart["loop_b"] = "loop_a"
+        wf = AnemiaWorkflow(flowchart)
+        node = wf.get_node("loop_a")
+        self.assertIsNone(node)
+        self.assertIsNotNone(wf.get_node("root"))
 
     def test_note_field_in_output(self):
         """noteフィールドが備考として出力される"""
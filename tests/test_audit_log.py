@@ -0,0 +1,133 @@
+import unittest
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import zlib
+
+# Add parent directory to path to import audit_log
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+import audit_log
+import diagnosis_client
+import diagnosis_daemon
+from anemia_flow import AnemiaWorkflow, FLOWCHART
+
+
+class TestAuditLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir="/tmp")
+        self.path = os.path.join(self.tmpdir, "audit.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_record_round_trip(self):
+        log = audit_log.AuditLog(self.path)
+        log.append("~112", b"output", timestamp_ns=123)
+        log.append("鉄欠乏", b"search")
+        records = list(audit_log.read_records(self.path))
+        self.assertEqual(records[0], audit_log.AuditRecord(123, audit_log.SOURCE_CLI, 2, zlib.crc32(b"output"), "~112"))
+        self.assertEqual(records[1].arg, "鉄欠乏")
+        self.assertEqual(records[1].choice, -1)
+        self.assertEqual(audit_log.path_choice("~"), -1)
+        self.assertEqual(audit_log.path_choice("~1z"), 35)
+
+    def test_damaged_log_is_readable(self):
+        """途切れた末尾や壊れた箇所を読み飛ばす"""
+        data = b"".join(audit_log.pack_record(arg, b"x") for arg in ["~1", "~11", "~112"])
+        first = len(audit_log.pack_record("~1", b"x"))
+        damaged = data[:3] + b"garbage" + data[first:-2]
+        self.assertEqual([r.arg for r in audit_log.parse_records(damaged)], ["~11"])
+        self.assertEqual([r.arg for r in audit_log.parse_records(data[:-1])], ["~1", "~11"])
+
+    def test_rotation(self):
+        record_size = len(audit_log.pack_record("~1", b""))
+        log = audit_log.AuditLog(self.path, max_bytes=record_size * 3, backups=2)
+        for i in range(20):
+            log.append(f"~{i % 10}", b"", timestamp_ns=i)
+        files = audit_log.log_files(self.path)
+        self.assertEqual(files[:2], [self.path + ".2", self.path + ".1"])
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        timestamps = [r.timestamp_ns for r in audit_log.read_records(self.path)]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(timestamps[-1], 19)
+        self.assertLessEqual(len(timestamps), 9)
+
+    def test_buffered_log(self):
+        log = audit_log.BufferedAuditLog(self.path, flush_interval=60)
+        threads = [threading.Thread(target=lambda: [log.append("~0", b"x") for _ in range(500)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(os.path.exists(self.path))  # nothing written before the flush
+        log.close()
+        records = list(audit_log.read_records(self.path))
+        self.assertEqual(len(records), 2000)
+        self.assertTrue(all(r.source == audit_log.SOURCE_DAEMON for r in records))
+
+    def test_cli_logging_and_replay(self):
+        env = dict(os.environ, ANEMIA_AUDIT_LOG=self.path)
+        script = os.path.join(ROOT_DIR, "run_diagnosis.py")
+        for arg in ["~", "~1", "~11", "~112", "~1121", "~11210", "PNH"]:
+            proc = subprocess.run([sys.executable, script, arg], env=env, capture_output=True, check=True)
+            self.assertEqual(proc.stderr, b"")
+        results = list(audit_log.replay(audit_log.read_records(self.path)))
+        self.assertEqual([r["node_id"] for r in results], ["A", "D", "H", "K", "S5", "S6", None])
+        self.assertTrue(all(r["reproduced"] for r in results))
+        self.assertEqual(results[3]["option"], FLOWCHART["H"]["options"][2]["label"])
+        self.assertEqual(results[4]["choice"], 1)
+
+        # A changed flowchart no longer reproduces what was shown
+        changed = dict(FLOWCHART)
+        changed["H"] = dict(FLOWCHART["H"], text="変更後の質問")
+        results = list(audit_log.replay(audit_log.read_records(self.path), AnemiaWorkflow(changed)))
+        self.assertEqual([r["arg"] for r in results if not r["reproduced"]], ["~11"])
+
+        stdout = io.StringIO()
+        with open(os.devnull, "w") as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                self.assertEqual(audit_log.main(["replay", self.path, "--mismatches-only"], stdout=stdout), 0)
+            finally:
+                sys.stderr = stderr
+        self.assertEqual(stdout.getvalue(), "")
+
+    def test_replay_ignores_cache_directive(self):
+        """キャッシュ指定付きで記録した出力も、指定の有無に関わらず再現できたと判定する"""
+        env = dict(os.environ, ANEMIA_AUDIT_LOG=self.path, ANEMIA_CACHE_SECONDS="600")
+        script = os.path.join(ROOT_DIR, "run_diagnosis.py")
+        for arg in ["~", "~112", "S5"]:
+            proc = subprocess.run([sys.executable, script, arg], env=env, capture_output=True, check=True)
+            self.assertIn(b'"cache"', proc.stdout)
+        records = list(audit_log.read_records(self.path))
+        for wf in [AnemiaWorkflow(cache=None), AnemiaWorkflow(cache={"seconds": 60, "loosereload": False})]:
+            results = list(audit_log.replay(records, wf))
+            self.assertTrue(all(r["reproduced"] for r in results))
+
+    def test_daemon_logging(self):
+        socket_path = os.path.join(self.tmpdir, "anemia.sock")
+        log = audit_log.BufferedAuditLog(self.path)
+        ready = threading.Event()
+        thread = threading.Thread(target=diagnosis_daemon.serve, args=(socket_path, 0.5),
+                                  kwargs={"ready": ready, "audit": log}, daemon=True)
+        thread.start()
+        self.assertTrue(ready.wait(5))
+        for arg in ["", "~1", "S5", "鉄欠乏", "~zz"]:
+            self.assertIsNotNone(diagnosis_client.request(arg, socket_path))
+        thread.join(5)
+        log.close()
+        results = list(audit_log.replay(audit_log.read_records(self.path)))
+        self.assertEqual([r["arg"] for r in results], ["~", "~1", "S5", "鉄欠乏", "~zz"])
+        self.assertEqual([r["source"] for r in results], ["daemon"] * 5)
+        self.assertTrue(all(r["reproduced"] for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
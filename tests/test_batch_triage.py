@@ -0,0 +1,103 @@
+import unittest
+import io
+import os
+import random
+import sys
+
+# Add parent directory to path to import batch_triage
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anemia_flow import AnemiaWorkflow
+from batch_triage import BatchTriage, load_csv, np
+
+LAB_VALUES = {
+    "cytopenia": [True, False],
+    "reticulocytosis": [True, False],
+    "hemolysis": [True, False],
+    "mcv": [70, 80, 80.5, 95, 101, 115],
+    "vitb12_or_folate_low": [True, False],
+    "deficiency": ["vitb12", "folate"],
+    "coombs_positive": [True, False],
+    "pnh_findings": [True, False],
+    "pancytopenia": [True, False],
+    "fe": ["low", "normal", "high"],
+    "tibc": ["low", "normal", "high"],
+    "ferritin": ["low", "normal", "high"],
+    "inflammation": [True, False],
+    "tibc_markedly_low": [True, False],
+}
+
+
+def random_panels(count, seed=0, missing_rate=0.15):
+    rng = random.Random(seed)
+    return [
+        {key: (None if rng.random() < missing_rate else rng.choice(values))
+         for key, values in LAB_VALUES.items()}
+        for _ in range(count)
+    ]
+
+
+@unittest.skipUnless(np is not None, "NumPy is not installed")
+class TestBatchTriage(unittest.TestCase):
+    def setUp(self):
+        self.engine = BatchTriage()
+        self.wf = AnemiaWorkflow()
+
+    def test_matches_scalar_walker(self):
+        """ベクトル化評価が route_labs と同じ停止ノードを返す"""
+        panels = random_panels(2000)
+        columns = {key: [p[key] for p in panels] for key in LAB_VALUES}
+        node_ids, diagnosis_index = self.engine.evaluate(columns)
+        for i, panel in enumerate(panels):
+            labs = {k: v for k, v in panel.items() if v is not None}
+            expected, _ = self.wf.route_labs(labs)
+            self.assertEqual(node_ids[i], expected, panel)
+            node = self.wf.get_node(expected)
+            if node["type"] == "result":
+                self.assertEqual(self.engine.diagnoses[diagnosis_index[i]], list(node["diagnosis"]))
+            else:
+                self.assertEqual(diagnosis_index[i], -1)
+
+    def test_missing_values_stop_at_question(self):
+        columns = {
+            "cytopenia": np.array([False, False, True]),
+            "reticulocytosis": np.array([0.0, 0.0, np.nan]),
+            "mcv": np.array([np.nan, 72.0, 72.0]),
+        }
+        node_ids, diagnosis_index = self.engine.evaluate(columns)
+        self.assertEqual(node_ids.tolist(), ["H", "S5", "C"])
+        self.assertEqual(diagnosis_index[:2].tolist(), [-1, -1])
+        self.assertGreaterEqual(diagnosis_index[2], 0)
+
+    def test_evaluate_paths(self):
+        """経路コードから各行が辿ったノード列を復元できる"""
+        panels = random_panels(500, seed=3)
+        columns = {key: [p[key] for p in panels] for key in LAB_VALUES}
+        codes, path_codes, paths = self.engine.evaluate_paths(columns)
+        self.assertEqual(codes.tolist(), self.engine.evaluate_codes(columns).tolist())
+        self.assertLessEqual(len(paths), len(set(path_codes.tolist())) * len(self.engine.node_ids))
+        for i, panel in enumerate(panels):
+            labs = {k: v for k, v in panel.items() if v is not None}
+            _, expected = self.wf.route_labs(labs)
+            self.assertEqual([self.engine.node_ids[code] for code in paths[path_codes[i]]], expected)
+
+    def test_missing_column_stops(self):
+        node_ids, _ = self.engine.evaluate({"cytopenia": [False, False]})
+        self.assertEqual(node_ids.tolist(), ["D", "D"])
+
+    def test_csv_input(self):
+        text = (
+            "cytopenia,reticulocytosis,mcv,fe,tibc,ferritin\n"
+            "false,false,72,low,high,low\n"
+            "no,no,,low,high,low\n"
+            "true,,,,,\n"
+        )
+        columns = load_csv(io.StringIO(text))
+        self.assertEqual(columns["mcv"].dtype.kind, "f")
+        self.assertEqual(columns["fe"].dtype.kind, "U")
+        node_ids, _ = self.engine.evaluate(columns)
+        self.assertEqual(node_ids.tolist(), ["S6", "H", "C"])
+
+
+if __name__ == '__main__':
+    unittest.main()
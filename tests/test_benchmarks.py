@@ -0,0 +1,59 @@
+import unittest
+import json
+import os
+import sys
+
+# Add benchmarks directory to path to import run_benchmarks
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+import run_benchmarks
+from anemia_flow import AnemiaWorkflow
+
+
+def _results(**values):
+    higher = {"render_per_sec": True, "cold_start_ms": False}
+    return {"metrics": {name: {"value": v, "unit": "", "higher_is_better": higher[name]}
+                        for name, v in values.items()}}
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_missing_baseline_fails_without_measuring(self):
+        """ベースラインが無い場合は計測せずに失敗し、劣化検出が素通りしない"""
+        missing = os.path.join(ROOT_DIR, "benchmarks", "no-such-baseline.json")
+        with open(os.devnull, "w") as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                self.assertEqual(run_benchmarks.main(["--baseline", missing]), 2)
+            finally:
+                sys.stderr = stderr
+
+    def test_committed_baseline_covers_all_metrics(self):
+        with open(run_benchmarks.DEFAULT_BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+        self.assertIn("cold_start_ms", baseline["metrics"])
+        self.assertIn("render_per_sec", baseline["metrics"])
+
+    def test_compare_detects_regressions(self):
+        """閾値を超えた劣化のみを検出する"""
+        baseline = _results(render_per_sec=1000, cold_start_ms=40)
+        ok = _results(render_per_sec=900, cold_start_ms=45)
+        bad = _results(render_per_sec=500, cold_start_ms=80)
+        self.assertEqual(run_benchmarks.compare(ok, baseline, 0.25), [])
+        names = [r[0] for r in run_benchmarks.compare(bad, baseline, 0.25)]
+        self.assertEqual(sorted(names), ["cold_start_ms", "render_per_sec"])
+
+    def test_improvements_are_not_regressions(self):
+        baseline = _results(render_per_sec=1000, cold_start_ms=40)
+        faster = _results(render_per_sec=5000, cold_start_ms=10)
+        self.assertEqual(run_benchmarks.compare(faster, baseline, 0.1), [])
+
+    def test_random_sessions_end_at_results(self):
+        wf = AnemiaWorkflow()
+        for choices in run_benchmarks.random_sessions(wf, 50):
+            self.assertEqual(wf.walk_path(choices).type, "result")
+
+
+if __name__ == '__main__':
+    unittest.main()
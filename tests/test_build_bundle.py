@@ -0,0 +1,84 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+# Add parent directory to path to import build_bundle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import build_bundle
+from anemia_flow import AnemiaWorkflow
+
+
+class TestBuildBundle(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.output = os.path.join(cls.tmpdir.name, "workflow")
+        cls.bundle = build_bundle.build_workflow(cls.output)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def _run(self, node_id, env=None):
+        return subprocess.run([sys.executable, "-I", "-S", build_bundle.BUNDLE_NAME, node_id],
+                              cwd=self.output, env=env, capture_output=True, check=True).stdout
+
+    def test_bundle_contains_precompiled_modules(self):
+        with zipfile.ZipFile(self.bundle) as zf:
+            names = set(zf.namelist())
+        for module in build_bundle.RUNTIME_MODULES:
+            self.assertIn(module + ".pyc", names)
+        self.assertIn("__main__.py", names)
+
+    def test_bundle_output_matches_live_rendering(self):
+        """isolatedモードで起動したバンドルの出力がライブレンダリングと一致する"""
+        wf = AnemiaWorkflow()
+        for node_id in ["root", "S5"]:
+            with self.subTest(node_id=node_id):
+                expected = (wf.generate_json_output(node_id) + "\n").encode("utf-8")
+                self.assertEqual(self._run(node_id), expected)
+        # Anything that is not a node ID is treated as a search query
+        for query in ["INVALID_ID", "鉄欠乏"]:
+            with self.subTest(query=query):
+                expected = (wf.generate_search_output(query) + "\n").encode("utf-8")
+                self.assertEqual(self._run(query), expected)
+
+    def test_bundle_adds_cache_directive_to_stored_output(self):
+        """事前レンダリング済みの出力にも実行時の設定でキャッシュ指定が付く"""
+        env = dict(os.environ, ANEMIA_CACHE_SECONDS="60", ANEMIA_CACHE_LOOSERELOAD="1")
+        wf = AnemiaWorkflow(cache={"seconds": 60, "loosereload": True})
+        for node_id in ["root", "~112"]:
+            with self.subTest(node_id=node_id):
+                expected = (wf.generate_json_output(node_id) + "\n").encode("utf-8")
+                self.assertEqual(self._run(node_id, env), expected)
+
+    def test_import_report_separates_store_hits_and_misses(self):
+        """現行エントリーポイントもバンドルと同じストアを使って比較する"""
+        report = build_bundle.import_report(self.output, "S5", repeat=1)
+        self.assertEqual(set(report), {"store hit", "store miss"})
+        for entry in ["source", "bundle"]:
+            hit, miss = report["store hit"][entry], report["store miss"][entry]
+            self.assertLess(hit["modules"], miss["modules"])
+
+    def test_anemia_flow_defers_json_import(self):
+        """anemia_flow のimportや「見つからない」応答ではjsonを読み込まない"""
+        code = ("import sys, anemia_flow; wf = anemia_flow.AnemiaWorkflow(); "
+                "wf.generate_json_output('INVALID_ID'); wf.generate_json_output('~z'); "
+                "print('json' in sys.modules)")
+        proc = subprocess.run([sys.executable, "-S", "-c", code], cwd=build_bundle.ROOT_DIR,
+                              capture_output=True, text=True, check=True)
+        self.assertEqual(proc.stdout.strip(), "False")
+
+    def test_plist_points_to_bundle(self):
+        with open(os.path.join(self.output, "info.plist"), encoding="utf-8") as f:
+            plist = f.read()
+        self.assertIn(build_bundle.BUNDLE_SCRIPT, plist)
+        self.assertNotIn("run_diagnosis.py", plist)
+
+
+if __name__ == '__main__':
+    unittest.main()
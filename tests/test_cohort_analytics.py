@@ -0,0 +1,109 @@
+import unittest
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+from collections import Counter
+
+# Add parent directory to path to import cohort_analytics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anemia_flow import AnemiaWorkflow, decode_path
+from batch_triage import np
+from test_batch_triage import LAB_VALUES, random_panels
+
+if np is not None:
+    import cohort_analytics
+
+
+@unittest.skipUnless(np is not None, "NumPy is not installed")
+class TestCohortAnalytics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.wf = AnemiaWorkflow()
+        cls.panels = random_panels(3000, seed=1)
+        columns = {key: [p[key] for p in cls.panels] for key in LAB_VALUES}
+        cls.report = cohort_analytics.analyze(columns)
+        cls.routes = []
+        for panel in cls.panels:
+            labs = {k: v for k, v in panel.items() if v is not None}
+            cls.routes.append(cls.wf.route_labs(labs))
+
+    def test_terminal_counts_match_scalar_walker(self):
+        expected = Counter(node_id for node_id, _ in self.routes)
+        actual = {row["node_id"]: row["count"] for row in self.report.terminals()}
+        self.assertEqual(actual, dict(expected))
+        self.assertEqual(self.report.rows, len(self.panels))
+
+    def test_diagnosis_counts(self):
+        expected = Counter()
+        for node_id, _ in self.routes:
+            expected.update(self.wf.get_node(node_id).get("diagnosis") or ())
+        actual = {row["diagnosis"]: row["count"] for row in self.report.diagnoses()}
+        self.assertEqual(actual, dict(expected))
+
+    def test_path_counts_and_tokens(self):
+        expected = Counter(tuple(path) for _, path in self.routes)
+        table = self.report.path_table()
+        self.assertEqual({tuple(row["path"].split(" › ")): row["count"] for row in table}, dict(expected))
+        for row in table:
+            node = self.wf.walk_path(decode_path(row["token"]))
+            self.assertEqual(node.id, row["node_id"])
+        self.assertEqual(len(self.report.path_table(limit=3)), 3)
+
+        depths = Counter(len(path) - 1 for _, path in self.routes)
+        for row in self.report.depths():
+            self.assertEqual(row["count"], depths.get(row["depth"], 0))
+
+    def test_mcv_branches(self):
+        expected = Counter(path[path.index("H") + 1] for _, path in self.routes if "H" in path[:-1])
+        table = self.report.branches()
+        self.assertEqual([row["node_id"] for row in table], ["I", "J", "K"])
+        self.assertEqual({row["node_id"]: row["count"] for row in table}, dict(expected))
+        with self.assertRaises(KeyError):
+            self.report.branches(("S6",))
+
+    def test_stalls_attribute_missing_values(self):
+        stalls = {row["node_id"]: row for row in self.report.stalls()}
+        stopped = Counter(node_id for node_id, _ in self.routes
+                          if self.wf.get_node(node_id)["type"] == "question")
+        self.assertEqual({node_id: row["count"] for node_id, row in stalls.items()}, dict(stopped))
+        # Every row stopping at A lacks "cytopenia"; that is the only way to stop there
+        self.assertEqual(stalls["A"]["missing"], stalls["A"]["count"])
+        self.assertEqual(stalls["A"]["missing_by_key"], {"cytopenia": stalls["A"]["count"]})
+        missing_fe = sum(1 for panel, (node_id, _) in zip(self.panels, self.routes)
+                         if node_id == "S5" and panel["fe"] is None)
+        self.assertEqual(stalls["S5"]["missing_by_key"]["fe"], missing_fe)
+
+    def test_missing_column(self):
+        report = cohort_analytics.analyze({"cytopenia": [False, False], "reticulocytosis": [False, None]})
+        stalls = {row["node_id"]: row for row in report.stalls()}
+        self.assertEqual(stalls["H"]["missing_by_key"], {"mcv": 1})
+        self.assertEqual(stalls["D"]["missing"], 1)
+
+    def test_cli_outputs(self):
+        source = io.StringIO("cytopenia,reticulocytosis,hemolysis\ntrue,,\nfalse,true,false\nfalse,,\n")
+        stdout = io.StringIO()
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(source.getvalue())
+        try:
+            cohort_analytics.main([f.name], stdout=stdout)
+            summary = json.loads(stdout.getvalue())
+            self.assertEqual(summary["rows"], 3)
+            self.assertEqual({row["node_id"]: row["count"] for row in summary["terminals"]},
+                             {"C": 1, "G": 1, "D": 1})
+            with tempfile.TemporaryDirectory() as directory:
+                cohort_analytics.main([f.name, "--csv-dir", directory], stdout=stdout)
+                with open(os.path.join(directory, "stalls.csv"), encoding="utf-8") as csv_file:
+                    rows = list(csv.DictReader(csv_file))
+                self.assertEqual(rows[0]["node_id"], "D")
+                self.assertEqual(json.loads(rows[0]["missing_by_key"]), {"reticulocytosis": 1})
+                self.assertEqual(len(os.listdir(directory)), len(cohort_analytics.TABLE_COLUMNS))
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path to import diagnosis_daemon
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diagnosis_client
+import diagnosis_daemon
+from anemia_flow import AnemiaWorkflow, NOT_FOUND_JSON
+from run_diagnosis import render_output
+
+
+class TestDiagnosisDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir="/tmp")
+        self.socket_path = os.path.join(self.tmpdir, "anemia.sock")
+
+    def tearDown(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.rmdir(self.tmpdir)
+
+    def _start(self, idle_timeout=5.0):
+        ready = threading.Event()
+        thread = threading.Thread(
+            target=diagnosis_daemon.serve,
+            args=(self.socket_path, idle_timeout),
+            kwargs={"ready": ready},
+            daemon=True,
+        )
+        thread.start()
+        self.assertTrue(ready.wait(5))
+        return thread
+
+    def test_client_relays_daemon_response(self):
+        """デーモン経由の応答がプロセス内レンダリングと一致する"""
+        thread = self._start(idle_timeout=0.5)
+        wf = AnemiaWorkflow()
+        for node_id in ["root", "S5", "L8", "~112", "root"]:
+            with self.subTest(node_id=node_id):
+                data = diagnosis_client.request(node_id, self.socket_path)
+                expected = (wf.generate_json_output(node_id) + "\n").encode("utf-8")
+                self.assertEqual(data, expected)
+        # Like run_diagnosis.py, anything that is not a node ID is a search query
+        data = diagnosis_client.request("INVALID_ID", self.socket_path)
+        self.assertEqual(data, (wf.generate_search_output("INVALID_ID") + "\n").encode("utf-8"))
+        thread.join(5)
+
+    def test_routing_matches_cli(self):
+        """空のリクエストは "~"、不正な経路トークンは検索ではなく「見つからない」扱い（CLIと同じ）"""
+        thread = self._start(idle_timeout=0.5)
+        wf = AnemiaWorkflow()
+        for arg in ["", "~9"]:
+            with self.subTest(arg=arg):
+                data = diagnosis_client.request(arg, self.socket_path)
+                self.assertEqual(data, (render_output(wf, arg or "~") + "\n").encode("utf-8"))
+        self.assertEqual(diagnosis_client.request("~9", self.socket_path),
+                         (NOT_FOUND_JSON + "\n").encode("utf-8"))
+        thread.join(5)
+
+    def test_second_daemon_leaves_live_socket(self):
+        """既に応答するデーモンがいる場合、2つ目はソケットを消さずにすぐ終了する"""
+        thread = self._start(idle_timeout=1.0)
+        self.assertEqual(diagnosis_daemon.serve(self.socket_path, 5.0), 0)
+        self.assertTrue(os.path.exists(self.socket_path))
+        self.assertIsNotNone(diagnosis_client.request("S5", self.socket_path))
+        thread.join(5)
+
+    def test_stale_socket_is_replaced(self):
+        """応答しない残骸のソケットは削除して待ち受ける"""
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)
+        stale.close()
+        thread = self._start(idle_timeout=0.5)
+        self.assertIsNotNone(diagnosis_client.request("S5", self.socket_path))
+        thread.join(5)
+
+    def test_client_returns_none_without_daemon(self):
+        """デーモン未起動時はNoneを返しフォールバックさせる"""
+        self.assertIsNone(diagnosis_client.request("root", self.socket_path))
+
+    def test_daemon_stops_after_idle_timeout(self):
+        start = time.monotonic()
+        thread = self._start(idle_timeout=0.2)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
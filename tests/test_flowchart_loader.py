@@ -0,0 +1,116 @@
+import unittest
+import json
+import marshal
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+# Add parent directory to path to import flowchart_loader
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+import flowchart_loader
+from anemia_flow import AnemiaWorkflow, FLOWCHART
+from validation import FlowchartValidationError, validate_flowchart
+
+MERMAID_PATH = os.path.join(ROOT_DIR, "貧血の鑑別診断フローチャート.md")
+
+
+class TestJsonLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "anemia.json")
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(FLOWCHART, f, ensure_ascii=False)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_json_matches_builtin_flowchart(self):
+        """JSONから読み込んだワークフローが組み込み版と同じ出力を返す"""
+        wf = AnemiaWorkflow.from_file(self.path)
+        builtin = AnemiaWorkflow()
+        for node_id in FLOWCHART:
+            with self.subTest(node_id=node_id):
+                self.assertEqual(wf.generate_json_output(node_id), builtin.generate_json_output(node_id))
+
+    def test_cache_skips_parsing(self):
+        """2回目以降はキャッシュから読み込み、解析しない"""
+        flowchart_loader.load_flowchart(self.path)
+        self.assertTrue(os.path.exists(flowchart_loader.cache_path(self.path)))
+        with mock.patch.object(flowchart_loader, "parse_file", side_effect=AssertionError):
+            self.assertEqual(flowchart_loader.load_flowchart(self.path)["root"], "A")
+
+    def test_touched_but_unchanged_source_uses_hash(self):
+        """mtimeが変わっても内容が同じならキャッシュを使う"""
+        flowchart_loader.load_flowchart(self.path)
+        future = time.time() + 10
+        os.utime(self.path, (future, future))
+        with mock.patch.object(flowchart_loader, "parse_file", side_effect=AssertionError):
+            flowchart_loader.load_flowchart(self.path)
+
+    def test_malformed_cache_is_rebuilt(self):
+        """タプル以外や形の違うキャッシュは例外にせず、読み直して書き換える"""
+        cache = flowchart_loader.cache_path(self.path)
+        for payload in [42, "x", [flowchart_loader.CACHE_VERSION] * 5, {}, (flowchart_loader.CACHE_VERSION,)]:
+            with self.subTest(payload=payload):
+                flowchart_loader.load_flowchart(self.path)
+                with open(cache, "wb") as f:
+                    f.write(marshal.dumps(payload))
+                self.assertEqual(flowchart_loader.load_flowchart(self.path), FLOWCHART)
+                with open(cache, "rb") as f:
+                    self.assertIsInstance(marshal.loads(f.read()), tuple)
+
+    def test_changed_source_is_reparsed(self):
+        flowchart_loader.load_flowchart(self.path)
+        changed = dict(FLOWCHART, root="D")
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(changed, f, ensure_ascii=False)
+        future = time.time() + 10
+        os.utime(self.path, (future, future))
+        self.assertEqual(flowchart_loader.load_flowchart(self.path)["root"], "D")
+
+    def test_invalid_definition_raises(self):
+        broken = dict(FLOWCHART)
+        broken["A"] = {"text": "x", "type": "question", "options": [{"label": "l", "next": "MISSING"}]}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(broken, f, ensure_ascii=False)
+        with self.assertRaises(FlowchartValidationError) as ctx:
+            flowchart_loader.load_flowchart(self.path, use_cache=False)
+        self.assertIn("dangling_target", [issue.code for issue in ctx.exception.issues])
+
+
+class TestMermaidLoading(unittest.TestCase):
+    def setUp(self):
+        with open(MERMAID_PATH, encoding="utf-8") as f:
+            self.flowchart = flowchart_loader.parse_mermaid(f.read())
+        self.wf = AnemiaWorkflow(self.flowchart)
+
+    def test_mermaid_flowchart_is_valid(self):
+        self.assertEqual(validate_flowchart(self.flowchart), [])
+        self.assertEqual(self.wf.resolve_id("root"), "B")
+
+    def test_iron_deficiency_path(self):
+        """B→D→H→K(S1)→S5→S6: Mermaid版でも鉄欠乏性貧血に到達する"""
+        node = self.wf.walk_path([1, 1, 2, 1, 0])
+        self.assertEqual(node.id, "S6")
+        self.assertIn("鉄欠乏性貧血", node.diagnosis)
+
+    def test_leaf_children_become_diagnosis(self):
+        node = self.wf.get_node("C")
+        self.assertEqual(node.type, "result")
+        self.assertIn("骨髄異形成症候群", node.diagnosis)
+        self.assertNotIn("C1", self.flowchart)
+
+    def test_single_leaf_child_becomes_note(self):
+        self.assertIn("抗内因子抗体", self.wf.get_node("L8").note)
+
+    def test_unsupported_line_raises(self):
+        with self.assertRaises(ValueError):
+            flowchart_loader.parse_mermaid("flowchart TD\n  A --- B\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import json
+import os
+import random
+import sys
+
+# Add benchmarks directory to path to import fuzz_walks
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+import fuzz_walks
+from anemia_flow import AnemiaWorkflow
+
+
+class TestFuzzWalks(unittest.TestCase):
+    def setUp(self):
+        self.wf = AnemiaWorkflow(fuzz_walks.fuzz_flowchart())
+
+    def test_api_walks_have_no_violations(self):
+        result = fuzz_walks.run_fuzz("api", walks=300, workers=2, executor="thread",
+                                     chunk_size=100, invalid_rate=0.2)
+        self.assertEqual(result["violations"], [])
+        self.assertEqual(result["walks"], 300)
+        self.assertGreater(result["invalid"], 0)
+        self.assertGreater(result["steps"], result["walks"])
+        self.assertLessEqual(result["latency_us"]["p50"], result["latency_us"]["p99"])
+
+    def test_cli_walks_have_no_violations(self):
+        stats = fuzz_walks.run_walks("cli", seed=1, walks=2, invalid_rate=0.3, max_steps=4)
+        self.assertEqual(stats["violations"], [])
+
+    def test_invalid_inputs_render_error(self):
+        for arg in fuzz_walks.INVALID_INPUTS:
+            with self.subTest(arg=arg):
+                output = self.wf.generate_json_output(arg)
+                self.assertEqual(fuzz_walks.check_output(self.wf, arg, output)[0], [])
+        rng = random.Random(0)
+        for _ in range(200):
+            arg = fuzz_walks.random_invalid_input(rng)
+            self.assertEqual(fuzz_walks.check_output(self.wf, arg, self.wf.generate_json_output(arg))[0], [])
+
+    def test_detects_broken_output(self):
+        """不変条件の違反を検出する"""
+        self.assertTrue(fuzz_walks.check_output(self.wf, "S6", "{not json")[0])
+        data = json.loads(self.wf.generate_json_output("S6"))
+        data["items"] = [item for item in data["items"] if item["title"] != fuzz_walks.RESTART_TITLE]
+        violations, _ = fuzz_walks.check_output(self.wf, "S6", json.dumps(data))
+        self.assertIn("result S6 has no restart item", violations)
+        data = json.loads(self.wf.generate_json_output("~1"))
+        data["items"] = data["items"][:-1]
+        violations, _ = fuzz_walks.check_output(self.wf, "~1", json.dumps(data))
+        self.assertIn("token ~1 has no back item", violations)
+        violations, _ = fuzz_walks.check_output(self.wf, "loop_a", self.wf.generate_json_output("A"))
+        self.assertTrue(violations)
+
+    def test_latency_histogram(self):
+        histogram = fuzz_walks.LatencyHistogram()
+        for micros in range(1, 101):
+            histogram.add(micros / 1e6)
+        self.assertAlmostEqual(histogram.percentile(0.5), 50e-6, delta=5e-6)
+        self.assertAlmostEqual(histogram.percentile(0.99), 99e-6, delta=10e-6)
+        other = fuzz_walks.LatencyHistogram()
+        other.add(1.0)
+        histogram.merge(other)
+        self.assertEqual(histogram.count, 101)
+        self.assertGreaterEqual(histogram.percentile(1.0), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
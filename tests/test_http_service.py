@@ -0,0 +1,169 @@
+import unittest
+import asyncio
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+
+# Add parent and benchmarks directories to path to import http_service / http_loadgen
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+import http_loadgen
+from anemia_flow import AnemiaWorkflow
+from http_service import DiagnosisService
+
+
+class TestHttpService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.service = DiagnosisService(concurrency=2)
+        cls.loop = asyncio.new_event_loop()
+        cls.server = cls.loop.run_until_complete(cls.service.start("127.0.0.1", 0))
+        cls.port = cls.server.sockets[0].getsockname()[1]
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.server.close()
+        cls.loop.run_until_complete(cls.service.wait_closed())
+        cls.loop.run_until_complete(cls.server.wait_closed())
+        cls.loop.close()
+
+    def setUp(self):
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        self.wf = AnemiaWorkflow()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload)
+        self.conn.request(method, path, body=body)
+        response = self.conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_render_node(self):
+        status, data = self._request("GET", "/nodes/S5")
+        self.assertEqual(status, 200)
+        self.assertEqual(data, json.loads(self.wf.generate_json_output("S5")))
+
+    def test_render_path_token(self):
+        status, data = self._request("GET", "/nodes/~112")
+        self.assertEqual(status, 200)
+        self.assertEqual(data["items"][-1]["arg"], "~11")
+
+    def test_render_formats(self):
+        status, data = self._request("GET", "/nodes/S6?format=api")
+        self.assertEqual(status, 200)
+        self.assertEqual(data["node"]["id"], "S6")
+        self.assertEqual(self._request("GET", "/nodes/S6?format=xml")[0], 400)
+
+    def test_render_unknown_node(self):
+        self.assertEqual(self._request("GET", "/nodes/UNKNOWN")[0], 404)
+        self.assertEqual(self._request("GET", "/nodes/~9")[0], 404)
+
+    def test_walk(self):
+        status, data = self._request("POST", "/walk", {"choices": [1, 1, 2, 1, 0]})
+        self.assertEqual(status, 200)
+        self.assertEqual(data["node"]["id"], "S6")
+        self.assertIn("鉄欠乏性貧血 (IDA)", data["node"]["diagnosis"])
+
+    def test_walk_invalid(self):
+        self.assertEqual(self._request("POST", "/walk", {"choices": [5]})[0], 400)
+        self.assertEqual(self._request("POST", "/walk", {"choices": "1"})[0], 400)
+        # bool is an int subclass in Python but not an option index
+        self.assertEqual(self._request("POST", "/walk", {"choices": [True, False]})[0], 400)
+        for start in [["A"], {"a": 1}, 1]:
+            with self.subTest(start=start):
+                status, data = self._request("POST", "/walk", {"choices": [0], "start": start})
+                self.assertEqual(status, 400)
+                self.assertIn("'start'", data["error"])
+
+    def test_batch_invalid_lab_values(self):
+        """比較できない検査値や、スカラーでない検査値は500ではなく400を返す"""
+        base = {"cytopenia": False, "reticulocytosis": False}
+        for labs in [dict(base, mcv="abc"), dict(base, mcv=[72]), dict(base, mcv={"value": 72})]:
+            with self.subTest(labs=labs):
+                status, data = self._request("POST", "/batch", {"records": [{}, labs]})
+                self.assertEqual(status, 400)
+                self.assertIn("records[1]", data["error"])
+
+    def test_batch(self):
+        records = [{"cytopenia": True}, {"cytopenia": False, "reticulocytosis": True, "hemolysis": True}, {}]
+        status, data = self._request("POST", "/batch", {"records": records})
+        self.assertEqual(status, 200)
+        self.assertEqual([r["node"] for r in data["results"]], ["C", "F", "A"])
+        self.assertIn("再生不良性貧血", data["results"][0]["diagnosis"])
+
+    def test_errors(self):
+        self.assertEqual(self._request("GET", "/walk")[0], 405)
+        self.assertEqual(self._request("GET", "/unknown")[0], 404)
+        self.conn.request("POST", "/walk", body="{not json")
+        response = self.conn.getresponse()
+        self.assertEqual(response.status, 400)
+        response.read()
+
+    def test_flowchart_selection(self):
+        """?flowchart= でレジストリの別フローチャートを使う"""
+        self.service.registry.register("toy", "1", {
+            "root": "Q",
+            "Q": {"text": "Q", "type": "question", "options": [{"label": "yes", "next": "R"}]},
+            "R": {"text": "R", "type": "result", "diagnosis": ["ITP"]},
+        })
+        status, data = self._request("POST", "/walk?flowchart=toy", {"choices": [0]})
+        self.assertEqual(status, 200)
+        self.assertEqual(data["node"]["diagnosis"], ["ITP"])
+        self.assertEqual(self._request("GET", "/nodes/S5?flowchart=anemia&version=2015")[0], 200)
+        self.assertEqual(self._request("GET", "/nodes/root?flowchart=missing")[0], 404)
+        status, data = self._request("GET", "/flowcharts")
+        self.assertEqual(data["flowcharts"]["toy"], ["1"])
+        self.assertIn("hits", data["cache"])
+
+    def test_keep_alive_reuses_connection(self):
+        self._request("GET", "/healthz")
+        sock = self.conn.sock
+        self._request("GET", "/nodes/root")
+        self.assertIs(self.conn.sock, sock)
+
+    def test_pipelined_responses_arrive_in_order(self):
+        """1回の送信で複数のリクエストを送っても受信順に応答する"""
+        paths = ["/nodes/S5", "/nodes/UNKNOWN", "/nodes/root", "/healthz"]
+        raw = "".join(f"GET {p} HTTP/1.1\r\nHost: x\r\n\r\n" for p in paths)
+        raw += "GET /nodes/C HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n"
+        with socket.create_connection(("127.0.0.1", self.port), timeout=5) as sock:
+            sock.sendall(raw.encode("ascii"))
+            received = b""
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                received += chunk
+        statuses = []
+        bodies = []
+        while received:
+            head, _, rest = received.partition(b"\r\n\r\n")
+            length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            statuses.append(int(head.split(b" ")[1]))
+            bodies.append(json.loads(rest[:length]))
+            received = rest[length:]
+        self.assertEqual(statuses, [200, 404, 200, 200, 200])
+        self.assertEqual(bodies[0], json.loads(self.wf.generate_json_output("S5")))
+        self.assertEqual(bodies[4], json.loads(self.wf.generate_json_output("C")))
+
+    def test_load_generator(self):
+        future = asyncio.run_coroutine_threadsafe(
+            http_loadgen.run_load("127.0.0.1", self.port, connections=4, pipeline=4, total=200), self.loop)
+        result = future.result(timeout=60)
+        self.assertEqual(result["errors"], 0)
+        self.assertEqual(result["requests"], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import copy
+import io
+import json
+import os
+import sys
+import tempfile
+
+# Add parent directory to path to import incremental_build
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import incremental_build
+import output_store
+from anemia_flow import AnemiaWorkflow, FLOWCHART, encode_path
+
+
+class TestIncrementalBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.build_dir = os.path.join(self.tmpdir.name, "build")
+        self.store = os.path.join(self.tmpdir.name, "prerendered.bin")
+        self.flowchart = copy.deepcopy(FLOWCHART)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _build(self, **kwargs):
+        return incremental_build.build(self.flowchart, self.build_dir, self.store, **kwargs)
+
+    def _assert_store_matches_full_build(self):
+        full = os.path.join(self.tmpdir.name, "full.bin")
+        output_store.build_store(full, AnemiaWorkflow(self.flowchart, cache=None))
+        with open(self.store, "rb") as f, open(full, "rb") as g:
+            self.assertEqual(f.read(), g.read())
+
+    def _tokens_ending_at(self, node_id):
+        wf = AnemiaWorkflow(self.flowchart)
+        return sorted({encode_path(path.choices[:path.nodes.index(node_id)])
+                       for path in wf.paths(node_id)})
+
+    def test_first_build_matches_full_store(self):
+        report = self._build()
+        self.assertTrue(report["store_written"])
+        self.assertEqual(set(report["changed_nodes"]), set(FLOWCHART))
+        self.assertEqual(report["reused"], 0)
+        self._assert_store_matches_full_build()
+
+    def test_unchanged_flowchart_rebuilds_nothing(self):
+        self._build()
+        report = self._build()
+        self.assertEqual(report["changed_nodes"], [])
+        self.assertEqual(report["rebuilt"], [])
+        self.assertFalse(report["store_written"])
+
+    def test_touched_source_keeps_store_usable(self):
+        """ソースの内容を変えずにmtimeだけ更新された場合も、ストアが古い扱いのまま残らない"""
+        self._build()
+        # Equivalent to touching anemia_flow.py after the previous build
+        os.utime(self.store, (1000, 1000))
+        self.assertIsNone(output_store.lookup("root", self.store))
+        report = self._build()
+        self.assertEqual(report["rebuilt"], [])
+        self.assertIsNotNone(output_store.lookup("root", self.store))
+
+    def test_text_edit_rebuilds_only_dependent_outputs(self):
+        """表示テキストの変更はそのノードと、そのノードで終わる経路トークンの出力だけを作り直す"""
+        self._build()
+        self.flowchart["S5"]["text"] = "変更後の質問"
+        report = self._build()
+        self.assertEqual(report["changed_nodes"], ["S5"])
+        self.assertEqual(sorted(report["rebuilt"]), sorted(["S5"] + self._tokens_ending_at("S5")))
+        self._assert_store_matches_full_build()
+
+    def test_label_edit_rebuilds_breadcrumbs(self):
+        """選択肢名の変更は、その選択肢を通る経路トークンに波及する"""
+        self._build()
+        self.flowchart["S5"]["options"][0]["label"] = "変更後の選択肢"
+        report = self._build()
+        rebuilt = report["rebuilt"]
+        self.assertIn("~1121", rebuilt)
+        self.assertIn("~11210", rebuilt)
+        self.assertNotIn("~11211", rebuilt)
+        self._assert_store_matches_full_build()
+
+    def test_structural_edit_removes_unreachable_tokens(self):
+        self._build()
+        self.flowchart["S5"]["options"][1]["next"] = "S6"
+        report = self._build()
+        self.assertEqual(sorted(report["removed"]), ["~1120110", "~1120111", "~112110", "~112111"])
+        self.assertIn("~11211", report["rebuilt"])
+        self._assert_store_matches_full_build()
+
+    def test_source_change_and_corrupt_artifacts_force_full_rebuild(self):
+        """描画の実装のソースが変わるとビルドキーが変わり、前回の成果物を使わない"""
+        self._build()
+        original = incremental_build.build_key
+        incremental_build.build_key = lambda sources=incremental_build.BUILD_SOURCES: "changed"
+        try:
+            report = self._build()
+        finally:
+            incremental_build.build_key = original
+        self.assertEqual(report["reused"], 0)
+        self.assertTrue(report["store_written"])
+        with open(os.path.join(self.build_dir, incremental_build.ARTIFACTS_NAME), "wb") as f:
+            f.write(b"broken")
+        self.assertEqual(self._build()["reused"], 0)
+
+    def test_build_key_covers_renderer_sources(self):
+        self.assertIn("anemia_flow.py", incremental_build.BUILD_SOURCES)
+        self.assertIn("output_store.py", incremental_build.BUILD_SOURCES)
+        self.assertNotEqual(incremental_build.build_key(), incremental_build.build_key(("anemia_flow.py",)))
+
+    def test_manifest_describes_dependencies(self):
+        self._build()
+        with open(os.path.join(self.build_dir, incremental_build.MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest["build_key"], incremental_build.build_key())
+        self.assertEqual(manifest["artifacts"]["root"]["inputs"], ["root", FLOWCHART["root"]])
+        self.assertIn("S5", manifest["artifacts"]["~1121"]["inputs"])
+
+    def test_main_json_report(self):
+        source = os.path.join(self.tmpdir.name, "flowchart.json")
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(FLOWCHART, f, ensure_ascii=False)
+        argv = ["--source", source, "--build-dir", self.build_dir, "--store", self.store, "--json"]
+        stdout = io.StringIO()
+        self.assertEqual(incremental_build.main(argv, stdout=stdout), 0)
+        self.assertTrue(json.loads(stdout.getvalue())["store_written"])
+        stdout = io.StringIO()
+        self.assertEqual(incremental_build.main(argv[:-1] + ["--verbose"], stdout=stdout), 0)
+        self.assertIn("store unchanged", stdout.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to path to import metrics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import output_store
+import run_diagnosis
+from anemia_flow import AnemiaWorkflow
+from metrics import METRICS, Metrics, PeriodicFlusher
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.wf = AnemiaWorkflow()
+        METRICS.reset()
+
+    def tearDown(self):
+        METRICS.enabled = False
+        METRICS.reset()
+
+    def test_disabled_records_nothing(self):
+        """無効時は何も記録しない"""
+        METRICS.enabled = False
+        self.wf.generate_json_output("root")
+        snap = METRICS.snapshot()
+        self.assertEqual(snap["timings"], {})
+        self.assertEqual(snap["node_hits"], {})
+
+    def test_enabled_records_timings_and_hits(self):
+        METRICS.enabled = True
+        self.wf.generate_json_output("root")
+        self.wf.generate_json_output("A")
+        self.wf.generate_json_output("S5")
+        snap = METRICS.snapshot()
+        self.assertEqual(snap["timings"]["generate_json_output"]["count"], 3)
+        self.assertEqual(snap["timings"]["get_node"]["count"], 3)
+        self.assertEqual(snap["node_hits"], {"A": 2, "S5": 1})
+
+    def test_output_unchanged_when_enabled(self):
+        expected = self.wf.generate_json_output("L8")
+        METRICS.enabled = True
+        self.assertEqual(self.wf.generate_json_output("L8"), expected)
+
+
+class TestInstrumentedMain(unittest.TestCase):
+    def setUp(self):
+        METRICS.reset()
+        self.lookups = []
+        self.lookup = output_store.lookup
+        self.stdout = sys.stdout
+
+    def tearDown(self):
+        output_store.lookup = self.lookup
+        sys.stdout = self.stdout
+        METRICS.enabled = False
+        METRICS.reset()
+
+    def _main(self, node_id, data):
+        def lookup(arg):
+            self.lookups.append(arg)
+            return data
+        output_store.lookup = lookup
+        sys.stdout = io.TextIOWrapper(io.BytesIO())
+        run_diagnosis._instrumented_main(node_id)
+        return sys.stdout.buffer.getvalue()
+
+    def test_store_hit_is_looked_up_and_counted_once(self):
+        self.assertEqual(self._main("S5", b"stored\n"), b"stored\n")
+        snap = METRICS.snapshot()
+        self.assertEqual(self.lookups, ["S5"])
+        self.assertEqual(snap["timings"]["store_lookup"]["count"], 1)
+        self.assertEqual(snap["node_hits"], {"S5": 1})
+
+    def test_store_miss_renders_once(self):
+        expected = (AnemiaWorkflow().generate_json_output("S5") + "\n").encode("utf-8")
+        self.assertEqual(self._main("S5", None), expected)
+        self.assertEqual(self.lookups, ["S5"])
+        self.assertIn("import_anemia_flow", METRICS.snapshot()["timings"])
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(enabled=True)
+        self.metrics.observe("get_node", 0.001)
+        self.metrics.observe("get_node", 0.003)
+        self.metrics.hit("S5")
+        self.metrics.set_gauge("startup_cpu_seconds", 0.02)
+
+    def test_prometheus_text(self):
+        text = self.metrics.to_prometheus()
+        self.assertIn('anemia_operation_seconds_count{operation="get_node"} 2', text)
+        self.assertIn('anemia_operation_seconds_max{operation="get_node"} 0.003', text)
+        self.assertIn('anemia_node_hits_total{node="S5"} 1', text)
+        self.assertIn("anemia_startup_cpu_seconds 0.02", text)
+
+    def test_json_snapshot(self):
+        data = json.loads(self.metrics.to_json())
+        self.assertAlmostEqual(data["timings"]["get_node"]["total_seconds"], 0.004)
+        self.assertEqual(data["node_hits"], {"S5": 1})
+
+    def test_periodic_flusher_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "metrics.prom")
+            flusher = PeriodicFlusher(self.metrics, path, interval=0.05).start()
+            time.sleep(0.2)
+            self.assertTrue(os.path.exists(path))
+            self.metrics.hit("S6")
+            flusher.stop()
+            with open(path, encoding="utf-8") as f:
+                self.assertIn('node="S6"', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
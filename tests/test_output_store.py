@@ -0,0 +1,103 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add parent directory to path to import output_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import output_store
+from anemia_flow import AnemiaWorkflow, FLOWCHART
+from synthetic_flowchart import generate_flowchart
+
+
+class TestOutputStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "anemia_flow.py")
+        with open(self.source, "w") as f:
+            f.write("# dummy source\n")
+        os.utime(self.source, (1000, 1000))
+        self.path = os.path.join(self.tmpdir.name, "prerendered.bin")
+        output_store.build_store(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_all_nodes_match_live_rendering(self):
+        """ストアの内容がライブレンダリング結果（末尾改行付き）と一致する"""
+        wf = AnemiaWorkflow()
+        for node_id in FLOWCHART:
+            with self.subTest(node_id=node_id):
+                data = output_store.lookup(node_id, self.path, self.source)
+                expected = (wf.generate_json_output(node_id) + "\n").encode("utf-8")
+                self.assertEqual(data, expected)
+
+    def test_path_tokens_are_prerendered(self):
+        """rootから到達できる経路トークンもストアに含まれる"""
+        wf = AnemiaWorkflow()
+        for token in ["~", "~1", "~112", "~11210"]:
+            with self.subTest(token=token):
+                data = output_store.lookup(token, self.path, self.source)
+                self.assertEqual(data, (wf.generate_json_output(token) + "\n").encode("utf-8"))
+
+    def test_store_from_custom_flowchart(self):
+        """渡されたワークフローのフローチャートのノードでストアを作る（FLOWCHARTのノードではない）"""
+        flowchart = generate_flowchart(nodes=64, seed=1)
+        wf = AnemiaWorkflow(flowchart)
+        path = os.path.join(self.tmpdir.name, "custom.bin")
+        output_store.build_store(path, wf)
+        for node_id in flowchart:
+            with self.subTest(node_id=node_id):
+                data = output_store.lookup(node_id, path, self.source)
+                self.assertEqual(data, (wf.generate_json_output(node_id) + "\n").encode("utf-8"))
+        for node_id in set(FLOWCHART) - set(flowchart):
+            self.assertIsNone(output_store.lookup(node_id, path, self.source))
+
+    def test_pack_sorts_keys_for_binary_search(self):
+        """キーの順序に関わらず、すべてのキー（前後のキーも）を引ける"""
+        keys = ["b", "a", "~10", "~", "c", "ab", "S5", "鉄"]
+        path = os.path.join(self.tmpdir.name, "packed.bin")
+        with open(path, "wb") as f:
+            f.write(output_store.pack((key, key.encode("utf-8") * 2) for key in keys))
+        for key in keys:
+            self.assertEqual(output_store.lookup(key, path, self.source), key.encode("utf-8") * 2)
+        for key in ["", "0", "aa", "d", "~2"]:
+            self.assertIsNone(output_store.lookup(key, path, self.source))
+
+    def test_unknown_node_returns_none(self):
+        self.assertIsNone(output_store.lookup("INVALID_ID", self.path, self.source))
+
+    def test_missing_store_returns_none(self):
+        missing = os.path.join(self.tmpdir.name, "missing.bin")
+        self.assertIsNone(output_store.lookup("root", missing, self.source))
+
+    def test_stale_store_returns_none(self):
+        """生成元モジュールより古いストアは使わない"""
+        os.utime(self.path, (500, 500))
+        self.assertIsNone(output_store.lookup("root", self.path, self.source))
+
+    def test_any_newer_render_source_makes_store_stale(self):
+        """anemia_flow.py 以外の描画モジュール（alfred_cache.py など）が新しい場合も使わない"""
+        helper = os.path.join(self.tmpdir.name, "alfred_cache.py")
+        with open(helper, "w") as f:
+            f.write("# dummy helper\n")
+        os.utime(helper, (1000, 1000))
+        sources = (self.source, helper)
+        self.assertIsNotNone(output_store.lookup("root", self.path, sources))
+        stamp = os.stat(self.path).st_mtime + 10
+        os.utime(helper, (stamp, stamp))
+        self.assertIsNone(output_store.lookup("root", self.path, sources))
+
+    def test_default_sources_cover_renderer_modules(self):
+        names = {os.path.basename(p) for p in output_store.SOURCE_PATHS}
+        self.assertTrue({"anemia_flow.py", "alfred_cache.py", "output_store.py"} <= names)
+
+    def test_corrupt_store_returns_none(self):
+        with open(self.path, "wb") as f:
+            f.write(b"garbage")
+        self.assertIsNone(output_store.lookup("root", self.path, self.source))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import io
+import json
+import os
+import random
+import sys
+
+# Add parent directory to path to import parallel_jobs
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parallel_jobs
+from replay_sessions import read_records, replay
+from batch_triage import np
+
+
+def random_sessions(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        choices = [rng.randrange(4) for _ in range(rng.randrange(1, 8))]
+        lines.append("root," + ",".join(map(str, choices)) + "\n")
+    return lines
+
+
+class TestParallelJobs(unittest.TestCase):
+    def test_replay_preserves_input_order(self):
+        """並列リプレイの結果が逐次実行と同じ順序・内容になる"""
+        lines = random_sessions(500)
+        out = io.StringIO()
+        chunks = parallel_jobs.run("replay", lines, out, workers=2, chunk_size=37)
+        self.assertEqual(chunks, 14)
+        expected = [json.dumps(r, ensure_ascii=False) + "\n" for r in replay(read_records(lines))]
+        self.assertEqual(out.getvalue(), "".join(expected))
+
+    def test_iter_chunks(self):
+        chunks = list(parallel_jobs.iter_chunks(["a", "b", "c", "d", "e"], 2))
+        self.assertEqual(chunks, [(1, ["a", "b"]), (3, ["c", "d"]), (5, ["e"])])
+
+    def test_unknown_job(self):
+        with self.assertRaises(ValueError):
+            parallel_jobs.run("unknown", [], io.StringIO(), workers=1)
+
+    @unittest.skipUnless(np is not None, "NumPy is not installed")
+    def test_triage_merges_chunks_in_order(self):
+        rows = ["cytopenia,reticulocytosis,mcv,fe,tibc,ferritin\n"]
+        expected = []
+        for i in range(300):
+            if i % 3 == 0:
+                rows.append("false,false,72,low,high,low\n")
+                expected.append("S6")
+            elif i % 3 == 1:
+                rows.append("true,,,,,\n")
+                expected.append("C")
+            else:
+                rows.append("false,false,,,,\n")
+                expected.append("H")
+        out = io.StringIO()
+        parallel_jobs.run("triage", rows, out, workers=2, chunk_size=40)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "node_id,diagnosis_index,diagnosis")
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], expected)
+
+    @unittest.skipUnless(np is not None, "NumPy is not installed")
+    def test_triage_keeps_quoted_newlines_in_one_record(self):
+        """引用符内に改行を含むフィールドがチャンク境界で分断されない"""
+        rows = ["note,cytopenia,reticulocytosis,mcv,fe,tibc,ferritin\n"]
+        for i in range(30):
+            rows.append(f'"line {i}\n""next"" line",false,false,72,low,high,low\n')
+        out = io.StringIO()
+        chunks = parallel_jobs.run("triage", iter("".join(rows).splitlines(keepends=True)), out,
+                                   workers=2, chunk_size=7)
+        self.assertEqual(chunks, 5)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["S6"] * 30)
+
+    @unittest.skipUnless(np is not None, "NumPy is not installed")
+    def test_triage_uses_column_kinds_from_first_chunk(self):
+        """列の型は先頭チャンクで一度だけ推定し、型に合わない値は欠損として扱う"""
+        rows = ["cytopenia,reticulocytosis,mcv,fe,tibc,ferritin\n"]
+        rows += ["false,false,72,low,high,low\n"] * 10
+        # A chunk of its own would otherwise read mcv as text and fail the numeric comparison
+        rows += ["false,false,n/a,low,high,low\n", "false,false,72,low,high,low\n"]
+        out = io.StringIO()
+        parallel_jobs.run("triage", rows, out, workers=2, chunk_size=10)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["S6"] * 10 + ["H", "S6"])
+
+    @unittest.skipUnless(np is not None, "NumPy is not installed")
+    def test_triage_empty_input(self):
+        out = io.StringIO()
+        self.assertEqual(parallel_jobs.run("triage", [], out, workers=1), 0)
+        self.assertEqual(out.getvalue().splitlines(), ["node_id,diagnosis_index,diagnosis"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+
+# Add parent directory to path to import path_index
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anemia_flow import AnemiaWorkflow, FLOWCHART
+from path_index import get_index, normalize_diagnosis
+
+
+class TestPathIndex(unittest.TestCase):
+    def setUp(self):
+        self.wf = AnemiaWorkflow()
+
+    def test_index_built_once_per_flowchart(self):
+        self.assertIs(get_index(self.wf.flowchart), AnemiaWorkflow().path_index)
+
+    def test_every_path_ends_at_result_and_replays(self):
+        """全経路がresultノードで終わり、walk_pathで同じノードに到達する"""
+        paths = self.wf.paths()
+        self.assertTrue(paths)
+        for path in paths:
+            with self.subTest(path=path.nodes):
+                self.assertEqual(path.nodes[0], "A")
+                self.assertEqual(self.wf.walk_path(path.choices).id, path.nodes[-1])
+                self.assertEqual(self.wf.get_node(path.nodes[-1])["type"], "result")
+
+    def test_every_result_node_is_a_terminal(self):
+        terminals = {path.nodes[-1] for path in self.wf.paths()}
+        results = {k for k, v in FLOWCHART.items() if isinstance(v, dict) and v["type"] == "result"}
+        self.assertEqual(terminals, results)
+
+    def test_paths_through_node(self):
+        for path in self.wf.paths("S5"):
+            self.assertIn("S5", path.nodes)
+        self.assertEqual(len(self.wf.paths("root")), len(self.wf.paths()))
+        self.assertEqual(self.wf.paths("UNKNOWN"), ())
+
+    def test_depth_and_ancestors(self):
+        self.assertEqual(self.wf.depth("root"), 0)
+        self.assertEqual(self.wf.depth("D"), 1)
+        self.assertEqual(self.wf.depth("S6"), 5)
+        self.assertIsNone(self.wf.depth("UNKNOWN"))
+        self.assertEqual(self.wf.ancestors("S6"), ("A", "D", "H", "K", "S2", "S5"))
+        self.assertEqual(self.wf.ancestors("root"), ())
+        # S5 is reached both directly from K and via S2
+        self.assertEqual(set(self.wf.ancestors("S5")), {"A", "D", "H", "K", "S2"})
+
+    def test_reverse_diagnosis_lookup(self):
+        """骨髄異形成症候群はC・L14・N18から得られる（括弧書きは無視）"""
+        self.assertEqual(self.wf.nodes_for_diagnosis("骨髄異形成症候群"), ("C", "L14", "N18"))
+        self.assertEqual(self.wf.nodes_for_diagnosis("骨髄異形成症候群 (MDS)"), ("C", "L14", "N18"))
+        terminals = {path.nodes[-1] for path in self.wf.paths_for_diagnosis("骨髄異形成症候群")}
+        self.assertEqual(terminals, {"C", "L14", "N18"})
+
+    def test_unknown_diagnosis(self):
+        self.assertEqual(self.wf.nodes_for_diagnosis("存在しない診断"), ())
+        self.assertEqual(self.wf.paths_for_diagnosis("存在しない診断"), ())
+
+    def test_normalize_diagnosis(self):
+        self.assertEqual(normalize_diagnosis("鉄欠乏性貧血 (IDA)"), "鉄欠乏性貧血")
+        self.assertEqual(normalize_diagnosis("鉄欠乏性貧血（IDA）"), "鉄欠乏性貧血")
+        self.assertEqual(normalize_diagnosis("赤芽球癆"), "赤芽球癆")
+
+    def test_cycles_and_dangling_targets_terminate(self):
+        flowchart = {
+            "root": "A",
+            "A": {"text": "A", "type": "question", "options": [
+                {"label": "loop", "next": "B"},
+                {"label": "missing", "next": "MISSING"},
+            ]},
+            "B": {"text": "B", "type": "question", "options": [
+                {"label": "back", "next": "A"},
+                {"label": "end", "next": "R"},
+            ]},
+            "R": {"text": "R", "type": "result", "diagnosis": ["X"]},
+        }
+        wf = AnemiaWorkflow(flowchart)
+        self.assertEqual([p.nodes for p in wf.paths()], [("A", "B", "R")])
+        self.assertEqual(wf.nodes_for_diagnosis("X"), ("R",))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+
+# Add parent directory to path to import registry
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anemia_flow import COMPILED_FLOWCHART, FLOWCHART
+from registry import FlowchartRegistry, default_registry, version_key
+from validation import FlowchartValidationError
+
+
+def _toy(diagnosis):
+    return {
+        "root": "Q",
+        "Q": {"text": "Q", "type": "question", "options": [{"label": "yes", "next": "R"}]},
+        "R": {"text": "R", "type": "result", "diagnosis": [diagnosis]},
+    }
+
+
+class TestRegistry(unittest.TestCase):
+    def test_default_registry_serves_builtin_flowchart(self):
+        registry = default_registry()
+        wf = registry.get("anemia")
+        self.assertIs(wf.flowchart, COMPILED_FLOWCHART)
+        self.assertIs(registry.get("anemia", "2015"), wf)
+        stats = registry.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_lru_eviction(self):
+        """上限を超えると最も長く使われていないエンジンを破棄する"""
+        registry = FlowchartRegistry(max_size=2)
+        for name in ("a", "b", "c"):
+            registry.register(name, "1", _toy(name))
+        first_a = registry.get("a")
+        registry.get("b")
+        self.assertIs(registry.get("a"), first_a)
+        registry.get("c")
+        self.assertEqual(registry.cached(), [("a", "1"), ("c", "1")])
+        self.assertEqual(registry.stats()["evictions"], 1)
+        # "b" is recompiled on the next request
+        self.assertEqual(registry.get("b").walk_path([0]).diagnosis, ("b",))
+        self.assertEqual(registry.stats()["misses"], 4)
+
+    def test_latest_version_uses_natural_order(self):
+        registry = FlowchartRegistry()
+        registry.register("toy", "1.9", _toy("old"))
+        registry.register("toy", "1.10", _toy("new"))
+        self.assertEqual(registry.versions("toy"), ["1.9", "1.10"])
+        self.assertEqual(registry.get("toy").walk_path([0]).diagnosis, ("new",))
+        self.assertEqual(registry.get("toy", "1.9").walk_path([0]).diagnosis, ("old",))
+        self.assertLess(version_key("2"), version_key("10"))
+
+    def test_unknown_flowchart(self):
+        registry = FlowchartRegistry()
+        with self.assertRaises(KeyError):
+            registry.get("missing")
+        registry.register("toy", "1", _toy("x"))
+        with self.assertRaises(KeyError):
+            registry.get("toy", "2")
+
+    def test_reregister_replaces_cached_engine(self):
+        registry = FlowchartRegistry()
+        registry.register("toy", "1", _toy("old"))
+        registry.get("toy")
+        registry.register("toy", "1", _toy("new"))
+        self.assertEqual(registry.get("toy").walk_path([0]).diagnosis, ("new",))
+
+    def test_invalidate_keeps_registration(self):
+        registry = FlowchartRegistry()
+        registry.register("toy", "1", _toy("x"))
+        registry.get("toy")
+        registry.invalidate("toy")
+        self.assertEqual(registry.cached(), [])
+        self.assertEqual(registry.names(), ["toy"])
+
+    def test_invalid_flowchart_is_rejected(self):
+        registry = FlowchartRegistry()
+        broken = _toy("x")
+        del broken["R"]
+        registry.register("broken", "1", broken)
+        with self.assertRaises(FlowchartValidationError):
+            registry.get("broken")
+        self.assertEqual(registry.cached(), [])
+
+    def test_register_directory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for filename, source in (("anemia@2.json", FLOWCHART), ("thrombo.json", _toy("ITP"))):
+                with open(os.path.join(tmpdir, filename), "w", encoding="utf-8") as f:
+                    json.dump(source, f, ensure_ascii=False)
+            with open(os.path.join(tmpdir, "notes.txt"), "w") as f:
+                f.write("ignored")
+            registry = FlowchartRegistry()
+            self.assertEqual(registry.register_directory(tmpdir), [("anemia", "2"), ("thrombo", "1")])
+            self.assertEqual(registry.get("thrombo").walk_path([0]).diagnosis, ("ITP",))
+            self.assertEqual(registry.get("anemia", "2").generate_json_output("S5"),
+                             default_registry().get("anemia").generate_json_output("S5"))
+
+    def test_max_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            FlowchartRegistry(max_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
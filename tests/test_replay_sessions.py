@@ -0,0 +1,59 @@
+import unittest
+import io
+import itertools
+import json
+import os
+import sys
+
+# Add parent directory to path to import replay_sessions
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay_sessions import main, parse_line, read_records, replay
+
+
+class TestParseLine(unittest.TestCase):
+    def test_csv(self):
+        self.assertEqual(parse_line("root,1,1,2,1,0\n"), (None, "root", [1, 1, 2, 1, 0]))
+
+    def test_jsonl_list_and_object(self):
+        self.assertEqual(parse_line('["root", 0]'), (None, "root", [0]))
+        self.assertEqual(parse_line('{"id": "p1", "path": ["S5", 0]}'), ("p1", "S5", [0]))
+
+    def test_start_defaults_to_root(self):
+        self.assertEqual(parse_line("1,0,0"), (None, "root", [1, 0, 0]))
+
+    def test_invalid_index(self):
+        with self.assertRaises(ValueError):
+            parse_line("root,1,x")
+
+
+class TestReplay(unittest.TestCase):
+    def _run(self, text, *args):
+        out = io.StringIO()
+        main(list(args), stdin=io.StringIO(text), stdout=out)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_results_stream_one_line_per_input(self):
+        """各入力行に対して1行の結果を出力する"""
+        results = self._run("root,1,1,2,1,0\n\n[\"root\", 0]\nroot,1,1,1,1,1,0\n")
+        self.assertEqual([r["node"] for r in results], ["S6", "C", "N11"])
+        self.assertEqual([r["line"] for r in results], [1, 3, 4])
+        self.assertIn("鉄欠乏性貧血 (IDA)", results[0]["diagnosis"])
+
+    def test_invalid_paths_become_error_records(self):
+        """不正な履歴はエラーレコードになり、後続の処理は継続する"""
+        results = self._run("root,9\nINVALID,0\nroot,0,0\n{broken\nroot,1,1,2,1,0\n")
+        self.assertEqual(len(results), 5)
+        for result in results[:4]:
+            self.assertIn("error", result)
+        self.assertEqual(results[4]["node"], "S6")
+
+    def test_pipeline_is_lazy(self):
+        """無限入力でも必要な分だけ処理する（ジェネレータパイプライン）"""
+        endless = itertools.repeat("root,0\n")
+        first = list(itertools.islice(replay(read_records(endless)), 3))
+        self.assertEqual([r["node"] for r in first], ["C", "C", "C"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Add parent directory to path to import search_index
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from anemia_flow import AnemiaWorkflow
+from search_index import get_index, ngrams, normalize
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.wf = AnemiaWorkflow()
+
+    def test_normalize(self):
+        """全角・半角カナ・大文字小文字・空白を吸収する"""
+        self.assertEqual(normalize("ＰＮＨ"), "pnh")
+        self.assertEqual(normalize("ﾌｪﾘﾁﾝ"), "フェリチン")
+        self.assertEqual(normalize(" 鉄 欠乏 "), "鉄欠乏")
+
+    def test_ngrams(self):
+        self.assertEqual(ngrams("鉄欠乏"), {"鉄欠", "欠乏"})
+        self.assertEqual(ngrams("鉄"), {"鉄"})
+        self.assertEqual(ngrams(""), set())
+
+    def test_diagnosis_query(self):
+        ids = [node_id for node_id, _ in self.wf.search("鉄欠乏")]
+        self.assertIn("S6", ids[:2])
+
+    def test_abbreviation_query(self):
+        self.assertEqual(self.wf.search("pnh")[0][0], "N6")
+        self.assertEqual(self.wf.search("ＰＮＨ")[0][0], "N6")
+
+    def test_shared_diagnosis_returns_all_nodes(self):
+        ids = {node_id for node_id, _ in self.wf.search("骨髄異形成症候群")}
+        self.assertTrue({"C", "L14", "N18"} <= ids)
+
+    def test_no_match(self):
+        self.assertEqual(self.wf.search("xyz"), [])
+        self.assertEqual(self.wf.search(""), [])
+
+    def test_limit(self):
+        self.assertLessEqual(len(self.wf.search("貧血", limit=3)), 3)
+
+    def test_lookup_is_sub_millisecond(self):
+        index = get_index(self.wf.flowchart)
+        index.search("鉄欠乏")
+        start = time.perf_counter()
+        for _ in range(100):
+            index.search("骨髄異形成")
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+    def test_search_output(self):
+        items = json.loads(self.wf.generate_search_output("PNH"))["items"]
+        self.assertEqual(items[0]["arg"], "N6")
+        self.assertTrue(items[0]["valid"])
+        items = json.loads(self.wf.generate_search_output("xyz"))["items"]
+        self.assertEqual(items[0]["arg"], "root")
+
+    def test_run_diagnosis_falls_back_to_search(self):
+        """ノードIDでない入力はrun_diagnosis.pyで検索結果になる"""
+        proc = subprocess.run([sys.executable, os.path.join(ROOT_DIR, "run_diagnosis.py"), "PNH"],
+                              capture_output=True, text=True, check=True)
+        self.assertEqual(json.loads(proc.stdout)["items"][0]["arg"], "N6")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import json
+import os
+import sys
+
+# Add parent directory to path to import serializers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serializers
+from anemia_flow import AnemiaWorkflow, FLOWCHART
+
+
+class TestSerializers(unittest.TestCase):
+    def setUp(self):
+        # A private compilation so that memo assertions do not depend on other tests
+        self.wf = AnemiaWorkflow(dict(FLOWCHART))
+
+    def test_alfred_matches_generate_json_output(self):
+        for arg in ["root", "S5", "L8", "~112", "~11210"]:
+            with self.subTest(arg=arg):
+                self.assertEqual(serializers.encode(self.wf, arg),
+                                 self.wf.generate_json_output(arg).encode("utf-8"))
+
+    def test_alfred_compact(self):
+        data = serializers.encode(self.wf, "S5", "alfred-compact")
+        self.assertNotIn(b"\n", data)
+        self.assertEqual(json.loads(data), json.loads(self.wf.generate_json_output("S5")))
+
+    def test_api_and_jsonl(self):
+        api = json.loads(serializers.encode(self.wf, "S6", "api"))
+        self.assertEqual(api["node"]["id"], "S6")
+        self.assertEqual(api["node"]["diagnosis"], ["鉄欠乏性貧血 (IDA)"])
+        line = serializers.encode(self.wf, "~11210", "jsonl")
+        self.assertTrue(line.endswith(b"\n"))
+        self.assertEqual(line.count(b"\n"), 1)
+        self.assertEqual(json.loads(line)["choices"], [1, 1, 2, 1, 0])
+        self.assertEqual(json.loads(line)["node"], api["node"])
+
+    def test_unknown_nodes(self):
+        self.assertIsNone(serializers.encode(self.wf, "UNKNOWN"))
+        self.assertIsNone(serializers.encode(self.wf, "~9", "api"))
+        with self.assertRaises(KeyError):
+            serializers.encode(self.wf, "S5", "xml")
+
+    def test_encoded_bytes_are_memoized(self):
+        """2回目以降は同じバイト列オブジェクトを返す"""
+        first = serializers.encode(self.wf, "S5", "api")
+        self.assertIs(serializers.encode(self.wf, "S5", "api"), first)
+        self.assertEqual(serializers.memo_size(self.wf), 1)
+        serializers.encode(self.wf, "S5", "alfred")
+        self.assertEqual(serializers.memo_size(self.wf), 2)
+
+    def test_memo_is_per_compiled_flowchart(self):
+        """フローチャートを再読み込みするとメモも新しくなる"""
+        serializers.encode(self.wf, "S5")
+        changed = dict(FLOWCHART)
+        changed["S6"] = dict(FLOWCHART["S6"], diagnosis=["変更後の診断"])
+        reloaded = AnemiaWorkflow(changed)
+        self.assertEqual(serializers.memo_size(reloaded), 0)
+        self.assertIn("変更後の診断", serializers.encode(reloaded, "S6", "api").decode("utf-8"))
+
+    def test_register_format(self):
+        @serializers.register_format("text")
+        def encode_text(wf, node, choices, arg):
+            return node.text.encode("utf-8")
+        try:
+            self.assertEqual(serializers.encode(self.wf, "S6", "text"),
+                             FLOWCHART["S6"]["text"].encode("utf-8"))
+        finally:
+            del serializers.FORMATS["text"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import io
+import os
+import random
+import sqlite3
+import sys
+
+# Add parent directory to path to import sql_compiler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sql_compiler
+from anemia_flow import AnemiaWorkflow
+from synthetic_flowchart import generate_flowchart, level_keys
+from test_batch_triage import LAB_VALUES, random_panels
+
+
+def sqlite_triage(panels, keys, flowchart=None, columns=None):
+    """検査値の辞書のリストをSQLiteのテーブルに入れ、ビュー経由で停止ノードIDを求める"""
+    columns = columns or {}
+    conn = sqlite3.connect(":memory:")
+    try:
+        names = [columns.get(key, key) for key in keys]
+        conn.execute(f"CREATE TABLE labs (id INTEGER PRIMARY KEY, "
+                     f"{', '.join(sql_compiler.quote_identifier(n) for n in names)})")
+        conn.executemany(
+            f"INSERT INTO labs VALUES (?, {', '.join('?' for _ in keys)})",
+            [(i, *(panel.get(key) for key in keys)) for i, panel in enumerate(panels)],
+        )
+        conn.execute(sql_compiler.compile_view("triage", "labs", flowchart, columns))
+        return [row[0] for row in conn.execute('SELECT "terminal_node" FROM "triage" ORDER BY "id"')]
+    finally:
+        conn.close()
+
+
+class TestSqlCompiler(unittest.TestCase):
+    def setUp(self):
+        self.wf = AnemiaWorkflow()
+
+    def test_matches_route_labs_on_sqlite(self):
+        """SQLite上のビューの結果が route_labs の停止ノードと一致する（欠損値を含む）"""
+        panels = random_panels(5000, seed=3)
+        expected = [self.wf.route_labs(panel)[0] for panel in panels]
+        self.assertEqual(sqlite_triage(panels, list(LAB_VALUES)), expected)
+
+    def test_synthetic_flowchart_matches_route_labs(self):
+        flowchart = generate_flowchart(nodes=400, branching=4, alias_chain=2, alias_rate=0.3, seed=5)
+        keys = level_keys(flowchart)
+        wf = AnemiaWorkflow(flowchart)
+        rng = random.Random(6)
+        panels = [{key: (None if rng.random() < 0.1 else rng.randrange(4)) for key in keys}
+                  for _ in range(2000)]
+        expected = [wf.route_labs(panel)[0] for panel in panels]
+        self.assertEqual(sqlite_triage(panels, keys, flowchart), expected)
+
+    def test_column_mapping(self):
+        columns = {"mcv": "MCV (fL)", "fe": "serum_fe"}
+        panels = random_panels(500, seed=7)
+        expected = [self.wf.route_labs(panel)[0] for panel in panels]
+        self.assertEqual(sqlite_triage(panels, list(LAB_VALUES), columns=columns), expected)
+        self.assertIn('"MCV (fL)" >= 101', sql_compiler.compile_case(columns=columns))
+
+    def test_start_node_and_literals(self):
+        self.assertEqual(sql_compiler.compile_case(start="S6"), "'S6'")
+        self.assertEqual(sql_compiler.sql_literal("it's"), "'it''s'")
+        self.assertEqual(sql_compiler.condition_sql('"x"', {"in": []}), "FALSE")
+        with self.assertRaises(ValueError):
+            sql_compiler.sql_literal(float("nan"))
+        with self.assertRaises(KeyError):
+            sql_compiler.compile_case(start="INVALID_ID")
+
+    def test_cycle_is_rejected(self):
+        flowchart = {
+            "root": "A",
+            "A": {"text": "A", "type": "question",
+                  "options": [{"label": "x", "next": "B", "when": {"x": True}}]},
+            "B": {"text": "B", "type": "question",
+                  "options": [{"label": "y", "next": "A", "when": {"y": True}}]},
+        }
+        with self.assertRaises(ValueError):
+            sql_compiler.compile_case(flowchart)
+
+    def test_lab_keys(self):
+        self.assertEqual(set(sql_compiler.lab_keys()), set(LAB_VALUES))
+
+    def test_main_prints_view(self):
+        stdout = io.StringIO()
+        self.assertEqual(sql_compiler.main(["--table", "labs", "--column", "mcv=mcv_fl"], stdout=stdout), 0)
+        sql = stdout.getvalue()
+        self.assertTrue(sql.startswith('CREATE VIEW "anemia_triage" AS'))
+        self.assertIn('"mcv_fl" >= 101', sql)
+        self.assertIn('FROM "labs";', sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import random
+import sys
+
+# Add parent and benchmarks directories to path to import synthetic_flowchart / scaling
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+import scaling
+from anemia_flow import MAX_ALIAS_DEPTH, AnemiaWorkflow
+from batch_triage import BatchTriage, np
+from synthetic_flowchart import generate_flowchart, level_keys
+from validation import validate_flowchart
+
+
+def _real_nodes(flowchart):
+    return {key: value for key, value in flowchart.items() if isinstance(value, dict)}
+
+
+class TestSyntheticFlowchart(unittest.TestCase):
+    def test_node_count_and_branching(self):
+        for nodes, branching in [(1, 3), (4, 3), (1000, 3), (5000, 7)]:
+            with self.subTest(nodes=nodes, branching=branching):
+                flowchart = generate_flowchart(nodes, branching)
+                real = _real_nodes(flowchart)
+                self.assertLessEqual(len(real), nodes)
+                self.assertGreater(len(real), nodes - branching)
+                for node in real.values():
+                    if node["type"] == "question":
+                        self.assertEqual(len(node["options"]), branching)
+                self.assertEqual(validate_flowchart(flowchart), [])
+
+    def test_depth_limit(self):
+        wf = AnemiaWorkflow(generate_flowchart(10_000, 2, depth=5))
+        self.assertEqual(max(len(path.choices) for path in wf.paths()), 5)
+        self.assertTrue(all(wf.walk_path(path.choices).type == "result" for path in wf.paths()))
+
+    def test_alias_chains(self):
+        flowchart = generate_flowchart(500, 3, alias_chain=MAX_ALIAS_DEPTH, alias_rate=0.5)
+        wf = AnemiaWorkflow(flowchart)
+        self.assertEqual(validate_flowchart(flowchart), [])
+        self.assertEqual(wf.get_node("root").id, "Q1")
+        aliased = [opt for node in _real_nodes(flowchart).values() for opt in node.get("options", ())
+                   if opt["next"] not in _real_nodes(flowchart)]
+        self.assertTrue(aliased)
+        for option in aliased:
+            self.assertIsNotNone(wf.get_node(option["next"]))
+
+        too_long = generate_flowchart(50, 3, alias_chain=MAX_ALIAS_DEPTH + 1)
+        self.assertIn("alias_too_long", {issue.code for issue in validate_flowchart(too_long)})
+
+    def test_deterministic(self):
+        self.assertEqual(generate_flowchart(300, 3, alias_chain=2, seed=5),
+                         generate_flowchart(300, 3, alias_chain=2, seed=5))
+        with self.assertRaises(ValueError):
+            generate_flowchart(10, 1)
+
+    @unittest.skipUnless(np is not None, "NumPy is not installed")
+    def test_batch_triage_matches_route_labs(self):
+        flowchart = generate_flowchart(2000, 3, alias_chain=2, alias_rate=0.3)
+        wf = AnemiaWorkflow(flowchart)
+        keys = level_keys(flowchart)
+        rng = random.Random(0)
+        panels = [{key: rng.randrange(3) for key in keys if rng.random() > 0.05} for _ in range(300)]
+        node_ids, _ = BatchTriage(flowchart).evaluate(
+            {key: [panel.get(key, np.nan) for panel in panels] for key in keys})
+        for i, panel in enumerate(panels):
+            self.assertEqual(node_ids[i], wf.route_labs(panel)[0])
+
+
+class TestScaling(unittest.TestCase):
+    def test_run_scaling(self):
+        rows = scaling.run_scaling([300], ops=["compile", "get_node", "render_cold", "walk"])
+        self.assertEqual([row["op"] for row in rows], ["compile", "get_node", "render_cold", "walk"])
+        for row in rows:
+            self.assertGreater(row["seconds"], 0)
+            self.assertIsNotNone(row["peak_mb"])
+            self.assertLessEqual(row["nodes"], 300)
+        self.assertEqual(rows[1]["count"], scaling.SAMPLE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import sys
+import os
+import time
+
+# Add parent directory to path to import validation
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anemia_flow import COMPILED_FLOWCHART, FLOWCHART, MAX_ALIAS_DEPTH, compile_flowchart
+from validation import ERROR, WARNING, FlowchartValidationError, check_flowchart, validate_flowchart
+
+
+def _question(*targets):
+    return {"text": "Q", "type": "question",
+            "options": [{"label": str(i), "next": t} for i, t in enumerate(targets)]}
+
+
+def _result(*diagnosis):
+    return {"text": "R", "type": "result", "diagnosis": list(diagnosis)}
+
+
+def _codes(source):
+    return sorted((issue.code, issue.node_id) for issue in validate_flowchart(source))
+
+
+class TestValidation(unittest.TestCase):
+    def test_builtin_flowchart_is_clean(self):
+        self.assertEqual(validate_flowchart(FLOWCHART), [])
+        self.assertEqual(validate_flowchart(COMPILED_FLOWCHART), [])
+
+    def test_dangling_and_duplicate_targets(self):
+        source = {"root": "A", "A": _question("B", "B", "MISSING"), "B": _result("x")}
+        self.assertEqual(_codes(source), [("dangling_target", "A"), ("duplicate_target", "A")])
+
+    def test_result_without_diagnosis(self):
+        source = {"root": "A", "A": _question("B"), "B": _result()}
+        self.assertEqual(_codes(source), [("missing_diagnosis", "B")])
+
+    def test_invalid_nodes(self):
+        source = {"root": "A", "A": _question("B", "C"), "B": {"text": "x", "type": "other"},
+                  "C": {"type": "question", "options": []}}
+        self.assertEqual(_codes(source), [("empty_question", "C"), ("invalid_node", "B"), ("invalid_node", "C")])
+
+    def test_unreachable_nodes_are_warnings(self):
+        source = {"root": "A", "A": _question("B"), "B": _result("x"), "ORPHAN": _result("y")}
+        issues = validate_flowchart(source)
+        self.assertEqual([(i.severity, i.code, i.node_id) for i in issues], [(WARNING, "unreachable", "ORPHAN")])
+        self.assertEqual(check_flowchart(source), issues)
+
+    def test_cycle(self):
+        source = {"root": "A", "A": _question("B"), "B": _question("C", "A"), "C": _result("x")}
+        self.assertEqual(_codes(source), [("cycle", "B")])
+
+    def test_cycle_through_alias(self):
+        source = {"root": "A", "A": _question("BACK", "C"), "BACK": "A", "C": _result("x")}
+        self.assertEqual(_codes(source), [("cycle", "A")])
+
+    def test_alias_problems(self):
+        source = {"root": "A", "A": _result("x"), "LOOP1": "LOOP2", "LOOP2": "LOOP1", "BROKEN": "NOWHERE"}
+        self.assertEqual(_codes(source), [("alias_cycle", "LOOP1"), ("alias_cycle", "LOOP2"),
+                                          ("alias_missing", "BROKEN")])
+
+    def test_alias_chain_limit(self):
+        """get_node の上限を超えるエイリアス連鎖のみを報告する"""
+        source = {"root": "A", "A": _result("x")}
+        previous = "A"
+        for i in range(MAX_ALIAS_DEPTH + 1):
+            source[f"L{i}"] = previous
+            previous = f"L{i}"
+        self.assertEqual(_codes(source), [("alias_too_long", f"L{MAX_ALIAS_DEPTH}")])
+
+    def test_missing_root(self):
+        self.assertEqual(_codes({"A": _result("x")}), [("missing_root", None)])
+
+    def test_check_raises_value_error(self):
+        source = {"root": "A", "A": _question("MISSING")}
+        with self.assertRaises(ValueError) as ctx:
+            check_flowchart(source)
+        self.assertIsInstance(ctx.exception, FlowchartValidationError)
+        self.assertEqual([i.severity for i in ctx.exception.issues], [ERROR])
+        with self.assertRaises(FlowchartValidationError):
+            compile_flowchart(source, validate=True)
+
+    def test_large_flowcharts(self):
+        """10万ノード超の深い連鎖・広い木でも再帰せず短時間で検証できる"""
+        chain = {"root": "N0", "N100000": _result("x")}
+        for i in range(100_000):
+            chain[f"N{i}"] = _question(f"N{i + 1}")
+        chain["N50000"] = _question("N50001", "N10")
+
+        tree = {"root": "T0"}
+        size = 150_000
+        for i in range(size):
+            children = [f"T{c}" for c in (2 * i + 1, 2 * i + 2) if c < size]
+            tree[f"T{i}"] = _question(*children) if children else _result("x")
+
+        start = time.perf_counter()
+        self.assertEqual(_codes(chain), [("cycle", "N50000")])
+        self.assertEqual(validate_flowchart(tree), [])
+        self.assertLess(time.perf_counter() - start, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+"""
+フローチャート定義の検証。
+
+ノード数V・遷移数Eに対してO(V+E)で動作し（再帰を使わないため10万ノード超でも可）、
+以下の問題を ValidationIssue として報告します。
+
+    error:
+        - missing_root: "root" が無い
+        - invalid_node: ノードがdictでない、typeが不正、textが無い
+        - empty_question: questionノードに選択肢が無い
+        - dangling_target: 選択肢の遷移先が存在しない
+        - missing_diagnosis: resultノードのdiagnosisが無い・空
+        - alias_missing: エイリアスの参照先が存在しない
+        - alias_cycle: エイリアスが循環している
+        - alias_too_long: エイリアスの連鎖が MAX_ALIAS_DEPTH を超える（get_node で解決できない）
+        - cycle: 選択肢の遷移が循環している
+    warning:
+        - duplicate_target: 同じquestionノード内で遷移先が重複している
+        - unreachable: rootから到達できないノード
+
+フローチャートの読み込み時（flowchart_loader）とビルド時（output_store / build_bundle）に実行されます。
+"""
+from collections import namedtuple
+from collections.abc import Mapping
+
+from anemia_flow import MAX_ALIAS_DEPTH
+
+ERROR = "error"
+WARNING = "warning"
+
+ValidationIssue = namedtuple("ValidationIssue", ["severity", "code", "node_id", "message"])
+
+
+class FlowchartValidationError(ValueError):
+    """
+    フローチャートにerrorレベルの問題がある場合に送出される例外。
+
+    Attributes:
+        issues (list): 検出されたすべての ValidationIssue
+    """
+    def __init__(self, issues):
+        self.issues = issues
+        errors = [issue for issue in issues if issue.severity == ERROR]
+        summary = "; ".join(issue.message for issue in errors[:5])
+        if len(errors) > 5:
+            summary += f"; ... ({len(errors) - 5} more)"
+        super().__init__(f"Invalid flowchart: {summary}")
+
+
+def _resolve_aliases(source, issues):
+    # Alias -> node ID (None if unresolvable); every alias is followed once: O(number of aliases)
+    resolved = {}
+    hops = {}
+    failures = {}
+    for alias, target in source.items():
+        if not isinstance(target, str) or alias in resolved:
+            continue
+        chain = [alias]
+        on_chain = {alias}
+        end = None
+        extra = 0
+        failure = None
+        current = target
+        while True:
+            if current in resolved:
+                end = resolved[current]
+                extra = hops[current]
+                failure = failures.get(current)
+                break
+            value = source.get(current)
+            if value is None:
+                failure = ("alias_missing", f"points to missing node '{current}'")
+                break
+            if not isinstance(value, str):
+                end = current
+                break
+            if current in on_chain:
+                failure = ("alias_cycle", "is part of an alias cycle")
+                break
+            chain.append(current)
+            on_chain.add(current)
+            current = value
+        for distance, name in enumerate(reversed(chain), start=1):
+            resolved[name] = end
+            hops[name] = distance + extra
+            if failure is not None:
+                failures[name] = failure
+                issues.append(ValidationIssue(ERROR, failure[0], name, f"Alias '{name}' {failure[1]}"))
+            elif hops[name] > MAX_ALIAS_DEPTH:
+                issues.append(ValidationIssue(
+                    ERROR, "alias_too_long", name,
+                    f"Alias '{name}' needs {hops[name]} hops (limit {MAX_ALIAS_DEPTH})"))
+    return resolved
+
+
+def _check_nodes(source, resolved, issues):
+    # Node ID -> list of resolved successor node IDs
+    edges = {}
+    for node_id, node in source.items():
+        if isinstance(node, str):
+            continue
+        successors = edges[node_id] = []
+        if not isinstance(node, (dict, Mapping)) or node.get("type") not in ("question", "result"):
+            issues.append(ValidationIssue(ERROR, "invalid_node", node_id, f"Node '{node_id}' has an invalid type"))
+            continue
+        if not isinstance(node.get("text"), str):
+            issues.append(ValidationIssue(ERROR, "invalid_node", node_id, f"Node '{node_id}' has no text"))
+        if node["type"] == "result":
+            if not node.get("diagnosis"):
+                issues.append(ValidationIssue(
+                    ERROR, "missing_diagnosis", node_id, f"Result node '{node_id}' has no diagnosis"))
+            continue
+        options = node.get("options")
+        if not options:
+            issues.append(ValidationIssue(
+                ERROR, "empty_question", node_id, f"Question node '{node_id}' has no options"))
+            continue
+        seen = set()
+        for option in options:
+            target = option.get("next") if isinstance(option, (dict, Mapping)) else None
+            if target in seen:
+                issues.append(ValidationIssue(
+                    WARNING, "duplicate_target", node_id, f"Node '{node_id}' has duplicate target '{target}'"))
+            seen.add(target)
+            value = source.get(target) if isinstance(target, str) else None
+            if value is None:
+                issues.append(ValidationIssue(
+                    ERROR, "dangling_target", node_id, f"Node '{node_id}' points to missing node '{target}'"))
+            elif isinstance(value, str):
+                if resolved.get(target) is not None:
+                    successors.append(resolved[target])
+            else:
+                successors.append(target)
+    return edges
+
+
+def _check_reachability(root, edges, issues):
+    reached = {root}
+    stack = [root]
+    while stack:
+        for target in edges.get(stack.pop(), ()):
+            if target not in reached:
+                reached.add(target)
+                stack.append(target)
+    for node_id in edges:
+        if node_id not in reached:
+            issues.append(ValidationIssue(
+                WARNING, "unreachable", node_id, f"Node '{node_id}' is not reachable from root"))
+
+
+def _check_cycles(edges, issues):
+    # Iterative three-colour DFS; each back edge closes a cycle
+    state = {}  # node ID -> 1 (on stack) / 2 (done)
+    for start in edges:
+        if start in state:
+            continue
+        state[start] = 1
+        stack = [(start, iter(edges[start]))]
+        while stack:
+            node_id, successors = stack[-1]
+            for target in successors:
+                mark = state.get(target)
+                if mark is None:
+                    state[target] = 1
+                    stack.append((target, iter(edges.get(target, ()))))
+                    break
+                if mark == 1:
+                    issues.append(ValidationIssue(
+                        ERROR, "cycle", node_id, f"Node '{node_id}' leads back to '{target}' (cycle)"))
+            else:
+                state[node_id] = 2
+                stack.pop()
+
+
+def validate_flowchart(source):
+    """
+    フローチャート定義を検証し、検出した問題を返します。
+
+    Args:
+        source (Mapping): FLOWCHARTと同じ形式のフローチャート（CompiledFlowchart も可）
+
+    Returns:
+        list: ValidationIssue のリスト（問題が無ければ空）
+    """
+    issues = []
+    resolved = _resolve_aliases(source, issues)
+    edges = _check_nodes(source, resolved, issues)
+    _check_cycles(edges, issues)
+    if "root" not in source:
+        issues.append(ValidationIssue(ERROR, "missing_root", None, "Flowchart has no 'root' entry"))
+    else:
+        root = resolved.get("root") if isinstance(source["root"], str) else "root"
+        if root is not None:
+            _check_reachability(root, edges, issues)
+    return issues
+
+
+def check_flowchart(source):
+    """
+    フローチャート定義を検証し、errorレベルの問題があれば例外を送出します。
+
+    Args:
+        source (Mapping): FLOWCHARTと同じ形式のフローチャート（CompiledFlowchart も可）
+
+    Returns:
+        list: warningレベルの ValidationIssue のリスト
+
+    Raises:
+        FlowchartValidationError: errorレベルの問題がある場合
+    """
+    issues = validate_flowchart(source)
+    if any(issue.severity == ERROR for issue in issues):
+        raise FlowchartValidationError(issues)
+    return issues
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        from flowchart_loader import read_source
+        target = read_source(sys.argv[1])
+    else:
+        from anemia_flow import FLOWCHART as target
+    found = validate_flowchart(target)
+    for issue in found:
+        print(f"{issue.severity:8s} {issue.code:18s} {issue.node_id or '-':12s} {issue.message}")
+    print(f"{len(found)} issue(s)")
+    sys.exit(1 if any(issue.severity == ERROR for issue in found) else 0)